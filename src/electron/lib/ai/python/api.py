@@ -1,49 +1,196 @@
+import contextvars
 import socket
-import json
 import sys
+import time
+from codec import HELLO, JSON, get_codec, negotiate
+from framing import read_message, write_message
 
 class API:
+    # How messages are encoded, JSON until Electron negotiates another codec
+    codec = JSON
+
     def send(self, data: dict):
         raise NotImplementedError
 
     def receive(self):
         raise NotImplementedError
 
+    def reset(self):
+        """Drops any per-request state before a worker handles a new request"""
+        pass
+
+    def writesFramed(self) -> bool:
+        return True
+
+    def hello(self, message: dict) -> dict:
+        """
+        Picks the codec for Electron's hello message, see codec.py. The
+        answer has to be sent before switching to the codec with useCodec.
+        """
+        name = negotiate(message.get("codecs"), self.writesFramed()) or JSON.name
+        return {"type": HELLO, "codec": name}
+
+    def useCodec(self, name: str):
+        self.codec = get_codec(name)
+
 class SocketAPI(API):
-    def __init__(self, host, port):
+    """
+    Talks to Electron over a local socket instead of stdin/stdout. Connects to
+    the Unix domain socket at path if one is given, otherwise to host:port
+    over TCP (meant for loopback). Messages are always length framed, see
+    framing.py.
+
+    If the connection drops, the API reconnects up to retries times, waiting
+    retryDelay seconds (doubling every attempt) in between. A function call
+    whose response was lost that way is not sent again, since Electron may
+    already have carried it out: receive raises ConnectionError instead. It
+    raises TimeoutError if a function call goes unanswered for replyTimeout
+    seconds. Waiting for the next request has no time limit.
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=None, path=None, bufferSize=65536, retries=5, retryDelay=0.1, replyTimeout=60.0
+    ):
         self.host = host
         self.port = port
+        self.path = path
+        self.bufferSize = bufferSize
+        self.retries = retries
+        self.retryDelay = retryDelay
+        self.replyTimeout = replyTimeout
         self.socket = None
+        self.reader = None
+        self.writer = None
+        # Whether the last message sent was a function call still unanswered
+        self.awaiting = False
 
     def connect(self):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((self.host, self.port))
+        if self.path:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = self.path
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Messages are flushed whole, don't hold small ones back
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            address = (self.host, self.port)
+
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.bufferSize)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.bufferSize)
+        self.socket.connect(address)
+
+        self.reader = self.socket.makefile("rb", buffering=self.bufferSize)
+        self.writer = self.socket.makefile("wb", buffering=self.bufferSize)
+
+    def open(self):
+        # Electron may still be setting up its end of the socket
+        if not self.reconnect():
+            raise ConnectionError(f"Could not connect to {self.path or (self.host, self.port)}")
+
+    def reconnect(self) -> bool:
+        self.disconnect()
+
+        delay = self.retryDelay
+        for attempt in range(self.retries):
+            try:
+                self.connect()
+                return True
+            except OSError:
+                self.disconnect()
+                if attempt < self.retries - 1:
+                    time.sleep(delay)
+                    delay *= 2
+
+        return False
 
     def send(self, data):
-        self.socket.sendall(data.encode())
+        payload = self.codec.encode(data)
+
+        if not self.socket:
+            self.open()
+
+        try:
+            write_message(self.writer, payload)
+        except OSError:
+            if not self.reconnect():
+                raise
+            write_message(self.writer, payload)
+
+        self.awaiting = isinstance(data, dict) and data.get("type") == "function"
 
     def receive(self):
-        raise NotImplementedError
+        if not self.socket:
+            self.open()
+
+        while True:
+            awaiting, self.awaiting = self.awaiting, False
+            self.socket.settimeout(self.replyTimeout if awaiting else None)
+            try:
+                data, _ = read_message(self.reader)
+            except TimeoutError:
+                # The reader can't be used after a timeout
+                self.disconnect()
+                raise TimeoutError(f"Electron did not answer the function call within {self.replyTimeout} seconds")
+            except (OSError, EOFError):
+                data = None
+
+            if data is not None:
+                return self.codec.text(data)
+
+            # Electron closed the connection, wait for it to come back
+            if not self.reconnect():
+                return ""
+            if awaiting:
+                raise ConnectionError("The connection to Electron dropped before it answered the function call")
 
     def disconnect(self):
-        self.socket.close()
+        for closable in (self.reader, self.writer, self.socket):
+            if closable:
+                try:
+                    closable.close()
+                except OSError:
+                    pass
+
+        self.socket = None
+        self.reader = None
+        self.writer = None
 
 class StdioAPI(API):
+    """
+    Talks to Electron over stdin/stdout, see framing.py for the wire format.
+
+    framed decides how outgoing messages are written: True prefixes them with
+    a length header, False writes them as is (the original format). By default
+    the API starts unframed and switches to framed messages as soon as
+    Electron sends a framed message itself.
+    """
+
+    def __init__(self, stdin=None, stdout=None, framed=None):
+        self.stdin = stdin or sys.stdin.buffer
+        self.stdout = stdout or sys.stdout.buffer
+        self.framed = framed
+        self.peerFramed = False
+
+    def writesFramed(self) -> bool:
+        return self.peerFramed if self.framed is None else self.framed
+
     def send(self, data):
-        if isinstance(data, dict):
-            data = json.dumps(data)
+        payload = self.codec.encode(data)
 
-        sys.stdout.write(data)
+        # Anything printed through sys.stdout has to go out first
         sys.stdout.flush()
+        write_message(self.stdout, payload, self.writesFramed())
 
     def receive(self):
-        data = ""
-        for line in sys.stdin:
-            if(line == "end of transmission\n"):
-                break
-            data += line
+        data, framed = read_message(self.stdin)
+        if data is None:
+            return ""
+
+        self.peerFramed = framed
+
+        return self.codec.text(data)
 
-        return data
+# Session of the request the current task is serving, see async_api.py
+current_session = contextvars.ContextVar("current_session", default=None)
 
 # ========== API Config ==========
 
@@ -58,4 +205,21 @@ def get_api() -> API:
     if not api:
         api = StdioAPI()
 
-    return api
\ No newline at end of file
+    return api
+
+# asyncio takes longer to import than everything else the sync worker needs
+# before its first request, so the async API is only imported with --async
+async_api = None
+
+def set_async_api(a: "AsyncStdioAPI"):
+    global async_api
+    async_api = a
+
+def get_async_api() -> "AsyncStdioAPI":
+    global async_api
+    if not async_api:
+        from async_api import AsyncStdioAPI
+
+        async_api = AsyncStdioAPI()
+
+    return async_api
@@ -0,0 +1,120 @@
+"""
+Asyncio version of the stdio transport, imported only by workers started
+with --async.
+"""
+import asyncio
+import json
+import sys
+import threading
+
+from api import StdioAPI, current_session
+from codec import HELLO
+from framing import read_message
+
+
+class AsyncStdioAPI(StdioAPI):
+    """
+    Asyncio version of StdioAPI that lets one process serve several requests
+    (sessions) at the same time.
+
+    A background thread reads every incoming message and routes it by its
+    "session" key: messages for a session that is currently running are
+    answers to that session's function calls, anything else is a new request.
+    Messages without a session key belong to the default session None, so an
+    Electron side that does not tag its messages still works, one request at
+    a time. Outgoing messages are tagged with the session of the task that
+    sends them.
+    """
+
+    def __init__(self, stdin=None, stdout=None, framed=None):
+        # The reader thread is still blocked in a read when the interpreter
+        # shuts down, holding the lock of the stream it reads. It gets a
+        # stream of its own on the same file, as finalizing sys.stdin would
+        # wait on that lock and abort the process.
+        super().__init__(stdin or open(sys.stdin.fileno(), "rb", closefd=False), stdout, framed)
+        self.sessions = {}
+        self.requests = None
+        self.loop = None
+
+    def start(self):
+        """
+        Starts reading stdin, must be called from the running event loop
+        """
+        self.loop = asyncio.get_running_loop()
+        self.requests = asyncio.Queue()
+        # A daemon thread rather than an executor, so a pending read never
+        # keeps the event loop from shutting down
+        threading.Thread(target=self.listen, daemon=True).start()
+
+    def listen(self):
+        while True:
+            data, framed = read_message(self.stdin)
+            # End of input says nothing about framing, and the requests still
+            # running answer in the format they were sent in
+            if data is not None:
+                self.peerFramed = framed
+            text = "" if data is None else self.codec.text(data)
+
+            # Answered right here, as the messages after it may already be
+            # in the new codec
+            if f'"{HELLO}"' in text and self.answerHello(text):
+                continue
+
+            self.loop.call_soon_threadsafe(self.route, text)
+
+            if data is None:
+                return
+
+    def answerHello(self, text) -> bool:
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return False
+        if not isinstance(message, dict) or message.get("type") != HELLO:
+            return False
+
+        # Electron waits for the answer before sending anything else, so
+        # nothing else is being written
+        answer = self.hello(message)
+        StdioAPI.send(self, answer)
+        self.useCodec(answer["codec"])
+        return True
+
+    def route(self, text):
+        if not text:
+            # stdin was closed, wake everyone up
+            self.requests.put_nowait("")
+            for queue in self.sessions.values():
+                queue.put_nowait("")
+            return
+
+        session = None
+        if '"session"' in text:
+            try:
+                session = json.loads(text).get("session")
+            except (ValueError, AttributeError):
+                pass
+
+        queue = self.sessions.get(session, self.requests)
+        queue.put_nowait(text)
+
+    def open(self, session):
+        self.sessions[session] = asyncio.Queue()
+
+    def close(self, session):
+        self.sessions.pop(session, None)
+
+    async def next_request(self) -> str:
+        return await self.requests.get()
+
+    async def send(self, data):
+        if isinstance(data, dict):
+            session = current_session.get()
+            if session is not None:
+                data = {**data, "session": session}
+
+        # Writes are small and never interleave as nothing is awaited in between
+        super().send(data)
+
+    async def receive(self):
+        return await self.sessions[current_session.get()].get()
@@ -0,0 +1,69 @@
+"""
+Per-request cost of getting an agent ready to run.
+
+Compares building a new ChatOpenAI client and agent executor for every
+request with taking one from the agent pool, for requests alternating
+between a few Open AI keys. Needs langchain installed; no request is sent
+to Open AI.
+
+Usage: python benchmarks/agent_setup.py [--requests 200] [--keys 2]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "models"))
+
+from agents import AgentPool, set_pool
+from gpt import GPT, preload
+
+
+def measure(requests, keys):
+    """
+    Milliseconds GPT.getAgent takes for every request
+    """
+    gpt = GPT()
+    times = []
+    for i in range(requests):
+        body = {"config": {"key": f"sk-benchmark-{i % keys}"}}
+        start = time.perf_counter()
+        gpt.getAgent(body)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return times
+
+
+def report(label, times):
+    print(
+        f"  {label:<10} mean {statistics.mean(times):8.3f} ms  median {statistics.median(times):8.3f} ms"
+        f"  max {max(times):8.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=2, help="distinct Open AI keys the requests use")
+    options = parser.parse_args()
+
+    # Import time is measured by benchmarks/startup.py, not here
+    preload()
+    GPT().createAgent({"config": {"key": "sk-warmup"}})
+
+    print(f"{options.requests} requests, {options.keys} keys")
+
+    set_pool(None)
+    report("new agent", measure(options.requests, options.keys))
+
+    pool = AgentPool()
+    set_pool(pool)
+    report("pooled", measure(options.requests, options.keys))
+    print(f"  {'':<10} {pool.created} agents created, {pool.reused} reused")
+
+
+if __name__ == "__main__":
+    main()
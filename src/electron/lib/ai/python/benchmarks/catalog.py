@@ -0,0 +1,74 @@
+"""
+Size of the {plugins} section of the prompt as more plugins are installed.
+
+Pads the catalog of the sample request in models/test.py with generated
+plugins and compares listing every plugin with retrieving the top k for
+the prompt. Also times building the index, which happens once per catalog,
+and selecting from it, which happens on every request.
+
+Usage: python benchmarks/catalog.py [--plugins 10 100 1000] [--k 12] [--prompt "..."]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from benchmarks.fixtures import sample_request
+from prompts.catalog import PluginCatalog
+from prompts.tokens import count_tokens, is_exact
+
+VERBS = ["Blurs", "Sharpens", "Rotates", "Crops", "Inverts", "Tints", "Scales", "Masks", "Blends", "Thresholds"]
+SUBJECTS = ["image", "colour channels", "text", "shapes", "noise", "gradients", "layers", "histograms"]
+
+
+def make_catalog(size, seed=301):
+    """
+    The sample catalog followed by generated plugin entries, size in total
+    """
+    rng = random.Random(seed)
+    entries = list(sample_request()["plugin"])
+    while len(entries) < size:
+        verb = rng.choice(VERBS)
+        subject = rng.choice(SUBJECTS)
+        entries.append(
+            f"plugin{len(entries)}.{verb.lower()}{len(entries)}: {verb} the {subject} taking one "
+            f"{rng.choice(['image', 'number', 'string'])} input and returning one output"
+        )
+
+    return entries[:size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--plugins", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--prompt", default="Add two numbers together and output the result")
+    parser.add_argument("--repeat", type=int, default=200)
+    options = parser.parse_args()
+
+    print(f"plugin tokens ({'tiktoken' if is_exact() else 'estimated'}), top {options.k}")
+    for size in options.plugins:
+        entries = make_catalog(size)
+
+        start = time.perf_counter()
+        catalog = PluginCatalog(entries)
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(options.repeat):
+            selected = catalog.select(options.prompt, options.k)
+        selecting = (time.perf_counter() - start) / options.repeat
+
+        full = count_tokens(str(entries))
+        kept = count_tokens(str(selected))
+        print(
+            f"  {size:>6} plugins  all {full:>7}  selected {kept:>5} ({kept / full:.0%}, {len(selected)} plugins)"
+            f"  index {built * 1000:7.2f} ms  select {selecting * 1e6:8.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Encode and decode throughput of the IPC codecs on large graph payloads.
+
+Compares the encodings messages used to go out with, json.dumps with
+indent=4 (strategies/base.py) and json.dumps with its default separators
+(api.py), with the codecs of codec.py: compact JSON through the json
+module, compact JSON through orjson and msgpack, the last two when
+installed. Two payloads per graph size: a request as Electron sends it,
+with the nodes and edges parsed into objects, and the response to an
+addNodes call adding that many nodes.
+
+Usage: python benchmarks/codec.py [--sizes 100 1000 10000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import codec
+from benchmarks.fixtures import make_request
+
+
+def graph_request(size):
+    body = make_request(size)
+    body["nodes"] = [json.loads(node) for node in body["nodes"]]
+    body["edges"] = [json.loads(edge) for edge in body["edges"]]
+    return body
+
+
+def add_nodes_response(size):
+    return {
+        "results": [
+            {
+                "status": "success",
+                "message": "Node added",
+                "data": {"nodeId": f"n{i:x}", "inputs": [f"n{i:x}i0", f"n{i:x}i1"], "outputs": [f"n{i:x}o0"]},
+            }
+            for i in range(size)
+        ]
+    }
+
+
+def encodings():
+    """
+    name -> (encode, decode) of every encoding to compare
+    """
+    result = {
+        "json indent=4": (lambda m: json.dumps(m, indent=4).encode(), json.loads),
+        "json default": (lambda m: json.dumps(m).encode(), json.loads),
+        "json compact": (
+            lambda m: json.dumps(m, separators=(",", ":")).encode(),
+            json.loads,
+        ),
+    }
+    if codec.orjson is not None:
+        result["orjson"] = (codec.orjson.dumps, codec.orjson.loads)
+    if codec.msgpack is not None:
+        msgpack = codec.CODECS["msgpack"]
+        result["msgpack"] = (msgpack.encode, msgpack.decode)
+    return result
+
+
+def measure(function, argument, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(argument)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    missing = [name for name, module in (("orjson", codec.orjson), ("msgpack", codec.msgpack)) if module is None]
+    if missing:
+        print(f"not installed, skipped: {', '.join(missing)}")
+
+    for size in options.sizes:
+        for label, payload in (("request", graph_request(size)), ("addNodes", add_nodes_response(size))):
+            print(f"{label} with {size} nodes")
+            print(f"  {'encoding':<14} {'bytes':>10} {'encode ms':>10} {'decode ms':>10} {'encode MB/s':>12} {'decode MB/s':>12}")
+            for name, (encode, decode) in encodings().items():
+                data = encode(payload)
+                encoding = measure(encode, payload, options.repeat)
+                decoding = measure(decode, data, options.repeat)
+                megabytes = len(data) / 1e6
+                print(
+                    f"  {name:<14} {len(data):>10} {encoding * 1000:10.2f} {decoding * 1000:10.2f}"
+                    f" {megabytes / encoding:12.1f} {megabytes / decoding:12.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
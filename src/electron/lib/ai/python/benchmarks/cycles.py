@@ -0,0 +1,158 @@
+"""
+Cost of rejecting cycle-closing edges while a large graph is being built.
+
+Builds a random DAG edge by edge: every candidate edge is checked for a
+cycle and inserted if it doesn't close one. Compares a DFS per check with
+the incremental TopologicalOrder used by GraphIndex, and verifies that both
+make the same decisions.
+
+Two creation orders are measured for the incremental order: nodes created
+upstream first, as the agent usually builds graphs, where every check is
+close to constant time, and the same with a fraction of the nodes created
+out of order. A node created too late has to be moved in front of
+everything it feeds into, so those edges cost time proportional to the
+part of the graph that moves.
+
+Usage: python benchmarks/cycles.py [--nodes 10000 50000] [--degree 3] [--span 50]
+                                  [--shuffled 0.01] [--naive-limit 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "models"))
+
+from functions.graph import TopologicalOrder
+
+
+def candidates(nodes, edges, span, seed):
+    """
+    Random candidate edges. Node n has rank n in a hidden topological order.
+    Most edges agree with it so the graph keeps growing; one in ten goes
+    against it and may close a cycle. Edges connect nodes at most span ranks
+    apart (any two nodes if span is 0), since graphs are built from chains
+    of nearby operations rather than from edges between arbitrary nodes.
+    """
+    rng = random.Random(seed)
+
+    for _ in range(edges):
+        if span:
+            a = rng.randrange(nodes - 1)
+            b = min(nodes - 1, a + rng.randint(1, span))
+        else:
+            a, b = sorted(rng.sample(range(nodes), 2))
+
+        if rng.random() < 0.9:
+            yield a, b
+        else:
+            yield b, a
+
+
+def link(successors, predecessors, source, target):
+    successors[source][target] = successors[source].get(target, 0) + 1
+    predecessors[target][source] = predecessors[target].get(source, 0) + 1
+
+
+def naive(nodes, edges):
+    successors = {n: {} for n in range(nodes)}
+    predecessors = {n: {} for n in range(nodes)}
+    decisions = []
+
+    for source, target in edges:
+        stack = [target]
+        seen = {target}
+        cycle = False
+        while stack and not cycle:
+            for successor in successors[stack.pop()]:
+                if successor == source:
+                    cycle = True
+                    break
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+
+        decisions.append(cycle)
+        if not cycle:
+            link(successors, predecessors, source, target)
+
+    return decisions
+
+
+def creation_order(nodes, shuffled, seed):
+    """
+    Order in which the nodes are created. The agent mostly creates nodes
+    upstream first (inputs, then operations, then outputs); shuffled is the
+    fraction of nodes that are created at a random point instead.
+    """
+    rng = random.Random(seed)
+    ids = list(range(nodes))
+    moved = rng.sample(ids, int(nodes * shuffled))
+    for node in moved:
+        ids.remove(node)
+        ids.insert(rng.randrange(len(ids) + 1), node)
+
+    return ids
+
+
+def incremental(nodes, edges, ids):
+    successors = {n: {} for n in range(nodes)}
+    predecessors = {n: {} for n in range(nodes)}
+    order = TopologicalOrder(successors, predecessors)
+
+    for node in ids:
+        order.add(node)
+
+    decisions = []
+    for source, target in edges:
+        cycle = not order.insert(source, target)
+        decisions.append(cycle)
+        if not cycle:
+            link(successors, predecessors, source, target)
+
+    return decisions
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--degree", type=float, default=3, help="candidate edges per node")
+    parser.add_argument("--span", type=int, default=50, help="max rank distance of an edge, 0 for any")
+    parser.add_argument("--shuffled", type=float, default=0.01, help="nodes created out of order")
+    parser.add_argument("--naive-limit", type=int, default=10000, help="skip the DFS above this many nodes")
+    parser.add_argument("--seed", type=int, default=301)
+    options = parser.parse_args()
+
+    for nodes in options.nodes:
+        edges = list(candidates(nodes, int(nodes * options.degree), options.span, options.seed))
+        print(f"{nodes} nodes, {len(edges)} candidate edges")
+
+        naiveDecisions = None
+        if nodes <= options.naive_limit:
+            elapsed, naiveDecisions = timed(naive, nodes, edges)
+            print(f"  {'DFS per edge':<34} {elapsed * 1000:10.1f} ms  {elapsed / len(edges) * 1e6:8.2f} us/edge")
+            print(f"  {'':<34} {sum(naiveDecisions)} rejected as cycles")
+
+        workloads = [
+            ("incremental, upstream first", 0.0),
+            (f"incremental, {options.shuffled:.0%} out of order", options.shuffled),
+        ]
+        for label, shuffled in workloads:
+            ids = creation_order(nodes, shuffled, options.seed)
+            elapsed, decisions = timed(incremental, nodes, edges, ids)
+            print(f"  {label:<34} {elapsed * 1000:10.1f} ms  {elapsed / len(edges) * 1e6:8.2f} us/edge")
+
+            if naiveDecisions is not None and decisions != naiveDecisions:
+                print("  MISMATCH: the implementations disagree")
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+End-to-end latency of requests through the agent process, offline.
+
+Runs main.py --worker against the mock Open AI server (mock_openai.py) and
+a fake Electron peer (fake_electron.py), and sends the request "add two
+numbers and output the result" on graphs of increasing size. The mock
+answers with the calls a model would make: add the four nodes in one
+addNodes call, connect them in one addEdges call, then reply.
+
+Reports per graph size the latency percentiles of a request, the function
+call round trips and model calls it took and the prompt tokens the model
+was sent. With --model-latency 0 the latency is all overhead of the agent
+process. With --parallel the agent runs with "parallelCalls" and the mock
+makes the same changes as one function call per node and edge, all calls
+of a step in one turn. With --planner the agent runs with "planner" and the
+mock answers the planner prompt with a diff making every change at once.
+Needs langchain installed.
+
+Usage: python benchmarks/e2e.py [--sizes 2 10 100 1000 5000] [--requests 20]
+                                [--model-latency 0] [--async] [--cache] [--parallel]
+                                [--planner]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from benchmarks.fake_electron import FakeElectron
+from benchmarks.fixtures import make_request
+from benchmarks.mock_openai import MockOpenAI
+
+PROMPT = "Add two numbers and output the result"
+SIGNATURES = ["input-plugin.inputNumber", "input-plugin.inputNumber", "math-plugin.binary", "blix.output"]
+
+_NODE = re.compile(r"node id: (\S+)")
+_INPUTS = re.compile(r"input anchor ids: (\S+)")
+_OUTPUTS = re.compile(r"output anchor ids: (\S+)")
+
+
+def add_two_numbers(messages):
+    """
+    Mock script: the turn of the conversation so far
+    """
+    functions = [m for m in messages if m.get("role") == "function"]
+    if not functions:
+        return {"function_call": {"name": "addNodes", "arguments": {"signatures": SIGNATURES}}}
+
+    if len(functions) == 1:
+        # Split the addNodes results into the anchors of each node
+        items = functions[0]["content"].split("\n")
+        nodes, current = [], None
+        for line in items:
+            if _NODE.search(line):
+                current = {"inputs": [], "outputs": []}
+                nodes.append(current)
+            elif current is not None and _INPUTS.search(line):
+                current["inputs"] = _INPUTS.search(line).group(1).split(",")
+            elif current is not None and _OUTPUTS.search(line):
+                current["outputs"] = _OUTPUTS.search(line).group(1).split(",")
+
+        first, second, binary, output = nodes
+        edges = [
+            {"output": first["outputs"][0], "input": binary["inputs"][0]},
+            {"output": second["outputs"][0], "input": binary["inputs"][1]},
+            {"output": binary["outputs"][0], "input": output["inputs"][0]},
+        ]
+        return {"function_call": {"name": "addEdges", "arguments": {"edges": edges}}}
+
+    return {"content": "Added two number inputs, added them together and connected the result to an output."}
+
+
+def _turn(name, calls):
+    # Several calls in one turn, the way the multi function agent asks for them
+    actions = [{"action_name": name, "action": args} for args in calls]
+    return {"function_call": {"name": "tool_selection", "arguments": {"actions": actions}}}
+
+
+def add_two_numbers_parallel(messages):
+    """
+    Mock script: add_two_numbers with a call per node and per edge
+    """
+    functions = [m for m in messages if m.get("role") == "function"]
+    if not functions:
+        return _turn("addNode", [{"signature": s} for s in SIGNATURES])
+
+    if len(functions) == len(SIGNATURES):
+        first, second, binary, output = [json.loads(m["content"])["data"] for m in functions]
+        return _turn(
+            "addEdge",
+            [
+                {"output": first["outputs"][0], "input": binary["inputs"][0]},
+                {"output": second["outputs"][0], "input": binary["inputs"][1]},
+                {"output": binary["outputs"][0], "input": output["inputs"][0]},
+            ],
+        )
+
+    return {"content": "Added two number inputs, added them together and connected the result to an output."}
+
+
+def plan_two_numbers(messages):
+    """
+    Mock script: add_two_numbers as a single diff for the planner prompt
+    """
+    if "applyGraphDiff" not in messages[0]["content"]:
+        return add_two_numbers(messages)
+
+    diff = {
+        "nodes": [{"alias": alias, "signature": signature} for alias, signature in zip("abso", SIGNATURES)],
+        "edges": [{"output": "a.0", "input": "s.0"}, {"output": "b.0", "input": "s.1"}, {"output": "s.0", "input": "o.0"}],
+        "message": "Added two number inputs, added them together and connected the result to an output.",
+    }
+    return {"function_call": {"name": "applyGraphDiff", "arguments": diff}}
+
+
+def percentile(values, p):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 10, 100, 1000, 5000])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=0.0, help="seconds the mock waits per call")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run the worker with --async")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--no-progress", action="store_true", help="turn progress messages off")
+    parser.add_argument("--parallel", action="store_true", help="several function calls per model turn")
+    parser.add_argument("--planner", action="store_true", help="single shot planning of the graph diff")
+    options = parser.parse_args()
+
+    script = add_two_numbers_parallel if options.parallel else add_two_numbers
+    if options.planner:
+        script = plan_two_numbers
+    mock = MockOpenAI(script, options.model_latency).start()
+    electron = FakeElectron(["--async"] if options.use_async else [], {"OPENAI_API_BASE": mock.url})
+
+    config = {
+        "key": "sk-mock",
+        "cache": options.cache,
+        "progress": not options.no_progress,
+        "parallelCalls": options.parallel,
+        "planner": options.planner,
+    }
+
+    print(f"{options.requests} requests per size, model latency {options.model_latency * 1000:.0f} ms")
+    print(f"  {'nodes':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'round trips':>12} {'model calls':>12} {'prompt tokens':>14}")
+    try:
+        for size in options.sizes:
+            body = make_request(size, PROMPT)
+            body["config"] = config
+
+            # The first request of a size also pays for imports and pools
+            electron.request(body)
+            mock.reset()
+
+            results = [electron.request(body) for _ in range(options.requests)]
+            milliseconds = [r["seconds"] * 1000 for r in results]
+            print(
+                f"  {size:>6} {percentile(milliseconds, 50):9.1f} {percentile(milliseconds, 90):9.1f}"
+                f" {percentile(milliseconds, 99):9.1f}"
+                f" {statistics.mean(r['roundTrips'] for r in results):12.1f}"
+                f" {mock.requests / len(results):12.1f}"
+                f" {mock.promptTokens / len(results):14.0f}"
+            )
+    finally:
+        electron.close()
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
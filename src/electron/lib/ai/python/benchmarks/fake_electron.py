@@ -0,0 +1,209 @@
+"""
+Fake Electron peer for the agent process.
+
+Starts main.py --worker the way Electron does and speaks the StdioAPI
+protocol with it: sends requests as framed messages and answers the graph
+function calls the agent makes from a simulated graph, the way Electron's
+graph manager would. Lines the agent prints outside of messages (langchain
+debug output) are skipped.
+"""
+import itertools
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from codec import HELLO, JSON, get_codec
+from framing import HEADER, _read_exactly, write_message
+
+# signature -> (input types, output types) of the nodes the fake graph knows
+SIGNATURES = {
+    "input-plugin.inputNumber": ([], ["number"]),
+    "math-plugin.unary": (["number"], ["number"]),
+    "math-plugin.binary": (["number", "number"], ["number"]),
+    "blix.output": (["number"], []),
+}
+
+
+def _resolve(args, context):
+    # References of a transaction to the responses of its earlier calls
+    if isinstance(args, dict):
+        if "$ref" in args:
+            value = context
+            for key in args["$ref"]:
+                value = value[key]
+            return value["id"] if isinstance(value, dict) and "id" in value else value
+        return {key: _resolve(value, context) for key, value in args.items()}
+    if isinstance(args, list):
+        return [_resolve(a, context) for a in args]
+    return args
+
+
+def _failed(result):
+    if "results" in result:
+        return any(r.get("status") == "error" for r in result["results"])
+    return result.get("status") == "error"
+
+
+class FakeGraph:
+    """
+    The graph manager's side of the function calls: creates ids for new
+    nodes, anchors and edges and reports what it did
+    """
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.nodes = {}
+        self.edges = {}
+
+    def newId(self, prefix):
+        return f"{prefix}{next(self.ids):x}"
+
+    def addNode(self, signature):
+        if signature not in SIGNATURES:
+            return {"status": "error", "message": f"Node type '{signature}' does not exist"}
+
+        inputTypes, outputTypes = SIGNATURES[signature]
+        nodeId = self.newId("n")
+        inputs = [self.newId("i") for _ in inputTypes]
+        outputs = [self.newId("o") for _ in outputTypes]
+        self.nodes[nodeId] = (inputs, outputs)
+        return {
+            "status": "success",
+            "message": "Node added",
+            "data": {"nodeId": nodeId, "inputs": inputs, "outputs": outputs},
+        }
+
+    def addEdge(self, output, input):
+        edgeId = self.newId("e")
+        self.edges[edgeId] = (output, input)
+        return {"status": "success", "message": "Edge added", "data": {"edgeId": edgeId}}
+
+    def remove(self, items, id, kind):
+        if items.pop(id, None) is None:
+            return {"status": "error", "message": f"{kind} '{id}' does not exist"}
+        return {"status": "success", "message": f"{kind} removed"}
+
+    def transaction(self, calls):
+        """
+        Makes every call or, if one fails, none of them
+        """
+        saved = dict(self.nodes), dict(self.edges)
+        results = []
+        for step, call in enumerate(calls):
+            try:
+                result = self.call(call["name"], _resolve(call["args"], {"step": results}))
+            except (KeyError, IndexError, TypeError) as e:
+                result = {"status": "error", "message": f"Unresolved reference {e}"}
+
+            if _failed(result):
+                self.nodes, self.edges = saved
+                return {"status": "error", "message": result.get("message", "A call failed"), "step": step}
+            results.append(result)
+
+        return {"status": "success", "results": results}
+
+    def call(self, name, args):
+        if name == "addNode":
+            return self.addNode(args["signature"])
+        if name == "addEdge":
+            return self.addEdge(args["output"], args["input"])
+        if name == "removeNode":
+            return self.remove(self.nodes, args["id"], "Node")
+        if name == "removeEdge":
+            return self.remove(self.edges, args["id"], "Edge")
+        if name in ("updateInputValue", "updateInputValues"):
+            return {"status": "success", "message": "Input values updated"}
+        if name == "addNodes":
+            return {"results": [self.addNode(s) for s in args["signatures"]]}
+        if name == "addEdges":
+            return {"results": [self.addEdge(e["output"], e["input"]) for e in args["edges"]]}
+        if name == "removeNodes":
+            return {"results": [self.remove(self.nodes, id, "Node") for id in args["ids"]]}
+        if name == "removeEdges":
+            return {"results": [self.remove(self.edges, id, "Edge") for id in args["ids"]]}
+        if name == "transaction":
+            return self.transaction(args["calls"])
+
+        return {"status": "error", "message": f"Unknown function '{name}'"}
+
+
+class FakeElectron:
+    """
+    Parameters
+    ----------
+    args : list
+        Extra arguments for main.py, e.g. ["--async"]
+    env : dict
+        Extra environment variables for the agent process, e.g. OPENAI_API_BASE
+    codecs : list
+        Codecs to offer the agent, most preferred first, e.g. ["msgpack"].
+        None keeps the default JSON without negotiating.
+    """
+
+    def __init__(self, args=(), env=None, codecs=None):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "main.py"), "--worker", *args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env={**os.environ, **(env or {})},
+            cwd=ROOT,
+        )
+        self.codec = JSON
+
+        if codecs:
+            self.send({"type": HELLO, "codecs": codecs})
+            self.codec = get_codec(self.receive()["codec"])
+
+    def send(self, message: dict):
+        write_message(self.process.stdin, self.codec.encode(message))
+
+    def receive(self) -> dict:
+        stdout = self.process.stdout
+        while True:
+            line = stdout.readline()
+            if not line:
+                raise EOFError("The agent process exited")
+            if line.startswith(HEADER):
+                return self.codec.decode(_read_exactly(stdout, int(line[len(HEADER) :])))
+
+    def request(self, body: dict) -> dict:
+        """
+        Sends a request and serves its function calls until the agent exits.
+        Returns the final response, the time it took, the number of function
+        call round trips and every other message received.
+        """
+        graph = FakeGraph()
+        messages = []
+        roundTrips = 0
+
+        start = time.perf_counter()
+        self.send(body)
+        while True:
+            message = self.receive()
+            if message.get("type") == "function":
+                roundTrips += 1
+                self.send(graph.call(message["name"], message["args"]))
+            elif message.get("type") == "exit":
+                break
+            else:
+                messages.append(message)
+
+        return {
+            "response": message.get("message"),
+            "seconds": time.perf_counter() - start,
+            "roundTrips": roundTrips,
+            "messages": messages,
+            "graph": graph,
+        }
+
+    def close(self):
+        try:
+            self.send({"type": "shutdown"})
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
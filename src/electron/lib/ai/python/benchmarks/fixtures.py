@@ -0,0 +1,58 @@
+"""
+Request bodies shared by the benchmarks
+"""
+import ast
+import json
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def sample_request():
+    """
+    The example request in models/test.py. Read without importing the
+    module, which would pull in the model.
+    """
+    with open(os.path.join(ROOT, "models", "test.py")) as f:
+        tree = ast.parse(f.read())
+
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and getattr(statement.targets[0], "id", None) == "object":
+            request = ast.literal_eval(statement.value)
+            request.setdefault("config", {})
+            return request
+
+    raise LookupError("models/test.py has no example request")
+
+
+def make_request(size, prompt="benchmark"):
+    """
+    A request shaped like the ones Electron sends, with size binary math
+    nodes chained together and the plugins of the sample request
+    """
+    nodes = []
+    edges = []
+    for i in range(size):
+        nodes.append(
+            json.dumps(
+                {
+                    "id": f"n{i}",
+                    "signature": "math-plugin.binary",
+                    "inputs": [
+                        {"id": f"n{i}i0", "type": "number"},
+                        {"id": f"n{i}i1", "type": "number"},
+                    ],
+                    "outputs": [{"id": f"n{i}o0", "type": "number"}],
+                }
+            )
+        )
+        if i:
+            edges.append(json.dumps({"id": f"e{i}", "output": f"n{i - 1}o0", "input": f"n{i}i0"}))
+
+    return {
+        "prompt": prompt,
+        "plugin": sample_request()["plugin"],
+        "nodes": nodes,
+        "edges": edges,
+        "config": {},
+    }
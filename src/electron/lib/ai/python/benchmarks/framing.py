@@ -0,0 +1,93 @@
+"""
+Throughput of reading graph sized messages from stdin.
+
+Compares the original line by line reader (string concatenation until the
+"end of transmission" line) with framing.read_message, for both the length
+framed and the legacy sentinel format, on synthetic graphs of increasing size.
+
+Usage: python benchmarks/framing.py [--sizes 1000 5000 20000] [--repeat N]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from framing import HEADER, SENTINEL, read_message
+from benchmarks.fixtures import make_request
+
+
+def make_graph(size):
+    """
+    Encoded request with size nodes, with every node and edge on its own
+    line like pretty printed JSON
+    """
+    return json.dumps(make_request(size), indent=1)
+
+
+def legacy_receive(stdin):
+    data = ""
+    for line in stdin:
+        if line == "end of transmission\n":
+            break
+        data += line
+
+    return data
+
+
+def receive(stream):
+    return read_message(stream)[0].decode()
+
+
+def run(label, make_stream, reader, payload_size, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        stream = make_stream()
+        start = time.perf_counter()
+        reader(stream)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"  {label:<22} {best * 1000:9.2f} ms  {payload_size / best / 1e6:9.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    for size in options.sizes:
+        payload = make_graph(size).encode()
+        sentinel = payload + b"\n" + SENTINEL + b"\n"
+        framed = HEADER + str(len(payload)).encode() + b"\n" + payload
+
+        lines = payload.count(b"\n") + 1
+        print(f"{size} nodes, {len(payload) / 1e6:.2f} MB, {lines} lines")
+        run(
+            "legacy line reader",
+            lambda: io.TextIOWrapper(io.BytesIO(sentinel)),
+            legacy_receive,
+            len(payload),
+            options.repeat,
+        )
+        run(
+            "sentinel read_message",
+            lambda: io.BufferedReader(io.BytesIO(sentinel)),
+            receive,
+            len(payload),
+            options.repeat,
+        )
+        run(
+            "framed read_message",
+            lambda: io.BufferedReader(io.BytesIO(framed)),
+            receive,
+            len(payload),
+            options.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Connections opened to the model endpoint with and without the shared pool.
+
+Runs a local stand-in for the Open AI chat completions endpoint that
+answers every request at once and counts the TCP connections made to it,
+then sends requests through ChatOpenAI the way the agent does, once with
+openai's own sessions and once through models/connections.py, both
+synchronously and on asyncio. Needs langchain installed.
+
+openai already reuses a connection within a thread, until it closes the
+session of the thread three minutes after opening it. The "expired" runs
+set that lifetime to zero to show every request after it.
+
+Usage: python benchmarks/http_pool.py [--requests 50] [--prewarm]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "models"))
+
+import connections
+
+COMPLETION = json.dumps(
+    {
+        "id": "chatcmpl-standin",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-3.5-turbo-0613",
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": "done"}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+).encode("utf-8")
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment rather than waiting on delayed ACKs
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests += 1
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_llm(url):
+    from langchain.chat_models import ChatOpenAI
+
+    return ChatOpenAI(openai_api_key="sk-standin", openai_api_base=url, max_retries=0)
+
+
+def run_sync(llm, requests):
+    from langchain.schema import HumanMessage
+
+    for _ in range(requests):
+        llm([HumanMessage(content="hello")])
+
+
+async def run_async(llm, requests, pooled):
+    from langchain.schema import HumanMessage
+
+    if pooled:
+        connections.use_async_session()
+    for _ in range(requests):
+        await llm.agenerate([[HumanMessage(content="hello")]])
+    if pooled:
+        await connections.close_async()
+
+
+def measure(server, label, run):
+    server.connections = server.requests = 0
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {label:<22} {server.requests:>5} requests  {server.connections:>5} connections"
+        f"  {elapsed / max(server.requests, 1) * 1000:7.2f} ms/request"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--prewarm", action="store_true", help="connect before the pooled runs")
+    options = parser.parse_args()
+
+    import openai
+
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    llm = make_llm(url)
+    run_sync(llm, 1)
+
+    lifetime = openai.api_requestor.MAX_SESSION_LIFETIME_SECS
+
+    def expired(run):
+        def run_expired():
+            openai.api_requestor.MAX_SESSION_LIFETIME_SECS = 0
+            try:
+                run()
+            finally:
+                openai.api_requestor.MAX_SESSION_LIFETIME_SECS = lifetime
+
+        return run_expired
+
+    sync = lambda: run_sync(llm, options.requests)
+
+    print(f"stand-in at {url}")
+    measure(server, "sync, openai", sync)
+    measure(server, "sync, openai, expired", expired(sync))
+    measure(server, "async, openai", lambda: asyncio.run(run_async(llm, options.requests, False)))
+
+    connections.install()
+    if options.prewarm:
+        measure(server, "prewarm", lambda: connections.prewarm(url))
+    measure(server, "sync, pooled", sync)
+    measure(server, "sync, pooled, expired", expired(sync))
+    measure(server, "async, pooled", lambda: asyncio.run(run_async(llm, options.requests, True)))
+
+    connections.shutdown()
+    server.shutdown()
+    assert openai.requestssession is None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Local stand-in for the Open AI chat completions endpoint.
+
+Answers every model call from a script instead of a model. A script is a
+list of turns, each either a function call or a final answer:
+
+    [
+        {"function_call": {"name": "addNodes", "arguments": {"signatures": ["math-plugin.binary"]}}},
+        {"content": "Added a binary math node"}
+    ]
+
+or a callable taking the messages of the call and returning the next turn,
+for turns that depend on the results of earlier function calls. A
+conversation's position in the script is the number of assistant messages
+it already has, so every run of the agent replays the script from the
+start. Streamed and non-streamed calls are both supported.
+
+The server counts requests, connections and prompt tokens, and can wait
+latency seconds before answering to stand in for model time.
+
+Faults can be injected into calls to stand in for a slow or failing API:
+faults is a callable taking the number of the call, counted from 0, and
+returning None or a fault, e.g. {"delay": 2.0} to answer 2 seconds late,
+{"status": 503} to answer with that error or {"stall": 5.0} to stop a
+streamed answer for 5 seconds after its first chunk. random_faults makes a
+given share of calls slow or failing.
+
+Usage: python benchmarks/mock_openai.py [--port 8765] [--script turns.json] [--latency 0.5]
+                                        [--error-rate 0.1] [--slow-rate 0.05] [--slow-latency 2]
+       then point the agent at it with OPENAI_API_BASE=http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from prompts.tokens import count_tokens
+
+DEFAULT_SCRIPT = [{"content": "Done"}]
+
+
+def _chunk(delta, finish=None):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-3.5-turbo-0613",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+
+
+class MockOpenAI:
+    """
+    Parameters
+    ----------
+    script : list or callable
+        Turns to answer with, see the module docstring
+    latency : float
+        Seconds to wait before answering every call
+    faults : callable
+        Fault of every call, see the module docstring
+    """
+
+    def __init__(self, script=None, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, faults=None):
+        self.script = script or DEFAULT_SCRIPT
+        self.latency = latency
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.reset()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = -1
+
+            def setup(self):
+                super().setup()
+                with mock.lock:
+                    mock.connections += 1
+
+            def do_HEAD(self):
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                data, contentType, status = mock.answer(body)
+                # Either the answer or (seconds to wait, part) pairs
+                parts = data if isinstance(data, list) else [(0, data)]
+
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", contentType)
+                    self.send_header("Content-Length", str(sum(len(part) for _, part in parts)))
+                    self.end_headers()
+                    for wait, part in parts:
+                        if wait:
+                            self.wfile.flush()
+                            time.sleep(wait)
+                        self.wfile.write(part)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client timed out or took the answer of a hedged call
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.connections = 0
+            self.promptTokens = 0
+            self.faulted = 0
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def turn(self, messages) -> dict:
+        if callable(self.script):
+            return self.script(messages)
+
+        position = sum(1 for message in messages if message.get("role") == "assistant")
+        return self.script[min(position, len(self.script) - 1)]
+
+    def answer(self, body):
+        tokens = count_tokens(json.dumps(body["messages"])) + count_tokens(json.dumps(body.get("functions", [])))
+        with self.lock:
+            number = self.requests
+            self.requests += 1
+            self.promptTokens += tokens
+
+        fault = self.faults(number) if self.faults else None
+        if fault:
+            with self.lock:
+                self.faulted += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+        if fault and fault.get("delay"):
+            time.sleep(fault["delay"])
+        if fault and fault.get("status"):
+            status = fault["status"]
+            error = {"error": {"message": f"Injected error {status}", "type": "server_error"}}
+            return json.dumps(error).encode("utf-8"), "application/json", status
+
+        turn = self.turn(body["messages"])
+        if "function_call" in turn:
+            call = turn["function_call"]
+            arguments = call["arguments"]
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments)
+            message = {"role": "assistant", "content": None, "function_call": {"name": call["name"], "arguments": arguments}}
+            finish = "function_call"
+        else:
+            message = {"role": "assistant", "content": turn["content"]}
+            finish = "stop"
+
+        if body.get("stream"):
+            data = self.stream(message, finish)
+            if fault and fault.get("stall"):
+                first = data.index(b"\n\n") + 2
+                data = [(0, data[:first]), (fault["stall"], data[first:])]
+            return data, "text/event-stream", 200
+
+        completion = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-3.5-turbo-0613",
+            "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+            "usage": {"prompt_tokens": tokens, "completion_tokens": 1, "total_tokens": tokens + 1},
+        }
+        return json.dumps(completion).encode("utf-8"), "application/json", 200
+
+    def stream(self, message, finish) -> bytes:
+        """
+        The message as server-sent events, split the way the API splits it:
+        function call arguments and content a few characters at a time
+        """
+        if message.get("function_call"):
+            call = message["function_call"]
+            chunks = [_chunk({"role": "assistant", "content": None, "function_call": {"name": call["name"], "arguments": ""}})]
+            arguments = call["arguments"]
+            chunks += [_chunk({"function_call": {"arguments": arguments[i : i + 8]}}) for i in range(0, len(arguments), 8)]
+        else:
+            chunks = [_chunk({"role": "assistant", "content": ""})]
+            content = message["content"]
+            chunks += [_chunk({"content": content[i : i + 4]}) for i in range(0, len(content), 4)]
+        chunks.append(_chunk({}, finish))
+
+        return b"".join(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n" for chunk in chunks) + b"data: [DONE]\n\n"
+
+
+def random_faults(errorRate: float = 0.0, slowRate: float = 0.0, slowLatency: float = 2.0, status: int = 503, seed: int = 0):
+    """
+    Faults failing errorRate of the calls with status and delaying slowRate
+    of them by slowLatency seconds, the same calls for the same seed
+    """
+
+    def fault(number):
+        draw = random.Random(seed * 1000003 + number).random()
+        if draw < errorRate:
+            return {"status": status}
+        if draw < errorRate + slowRate:
+            return {"delay": slowLatency}
+        return None
+
+    return fault
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", help="JSON file with the list of turns")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of calls answered late")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="seconds late calls are delayed by")
+    options = parser.parse_args()
+
+    script = None
+    if options.script:
+        with open(options.script) as f:
+            script = json.load(f)
+
+    faults = None
+    if options.error_rate or options.slow_rate:
+        faults = random_faults(options.error_rate, options.slow_rate, options.slow_latency)
+
+    mock = MockOpenAI(script, options.latency, port=options.port, faults=faults).start()
+    print(f"mock Open AI at {mock.url}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Prompt size of the graph in every encoding.
+
+Reports the tokens the {nodes} and {edges} sections of the prompt take up
+with each graph format, for the sample request in models/test.py and for
+generated graphs. Token counts are exact with tiktoken installed and
+estimated otherwise.
+
+Usage: python benchmarks/prompt_size.py [--sizes 10 100 1000 5000]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from benchmarks.fixtures import make_request, sample_request
+from prompts.encoders import ENCODERS, encode_graph
+from prompts.tokens import count_tokens, is_exact
+
+
+def report(label, request):
+    counts = {}
+    for format in ENCODERS:
+        nodes, edges = encode_graph(request["nodes"], request["edges"], format)
+        counts[format] = count_tokens(nodes) + count_tokens(edges)
+
+    baseline = counts["json"]
+    cells = "  ".join(
+        f"{format} {tokens:>8}" + ("" if format == "json" else f" ({tokens / baseline:.0%})")
+        for format, tokens in counts.items()
+    )
+    print(f"  {label:<20} {cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    options = parser.parse_args()
+
+    print(f"graph tokens ({'tiktoken' if is_exact() else 'estimated'})")
+    report("models/test.py", sample_request())
+    for size in options.sizes:
+        report(f"{size} nodes", make_request(size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Model calls against a slow or failing API, with and without the deadlines,
+retries, hedging and circuit breaking of models/resilience.py.
+
+Sends calls through ChatOpenAI the way the agent does to the local stand-in
+for Open AI, which injects faults into them:
+
+slow tail
+    a few calls answered a second late, with and without hedging, sync
+    and on asyncio
+errors
+    a share of the calls failing with a 503, with and without retries
+outage
+    every call failing, with the circuit breaker and with one that never
+    opens
+deadline
+    a call that hangs, with a deadline of a second
+stalled stream
+    a streamed answer that stops after its first chunk, with a deadline of
+    a second, sync and on asyncio
+
+Every scenario checks what the policy did, e.g. that retries made every
+call succeed, that the breaker opened and that hedged calls were won by
+the hedge, and the asyncio runs check that no aiohttp session was left
+open. A failed check ends the run with an AssertionError.
+
+Needs langchain installed.
+
+Usage: python benchmarks/resilience.py [--calls 200] [--slow-rate 0.03] [--error-rate 0.2]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "models"))
+
+import connections
+import resilience
+from benchmarks.mock_openai import MockOpenAI, random_faults
+from resilience import CircuitBreaker, LatencyTracker, ModelCalls, ModelClient, RetryPolicy
+
+
+def make_llm(url, streaming=False):
+    from langchain.chat_models import ChatOpenAI
+
+    llm = ChatOpenAI(openai_api_key="sk-standin", openai_api_base=url, max_retries=1, streaming=streaming)
+    llm.client = ModelClient(llm.client)
+    return llm
+
+
+def policy(**settings):
+    settings.setdefault("retry", RetryPolicy(0))
+    settings.setdefault("breaker", CircuitBreaker(10**9))
+    settings.setdefault("latencies", LatencyTracker(100, 20))
+    calls = ModelCalls(**settings)
+    resilience.set_model_calls(calls)
+    return calls
+
+
+def call(llm):
+    from langchain.schema import HumanMessage
+
+    start = time.perf_counter()
+    try:
+        llm([HumanMessage(content="hello")])
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, type(e).__name__
+
+
+async def acall(llm):
+    from langchain.schema import HumanMessage
+
+    start = time.perf_counter()
+    try:
+        await llm.agenerate([[HumanMessage(content="hello")]])
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, type(e).__name__
+
+
+def run(llm, calls, hedge=False, asynchronous=False, deadline=None):
+    resilience.set_hedging(hedge)
+    resilience.set_deadline(deadline)
+    if not asynchronous:
+        return [call(llm) for _ in range(calls)]
+
+    leaks = []
+
+    async def main():
+        # Sessions left open are reported to the loop when collected
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: leaks.append(context["message"]))
+        resilience.set_hedging(hedge)
+        resilience.set_deadline(deadline)
+        connections.use_async_session()
+        try:
+            return [await acall(llm) for _ in range(calls)]
+        finally:
+            await connections.close_async()
+            await asyncio.sleep(0.1)
+            gc.collect()
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        results = asyncio.run(main())
+        gc.collect()
+
+    leaks += [str(warning.message) for warning in caught if "Unclosed" in str(warning.message)]
+    assert not leaks, f"{len(leaks)} aiohttp sessions or connections left open: {leaks[0]}"
+    return results
+
+
+def failures(results) -> int:
+    return sum(1 for _, error in results if error)
+
+
+def report(label, results, mock, calls=None):
+    latencies = sorted(seconds for seconds, _ in results)
+    failed = sum(1 for _, error in results if error)
+    at = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    line = (
+        f"  {label:<28} {at(0.5):8.1f} {at(0.99):8.1f} {latencies[-1] * 1000:8.1f}"
+        f" {len(results) - failed:>5}/{len(results):<5} {mock.requests:>6}"
+    )
+    if calls is not None:
+        line += f"  retries {calls.retries}, hedges {calls.hedges} ({calls.hedgeWins} won), rejected {calls.breaker.rejected}"
+    print(line)
+
+
+def header(title):
+    print(title)
+    print(f"  {'':<28} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'succeeded':>11} {'sent':>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the stand-in takes per call")
+    options = parser.parse_args()
+
+    mock = MockOpenAI(latency=options.latency).start()
+    llm = make_llm(mock.url)
+
+    header(f"slow tail: {options.slow_rate:.0%} of calls {options.slow_latency:.1f} s late")
+    slow = sum(1 for number in range(20, options.calls) if random_faults(slowRate=options.slow_rate)(number))
+    for asynchronous in (False, True):
+        for hedge in (False, True):
+            mock.faults = random_faults(slowRate=options.slow_rate, slowLatency=options.slow_latency)
+            mock.reset()
+            calls = policy(hedgePercentile=0.9)
+            results = run(llm, options.calls, hedge, asynchronous)
+            label = f"{'async' if asynchronous else 'sync'}, {'hedged' if hedge else 'not hedged'}"
+            report(label, results, mock, calls)
+
+            assert failures(results) == 0
+            if hedge and slow:
+                assert calls.hedgeWins > 0, "no slow call was won by its hedge"
+            if not hedge:
+                assert calls.hedges == 0 and mock.requests == options.calls
+
+    header(f"errors: {options.error_rate:.0%} of calls fail with 503")
+    for retries in (0, 2):
+        mock.faults = random_faults(errorRate=options.error_rate)
+        mock.reset()
+        calls = policy(retry=RetryPolicy(retries, base=0.05, cap=0.5))
+        results = run(llm, options.calls)
+        report(f"{retries} retries", results, mock, calls)
+
+        assert mock.requests == options.calls + calls.retries
+        if retries:
+            # Only calls failing every attempt fail, about error rate ** 3 of them
+            assert calls.retries > 0 and failures(results) <= unretried // 4, "retries did not make calls succeed"
+        else:
+            unretried = failures(results)
+            assert calls.retries == 0 and unretried == mock.faulted
+
+    header("outage: every call fails with 503")
+    for threshold, label in ((10**9, "no circuit breaker"), (5, "breaker after 5 failures")):
+        mock.faults = random_faults(errorRate=1.0)
+        mock.reset()
+        calls = policy(retry=RetryPolicy(2, base=0.05, cap=0.5), breaker=CircuitBreaker(threshold, 30.0))
+        results = run(llm, 50)
+        report(label, results, mock, calls)
+
+        assert failures(results) == 50
+        if threshold == 5:
+            assert calls.breaker.state == CircuitBreaker.OPEN, "the breaker did not open"
+            assert mock.requests == 5 and calls.breaker.rejected == 49
+        else:
+            assert mock.requests == 150 and calls.breaker.rejected == 0
+
+    header("deadline: a call hangs for 10 s")
+    mock.faults = lambda number: {"delay": 10.0}
+    mock.reset()
+    calls = policy(retry=RetryPolicy(2))
+    results = run(llm, 1, deadline=1.0)
+    report(f"1 s deadline, {results[0][1]}", results, mock, calls)
+    assert results[0][1] == "DeadlineExceeded" and results[0][0] < 2.0
+
+    header("stalled stream: a streamed answer stops for 10 s after its first chunk, 1 s deadline")
+    streaming = make_llm(mock.url, streaming=True)
+    for asynchronous in (False, True):
+        mock.faults = lambda number: {"stall": 10.0}
+        mock.reset()
+        calls = policy(retry=RetryPolicy(2))
+        results = run(streaming, 1, asynchronous=asynchronous, deadline=1.0)
+        report(f"{'async' if asynchronous else 'sync'}, {results[0][1]}", results, mock, calls)
+        assert results[0][1] == "DeadlineExceeded" and results[0][0] < 2.0
+
+    mock.stop()
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cold start benchmark for the agent process.
+
+Starts main.py the same way Electron does and reports
+  - the time from spawning the interpreter until main.py first calls
+    api.receive(), i.e. until it is ready for a request
+  - the import time of every module loaded before that point, taken from
+    python -X importtime
+
+Usage: python benchmarks/startup.py [--runs N] [--top N] [--worker] [--budget MS]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Runs main.py but stops it at its first receive() instead of waiting on stdin
+PROBE = """
+import os, runpy, sys
+sys.path.insert(0, {root!r})
+sys.argv = ["main.py"] + {args!r}
+import api
+
+def first_receive(self):
+    sys.stdout.write("ready\\n")
+    sys.stdout.flush()
+    os._exit(0)
+
+api.StdioAPI.receive = first_receive
+runpy.run_path(os.path.join({root!r}, "main.py"), run_name="__main__")
+"""
+
+
+def run_probe(args):
+    """
+    Returns the seconds until the first receive() and the raw importtime log
+    """
+    code = PROBE.format(root=ROOT, args=args)
+
+    # The importtime log easily outgrows a pipe buffer, so it goes to a file
+    with tempfile.TemporaryFile("w+") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=log,
+            text=True,
+        )
+        line = proc.stdout.readline()
+        elapsed = time.perf_counter() - start
+        proc.wait()
+
+        log.seek(0)
+        stderr = log.read()
+
+    if line.strip() != "ready":
+        raise RuntimeError("main.py exited before calling receive():\n" + stderr)
+
+    return elapsed, stderr
+
+
+def parse_importtime(log):
+    """
+    Maps every imported module to its (self, cumulative) import time in seconds
+    """
+    modules = {}
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--worker", action="store_true", help="start main.py with --worker")
+    parser.add_argument(
+        "--budget", type=float, help="exit with an error if the median exceeds this many ms"
+    )
+    options = parser.parse_args()
+
+    args = ["--worker"] if options.worker else []
+    timings = []
+    imports = {}
+
+    for _ in range(options.runs):
+        elapsed, log = run_probe(args)
+        timings.append(elapsed)
+        for name, times in parse_importtime(log).items():
+            imports.setdefault(name, []).append(times)
+
+    print(f"time to first receive() over {options.runs} runs")
+    print(f"  min    {min(timings) * 1000:8.1f} ms")
+    print(f"  median {statistics.median(timings) * 1000:8.1f} ms")
+    print(f"  max    {max(timings) * 1000:8.1f} ms")
+
+    medians = {
+        name: (
+            statistics.median(t[0] for t in times),
+            statistics.median(t[1] for t in times),
+        )
+        for name, times in imports.items()
+    }
+    ranked = sorted(medians.items(), key=lambda item: item[1][1], reverse=True)
+
+    print(f"\nslowest imports before first receive() (median of {options.runs})")
+    print(f"  {'cumulative':>10}  {'self':>8}  module")
+    for name, (self_time, cumulative) in ranked[: options.top]:
+        print(f"  {cumulative * 1000:8.1f}ms  {self_time * 1000:6.1f}ms  {name}")
+
+    heavy = [name for name in medians if name.split(".")[0] in ("langchain", "openai")]
+    if heavy:
+        print(f"\nWARNING: {len(heavy)} langchain/openai modules imported before first receive()")
+
+    if options.budget is not None and statistics.median(timings) * 1000 > options.budget:
+        print(f"\nFAIL: median exceeds the {options.budget:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
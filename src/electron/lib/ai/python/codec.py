@@ -0,0 +1,134 @@
+"""
+Codecs turning the messages exchanged with Electron into bytes and back.
+
+"json" is compact JSON without any whitespace, encoded with orjson when it
+is installed and the json module otherwise. "msgpack" is MessagePack,
+available when the msgpack package is installed, and needs length framed
+messages since its payloads are binary.
+
+Every transport starts out speaking JSON. Electron can switch to another
+codec by sending the codecs it supports, in order of preference, as the
+first message of a worker:
+
+    {"type": "hello", "codecs": ["msgpack", "json"]}
+
+The agent answers, still in JSON, with the codec it picked, and both sides
+use it for every message after that:
+
+    {"type": "hello", "codec": "msgpack"}
+
+Whatever the codec, received messages are handed on as JSON text, which is
+what the function calls give the model.
+"""
+import json
+from typing import Iterable, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Message type opening a codec negotiation
+HELLO = "hello"
+
+
+def _dumps(message) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(message)
+        except TypeError:
+            # Types orjson does not know, e.g. ints past 64 bits
+            pass
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+def dumps(message) -> str:
+    """
+    Compact JSON text of a message
+    """
+    return _dumps(message).decode()
+
+
+def loads(text):
+    """
+    Parses JSON text or bytes. Raises json.JSONDecodeError if it is not JSON,
+    with either backend.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    def encode(self, message) -> bytes:
+        """
+        The payload of a message, given as a dict or as JSON text
+        """
+        if isinstance(message, str):
+            return message.encode()
+        return _dumps(message)
+
+    def decode(self, payload):
+        return loads(payload)
+
+    def text(self, payload) -> str:
+        """
+        The JSON text of a payload
+        """
+        return payload.decode()
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message) -> bytes:
+        if isinstance(message, str):
+            message = loads(message)
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+    def text(self, payload) -> str:
+        return dumps(self.decode(payload))
+
+
+JSON = JsonCodec()
+
+# Codecs in the order the agent prefers them
+CODECS = {"msgpack": MsgpackCodec(), "json": JSON}
+
+
+def available() -> List[str]:
+    """
+    Names of the codecs whose packages are installed, most preferred first
+    """
+    return [name for name in CODECS if name != "msgpack" or msgpack is not None]
+
+
+def negotiate(offered: Iterable[str], framed: bool = True) -> Optional[str]:
+    """
+    The codec to use out of the ones Electron offered: the first of its
+    choices that is available here, binary ones only over framed messages.
+    None if there is none.
+    """
+    names = available()
+    for name in offered or ():
+        if name in names and (framed or not CODECS[name].binary):
+            return name
+    return None
+
+
+def get_codec(name: str):
+    if name not in available():
+        raise ValueError(f"Codec '{name}' is not available")
+    return CODECS[name]
@@ -0,0 +1,104 @@
+"""
+Message framing shared by the transports.
+
+A framed message is a header line holding the payload size in bytes,
+followed by exactly that many bytes of payload:
+
+    Content-Length: 20\n
+    {"type": "shutdown"}
+
+so the reader can pull the whole payload in with one bulk read and the
+payload may contain anything, including newlines.
+
+For compatibility the reader also still understands the original format,
+where the payload is sent line by line and terminated by a line reading
+"end of transmission". Which format is used is detected per message from
+its first line.
+
+A header whose size is not a number can't say where its payload ends. The
+header line itself is then returned as the payload, which the reader
+rejects as malformed like any other payload that is not a valid message.
+"""
+import itertools
+from typing import Optional, Tuple
+
+HEADER = b"Content-Length: "
+SENTINEL = b"end of transmission"
+
+_SENTINEL_LF = SENTINEL + b"\n"
+_SENTINEL_CRLF = SENTINEL + b"\r\n"
+
+
+def read_message(stream) -> Tuple[Optional[bytearray], bool]:
+    """
+    Reads one message from a binary stream
+    ...
+    Parameters
+    ----------
+    stream : BufferedReader
+        binary stream to read from, e.g. sys.stdin.buffer
+
+    Returns
+    -------
+    payload : bytearray | None
+        the message payload, or None if the stream was closed before a
+        message started
+    framed : bool
+        whether the message was length framed
+    """
+    line = stream.readline()
+    if not line:
+        return None, False
+
+    if line.startswith(HEADER):
+        try:
+            length = int(line[len(HEADER) :])
+        except ValueError:
+            length = -1
+        if length < 0:
+            return bytearray(line), True
+        return _read_exactly(stream, length), True
+
+    # Legacy sentinel terminated message
+    parts = []
+    for line in itertools.chain((line,), stream):
+        if line == _SENTINEL_LF or line == _SENTINEL_CRLF:
+            break
+        parts.append(line)
+
+    return bytearray().join(parts), False
+
+
+def _read_exactly(stream, length: int) -> bytearray:
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+
+    # readinto normally fills the whole buffer in one call, but pipes and
+    # sockets may hand the payload over in pieces
+    while received < length:
+        count = stream.readinto(view[received:])
+        if not count:
+            raise EOFError(f"Stream closed after {received} of {length} bytes")
+        received += count
+
+    return buffer
+
+
+def write_message(stream, payload: bytes, framed: bool = True):
+    """
+    Writes one message to a binary stream and flushes it
+    ...
+    Parameters
+    ----------
+    stream : BufferedWriter
+        binary stream to write to, e.g. sys.stdout.buffer
+    payload : bytes
+        encoded message
+    framed : bool
+        prefix the payload with a length header, otherwise it is written as is
+    """
+    if framed:
+        stream.write(HEADER + str(len(payload)).encode() + b"\n")
+    stream.write(payload)
+    stream.flush()
@@ -1,18 +1,265 @@
-from api import get_api
-from models.gpt import GPT
-import json
+from api import get_api, set_api, get_async_api, current_session, SocketAPI
+from models.gpt import GPT, preload
+
+# Imported the way models/gpt.py imports them, so both share one cache, one
+# agent pool and one conversation memory
+from agents import AgentPool, set_pool
+from cache import ResponseCache, set_cache
+from memory import MemoryStore, set_memory
+from resilience import CircuitBreaker, ModelCalls, RetryPolicy, set_model_calls
+import connections
+from codec import HELLO, loads
+from functions.calls import clear_request
+import argparse
+import contextlib
+import threading
+import time
+from profiling import profile
+from tracing import finish_trace, span, start_trace
+
+# Message type Electron sends to stop a worker started with --worker
+SHUTDOWN = "shutdown"
+
+
+def reset(api):
+    """
+    Clears all state belonging to the previous request so that a warm worker
+    starts every request from the same place as a fresh process would.
+    """
+    api.reset()
+    clear_request()
+
+
+def malformed(error) -> dict:
+    return {"type": "error", "error": str(error), "message": "Received a malformed request"}
+
+
+def parse_request(text):
+    """
+    The request in a message, raising ValueError if it is not a JSON object
+    """
+    data = loads(text)
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    return data
+
+
+def handle_request(api, data, received=None):
+    start_trace(data.get("config"), received)
+    profiler = profile(data.get("config"))
+
+    with span("request"), profiler or contextlib.nullcontext():
+        agent = GPT()
+        finalResponse = agent.sendPrompt(data)
+
+    trace = finish_trace()
+    if trace:
+        api.send(trace)
+    if profiler:
+        api.send(profiler.result)
+    api.send({"type": "exit", "message": finalResponse})
+
+
+def serve(api):
+    """
+    Keeps the interpreter (and everything it has imported) alive and handles
+    requests one after the other until Electron sends a shutdown message or
+    closes stdin.
+    """
+    while True:
+        text_data = api.receive()
+        received = time.perf_counter_ns()
+
+        # An empty transmission means stdin was closed
+        if not text_data.strip():
+            break
+
+        try:
+            data = parse_request(text_data)
+        except ValueError as e:
+            api.send(malformed(e))
+            continue
+
+        if data.get("type") == SHUTDOWN:
+            break
+
+        if data.get("type") == HELLO:
+            answer = api.hello(data)
+            api.send(answer)
+            api.useCodec(answer["codec"])
+            continue
+
+        reset(api)
+        handle_request(api, data, received)
+
+
+async def handle_request_async(api, data, received=None):
+    session = data.get("session")
+    current_session.set(session)
+    start_trace(data.get("config"), received)
+    profiler = profile(data.get("config"))
+
+    try:
+        with span("request"), profiler or contextlib.nullcontext():
+            agent = GPT()
+            finalResponse = await agent.asendPrompt(data)
+
+        trace = finish_trace()
+        if trace:
+            await api.send(trace)
+        if profiler:
+            await api.send(profiler.result)
+        await api.send({"type": "exit", "message": finalResponse})
+    finally:
+        api.close(session)
+
+
+async def serve_async(api):
+    """
+    Like serve, but runs every request as its own asyncio task so that
+    requests from different sessions are handled concurrently. Waits for
+    running requests to finish before shutting down.
+    """
+    import asyncio
+
+    api.start()
+    running = set()
+
+    while True:
+        text_data = await api.next_request()
+        received = time.perf_counter_ns()
+
+        if not text_data.strip():
+            break
+
+        try:
+            data = parse_request(text_data)
+        except ValueError as e:
+            await api.send(malformed(e))
+            continue
+
+        if data.get("type") == SHUTDOWN:
+            break
+
+        # Register the session before the next message can be routed
+        api.open(data.get("session"))
+        task = asyncio.ensure_future(handle_request_async(api, data, received))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    if running:
+        await asyncio.gather(*running)
+
+    await connections.close_async()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--worker", action="store_true", help="handle requests until told to shut down"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="with --worker, handle requests of different sessions concurrently",
+    )
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--socket", metavar="PATH", help="connect to a Unix domain socket")
+    transport.add_argument("--tcp", metavar="HOST:PORT", help="connect to a TCP socket")
+    parser.add_argument("--buffer-size", type=int, default=65536, help="socket buffer size in bytes")
+    parser.add_argument("--cache-dir", metavar="PATH", help="keep cached responses in this directory")
+    parser.add_argument(
+        "--cache-size", type=int, default=128, help="cached responses kept in memory, 0 to disable"
+    )
+    parser.add_argument(
+        "--http-connections", type=int, default=10, help="connections to Open AI kept open"
+    )
+    parser.add_argument(
+        "--prewarm", action="store_true", help="with --worker, connect to Open AI before the first request"
+    )
+    parser.add_argument(
+        "--agents", type=int, default=4, help="agents kept ready between requests, 0 to disable"
+    )
+    parser.add_argument(
+        "--agent-idle", type=float, default=600, metavar="SECONDS", help="drop agents unused for this long"
+    )
+    parser.add_argument(
+        "--memory-tokens", type=int, default=1000, help="tokens of conversation kept per session, 0 to disable"
+    )
+    parser.add_argument(
+        "--memory-sessions", type=int, default=32, help="sessions whose conversation is kept"
+    )
+    parser.add_argument(
+        "--deadline", type=float, default=180, metavar="SECONDS", help="time a request may take, 0 for no limit"
+    )
+    parser.add_argument(
+        "--model-timeout", type=float, default=60, metavar="SECONDS", help="time a single model call may take"
+    )
+    parser.add_argument(
+        "--model-retries", type=int, default=2, help="retries of a failed model call"
+    )
+    parser.add_argument(
+        "--breaker-failures", type=int, default=5, help="failed model calls in a row that stop calls for a while"
+    )
+
+    args = parser.parse_args()
+    if args.use_async and (args.socket or args.tcp):
+        parser.error("--async is only supported over stdio")
+
+    return args
+
 
 def main():
+    args = parse_args()
+
+    if args.socket:
+        set_api(SocketAPI(path=args.socket, bufferSize=args.buffer_size))
+    elif args.tcp:
+        host, port = args.tcp.rsplit(":", 1)
+        set_api(SocketAPI(host, int(port), bufferSize=args.buffer_size))
+
+    if args.cache_size > 0:
+        set_cache(ResponseCache(args.cache_size, args.cache_dir))
+    else:
+        set_cache(None)
+
+    set_pool(AgentPool(args.agents, args.agent_idle) if args.agents > 0 else None)
+    set_memory(MemoryStore(args.memory_tokens, args.memory_sessions) if args.memory_tokens > 0 else None)
+    connections.configure(maxConnections=args.http_connections)
+    set_model_calls(
+        ModelCalls(
+            args.deadline or None,
+            args.model_timeout,
+            RetryPolicy(args.model_retries),
+            CircuitBreaker(args.breaker_failures),
+        )
+    )
+
     api = get_api()
 
-    text_data = api.receive()
-    data = json.loads(text_data)
+    if args.worker:
+        # Warm up langchain while waiting for the first request
+        threading.Thread(target=preload, args=(args.prewarm,), daemon=True).start()
 
-    agent = GPT()
-    finalResponse = agent.sendPrompt(data)
+        if args.use_async:
+            import asyncio
 
-    api.send({"type": "exit", "message": finalResponse})
+            asyncio.run(serve_async(get_async_api()))
+        else:
+            serve(api)
+        return
+
+    text_data = api.receive()
+    received = time.perf_counter_ns()
+    try:
+        data = parse_request(text_data)
+    except ValueError as e:
+        api.send(malformed(e))
+        return
+
+    handle_request(api, data, received)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
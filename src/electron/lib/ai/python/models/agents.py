@@ -0,0 +1,74 @@
+import hashlib
+import time
+from typing import Callable, Hashable, Optional
+
+from lru import IdleLRU
+
+
+class AgentPool:
+    """
+    Agents kept ready between requests, so that a request only pays for
+    building the model client, tool schemas and executor the first time.
+    Agents keep no state of their own between runs; everything belonging to
+    a request lives in its prompt and context variables.
+
+    Parameters
+    ----------
+    maxAgents : int
+        Agents kept at once, the least recently used is dropped beyond that
+    idleTimeout : float
+        Seconds an agent may go unused before it is dropped
+    """
+
+    def __init__(self, maxAgents: int = 4, idleTimeout: float = 600.0, clock: Callable[[], float] = time.monotonic):
+        self.agents = IdleLRU(maxAgents, idleTimeout, clock)
+        self.created = 0
+        self.reused = 0
+
+    def get(self, key: Hashable, create: Callable[[], object]):
+        """
+        The agent for key, created with create if there is none
+        """
+        agent = self.agents.get(key)
+        if agent is None:
+            agent = create()
+            self.agents.put(key, agent)
+            self.created += 1
+        else:
+            self.reused += 1
+
+        return agent
+
+    def evict(self, now: Optional[float] = None):
+        """
+        Drops the agents that have been idle for longer than idleTimeout
+        """
+        self.agents.evict(now)
+
+    def clear(self):
+        self.agents.clear()
+
+    def __len__(self):
+        return len(self.agents)
+
+
+def agent_key(apiKey: str, settings: dict) -> tuple:
+    """
+    Pool key of the agent for an Open AI key and model settings. The key is
+    hashed so that it is not kept around in another place.
+    """
+    return (hashlib.sha256(apiKey.encode("utf-8")).hexdigest(), tuple(sorted(settings.items())))
+
+
+# ========== Pool Config ==========
+
+_pool = AgentPool()
+
+
+def set_pool(pool: Optional[AgentPool]):
+    global _pool
+    _pool = pool
+
+
+def get_pool() -> Optional[AgentPool]:
+    return _pool
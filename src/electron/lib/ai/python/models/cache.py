@@ -0,0 +1,158 @@
+"""
+Cache of finished requests, so that a prompt repeated on the same graph
+with the same plugins skips the model.
+
+An entry holds the agent's final response and the plan of the graph
+function calls it made (see plans.py). A hit replays the plan against
+Electron instead of running the agent.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from typing import Optional
+
+from plans import graph_shape
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    The prompt without differences in case, spacing or final punctuation
+    """
+    return _SPACE.sub(" ", prompt).strip().rstrip(".!?").strip().casefold()
+
+
+def cache_key(body) -> str:
+    """
+    Hash of everything in a request that decides what the agent does: the
+    prompt, the shape of the graph and the installed plugins. Plans refer
+    to the graph by position rather than by id, so graphs that only differ
+    in their ids share entries.
+    """
+    canonical = json.dumps(
+        {
+            "prompt": normalize_prompt(body.get("prompt", "")),
+            "graph": graph_shape(body),
+            "plugins": sorted(body.get("plugin", [])),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of finished requests, kept in memory and optionally in a
+    directory so that entries survive restarts
+
+    Parameters
+    ----------
+    maxEntries : int
+        Entries kept in memory
+    directory : str, optional
+        Directory entries are written to, one JSON file per entry
+    maxFiles : int
+        Entries kept in directory, the least recently used are deleted
+    """
+
+    def __init__(self, maxEntries: int = 128, directory: Optional[str] = None, maxFiles: int = 1024):
+        self.maxEntries = maxEntries
+        self.directory = directory
+        self.maxFiles = maxFiles
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+
+        if self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+                os.utime(self._path(key))
+            except (OSError, ValueError):
+                return None
+            self._remember(key, entry)
+
+        return entry
+
+    def put(self, key: str, entry: dict):
+        self._remember(key, entry)
+
+        if self.directory:
+            temporary = self._path(key) + ".tmp"
+            try:
+                with open(temporary, "w") as f:
+                    json.dump(entry, f)
+                os.replace(temporary, self._path(key))
+                self._prune()
+            except OSError:
+                pass
+
+    def discard(self, key: str):
+        self.entries.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+
+    def _prune(self):
+        files = [f for f in os.listdir(self.directory) if f.endswith(".json")]
+        if len(files) <= self.maxFiles:
+            return
+
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(self.directory, f)))
+        for f in files[: len(files) - self.maxFiles]:
+            os.remove(os.path.join(self.directory, f))
+
+    def count(self, hit: bool) -> dict:
+        """
+        Counts a lookup and returns the message reporting it to Electron
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return {
+            "type": "cache",
+            "hit": hit,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.entries),
+        }
+
+
+# ========== Cache Config ==========
+
+_cache = ResponseCache()
+
+
+def set_cache(cache: Optional[ResponseCache]):
+    global _cache
+    _cache = cache
+
+
+def get_cache() -> Optional[ResponseCache]:
+    return _cache
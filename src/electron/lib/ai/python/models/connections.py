@@ -0,0 +1,184 @@
+"""
+Shared HTTP connection pools for the requests the model makes to Open AI,
+so that the TCP and TLS handshakes are paid once per connection rather
+than once per agent iteration.
+
+openai 0.27 keeps one requests session per thread but closes it every
+three minutes, and opens a new aiohttp session (and connection) for every
+asynchronous call. install() hands it a shared session that outlives both,
+and use_async_session() does the same for the asyncio path.
+
+Nothing here imports openai until a pool is installed, so that importing
+this module stays free.
+"""
+import contextvars
+import threading
+from typing import Optional
+
+_settings = {
+    # Connections kept open per host
+    "maxConnections": 10,
+    # Seconds an idle connection is kept open by the asyncio pool
+    "keepAlive": 60.0,
+    # Retries for failed connection attempts
+    "retries": 2,
+}
+
+_session = None
+_asyncSession = None
+_lock = threading.Lock()
+
+# Responses of the asyncio pool opened in the current context, while they
+# are tracked
+_responses = contextvars.ContextVar("responses", default=None)
+
+
+def configure(maxConnections: Optional[int] = None, keepAlive: Optional[float] = None, retries: Optional[int] = None):
+    """
+    Sets the size and keep-alive of the pools installed from now on
+    """
+    for name, value in (("maxConnections", maxConnections), ("keepAlive", keepAlive), ("retries", retries)):
+        if value is not None:
+            _settings[name] = value
+
+
+def _shared_session_type():
+    import requests
+
+    class SharedSession(requests.Session):
+        """
+        Session that ignores close(), which openai calls on the session of
+        its thread every few minutes. shutdown() really closes it.
+        """
+
+        def close(self):
+            pass
+
+        def shutdown(self):
+            super().close()
+
+    return SharedSession
+
+
+def install():
+    """
+    Makes openai send its requests through the shared pool. Safe to call
+    on every request and from any thread.
+    """
+    global _session
+
+    if _session is not None:
+        return _session
+
+    with _lock:
+        if _session is None:
+            import openai
+            import requests
+
+            session = _shared_session_type()()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=_settings["maxConnections"],
+                pool_maxsize=_settings["maxConnections"],
+                max_retries=_settings["retries"],
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+            openai.requestssession = session
+            _session = session
+
+    return _session
+
+
+def _tracked_response_type():
+    import aiohttp
+
+    class TrackedResponse(aiohttp.ClientResponse):
+        """
+        Response that adds itself to the responses tracked in its context
+        """
+
+        async def start(self, connection):
+            responses = _responses.get()
+            if responses is not None:
+                responses.append(self)
+            return await super().start(connection)
+
+    return TrackedResponse
+
+
+def track_responses() -> list:
+    """
+    Collects the responses of the asyncio pool opened from now on in the
+    current context, and in tasks started from it, for close_responses
+    """
+    responses = []
+    _responses.set(responses)
+    return responses
+
+
+def close_responses(responses: list):
+    """
+    Closes the responses that were not read to the end, like a stream cut
+    short, whose connections aiohttp keeps until they are garbage collected
+    """
+    for response in responses:
+        if not response.closed:
+            response.close()
+    responses.clear()
+
+
+def use_async_session():
+    """
+    Makes openai's asynchronous requests in the current context go through
+    the shared asyncio pool. Must be called from the event loop, in the
+    task that makes the requests.
+    """
+    global _asyncSession
+
+    import aiohttp
+    import openai
+
+    if _asyncSession is None or _asyncSession.closed:
+        connector = aiohttp.TCPConnector(
+            limit=_settings["maxConnections"], keepalive_timeout=_settings["keepAlive"]
+        )
+        _asyncSession = aiohttp.ClientSession(connector=connector, response_class=_tracked_response_type())
+
+    openai.aiosession.set(_asyncSession)
+    return _asyncSession
+
+
+async def close_async():
+    global _asyncSession
+
+    if _asyncSession is not None:
+        await _asyncSession.close()
+        _asyncSession = None
+
+
+def prewarm(url: Optional[str] = None, timeout: float = 5.0) -> bool:
+    """
+    Opens a connection to the Open AI endpoint (or url) ahead of the first
+    request. Any response will do; only the connection is kept.
+    """
+    session = install()
+
+    import openai
+
+    try:
+        session.head(url or openai.api_base, timeout=timeout)
+        return True
+    except Exception:
+        return False
+
+
+def shutdown():
+    global _session
+
+    if _session is not None:
+        import openai
+
+        openai.requestssession = None
+        _session.shutdown()
+        _session = None
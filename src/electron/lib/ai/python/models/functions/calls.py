@@ -0,0 +1,263 @@
+import contextvars
+import json
+from typing import Dict, List, Optional, Tuple
+
+from api import get_api, get_async_api
+from functions.graph import get_graph
+from tracing import span
+
+# Calls are sent without importing langchain, so that a cached request can
+# be replayed without loading the model.
+
+
+def call_function(name: str, args: dict) -> str:
+    """
+    Sends a single graph function call to Electron and waits for its response.
+    Calls the graph index already knows to be invalid are answered locally,
+    calls already sent as part of their turn are answered with their
+    result, and calls made while a transaction is open are queued in it.
+    """
+    prepared = claim_result(name, args)
+    if prepared is not None:
+        return prepared
+
+    transaction = current_transaction.get()
+    if transaction is not None:
+        return transaction.queue(name, args)
+
+    with span("function", function=name):
+        graph = get_graph()
+        error = graph and graph.check(name, args)
+        if error:
+            return error
+
+        api = get_api()
+        with span("ipc"):
+            api.send({"type": "function", "name": name, "args": args})
+            res = api.receive()
+
+        if graph:
+            graph.apply(name, args, res)
+        record_call(name, args, res)
+        return res
+
+
+async def acall_function(name: str, args: dict) -> str:
+    """
+    Asyncio version of call_function, for agents run with arun
+    """
+    prepared = claim_result(name, args)
+    if prepared is not None:
+        return prepared
+
+    transaction = current_transaction.get()
+    if transaction is not None:
+        return transaction.queue(name, args)
+
+    with span("function", function=name):
+        graph = get_graph()
+        error = graph and graph.check(name, args)
+        if error:
+            return error
+
+        api = get_async_api()
+        with span("ipc"):
+            await api.send({"type": "function", "name": name, "args": args})
+            res = await api.receive()
+
+        if graph:
+            graph.apply(name, args, res)
+        record_call(name, args, res)
+        return res
+
+
+def succeeded(response) -> bool:
+    """
+    Whether Electron carried out a call, or at least part of a batch call
+    """
+    try:
+        response = json.loads(response) if isinstance(response, str) else response
+    except ValueError:
+        return False
+
+    if isinstance(response, dict) and "results" in response:
+        response = response["results"]
+    if isinstance(response, list):
+        return any(succeeded(result) for result in response)
+
+    return isinstance(response, dict) and response.get("status") != "error"
+
+
+# ========== Call Recording ==========
+
+# Transaction calls are queued in instead of being sent, see transactions.py
+current_transaction = contextvars.ContextVar("current_transaction", default=None)
+
+# Successful calls of the current request, in the order they were made
+current_calls = contextvars.ContextVar("current_calls", default=None)
+
+
+def record_calls() -> List[dict]:
+    """
+    Starts recording the calls of the current request and returns the list
+    they are recorded in
+    """
+    calls = []
+    current_calls.set(calls)
+    return calls
+
+
+def stop_recording():
+    current_calls.set(None)
+
+
+def clear_request():
+    """
+    Drops the recorded calls, the results of the last turn and any open
+    transaction of the previous request, which otherwise carry over to the
+    next request of a worker
+    """
+    clear_turn()
+    stop_recording()
+    current_transaction.set(None)
+
+
+def record_call(name: str, args: dict, response: str):
+    calls: Optional[List[dict]] = current_calls.get()
+    if calls is not None and succeeded(response):
+        calls.append({"name": name, "args": args, "response": response})
+
+
+# ========== Turns of Several Calls ==========
+
+# Single function -> (batch function, list argument of the batch, item of a call)
+BATCHES = {
+    "addNode": ("addNodes", "signatures", lambda args: args["signature"]),
+    "removeNode": ("removeNodes", "ids", lambda args: args["id"]),
+    "addEdge": ("addEdges", "edges", lambda args: {"output": args["output"], "input": args["input"]}),
+    "removeEdge": ("removeEdges", "ids", lambda args: args["id"]),
+}
+
+# Results of the calls of the current turn sent ahead of their tools,
+# by call_key
+current_results = contextvars.ContextVar("current_results", default=None)
+
+
+def _normalize(value):
+    # Tools parse numbers into floats, the model may send them as ints
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def call_key(name: str, args: dict) -> str:
+    return name + json.dumps(_normalize(args), sort_keys=True)
+
+
+def schedule(calls: List[Tuple[str, dict]]) -> List[List[int]]:
+    """
+    Groups the calls of a turn into the messages to send, as lists of call
+    indices in the order to send them. New nodes come first, since the other
+    calls of the turn can only refer to nodes that exist; the rest keep the
+    order the model gave them. Consecutive calls of a function with a batch
+    version share one message.
+    """
+    order = [i for i, (name, _) in enumerate(calls) if name == "addNode"]
+    order += [i for i, (name, _) in enumerate(calls) if name != "addNode"]
+
+    groups: List[List[int]] = []
+    for i in order:
+        name = calls[i][0]
+        if groups and name in BATCHES and calls[groups[-1][0]][0] == name:
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+
+def _message(calls, group) -> Tuple[str, dict]:
+    name, args = calls[group[0]]
+    if len(group) == 1:
+        return name, args
+
+    batch, field, item = BATCHES[name]
+    return batch, {field: [item(calls[i][1]) for i in group]}
+
+
+def _split(group, response) -> Optional[List[str]]:
+    """
+    The result of every call of a group from the response to its message,
+    or None if the response does not have one per call
+    """
+    if len(group) == 1:
+        return [response]
+
+    try:
+        response = json.loads(response) if isinstance(response, str) else response
+    except ValueError:
+        return None
+
+    if isinstance(response, dict):
+        response = response.get("results")
+    if not isinstance(response, list) or len(response) != len(group):
+        return None
+
+    return [json.dumps(result) for result in response]
+
+
+def _store(results: Dict[str, List[str]], calls, group, response) -> bool:
+    split = _split(group, response)
+    if split is None:
+        return False
+
+    for i, result in zip(group, split):
+        results.setdefault(call_key(*calls[i]), []).append(result)
+    return True
+
+
+def dispatch_turn(calls: List[Tuple[str, dict]]):
+    """
+    Sends the independent calls a model made in one turn as few messages as
+    possible, ahead of their tools, which then pick up their own result in
+    order. If a batch is rejected as a whole the calls left are sent by
+    their tools one at a time instead.
+    """
+    clear_turn()
+    results: Dict[str, List[str]] = {}
+    for group in schedule(calls):
+        if not _store(results, calls, group, call_function(*_message(calls, group))):
+            break
+    current_results.set(results)
+
+
+async def adispatch_turn(calls: List[Tuple[str, dict]]):
+    """
+    Asyncio version of dispatch_turn
+    """
+    clear_turn()
+    results: Dict[str, List[str]] = {}
+    for group in schedule(calls):
+        if not _store(results, calls, group, await acall_function(*_message(calls, group))):
+            break
+    current_results.set(results)
+
+
+def clear_turn():
+    current_results.set(None)
+
+
+def claim_result(name: str, args: dict) -> Optional[str]:
+    """
+    The result of a call already sent with its turn, taken so that it is
+    only handed out once
+    """
+    results = current_results.get()
+    if not results:
+        return None
+
+    pending = results.get(call_key(name, args))
+    return pending.pop(0) if pending else None
@@ -0,0 +1,505 @@
+import contextvars
+import json
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Anchor(NamedTuple):
+    nodeId: str
+    type: Optional[str]
+    isInput: bool
+
+
+def _load(item):
+    return json.loads(item) if isinstance(item, str) else item
+
+
+class TopologicalOrder:
+    """
+    Dynamic topological order of the nodes of a DAG (Pearce & Kelly, 2006),
+    used to tell whether a new edge would close a cycle.
+
+    Every node has a position such that all edges point from a lower to a
+    higher position. An edge that already agrees with the order can't close a
+    cycle, which is an O(1) check. Otherwise only the nodes positioned between
+    the two endpoints are searched, and inserting the edge reorders just
+    those nodes. Removing edges or nodes never invalidates the order.
+
+    The adjacency dicts are shared with (and kept up to date by) GraphIndex.
+    """
+
+    def __init__(self, successors: Dict[str, Dict[str, int]], predecessors: Dict[str, Dict[str, int]]):
+        self.successors = successors
+        self.predecessors = predecessors
+        self.position: Dict[str, int] = {}
+        self.next = 0
+
+    def rebuild(self):
+        """
+        Orders every node from scratch (Kahn's algorithm). Nodes that are part
+        of a cycle, which a valid graph never has, are placed at the end.
+        """
+        indegree = {node: len(links) for node, links in self.predecessors.items()}
+        for node in self.successors:
+            indegree.setdefault(node, 0)
+
+        ready = [node for node, degree in indegree.items() if degree == 0]
+        self.position = {}
+        self.next = 0
+
+        while ready:
+            node = ready.pop()
+            self.add(node)
+            for successor in self.successors.get(node, ()):
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    ready.append(successor)
+
+        for node in indegree:
+            if node not in self.position:
+                self.add(node)
+
+    def add(self, node: str):
+        self.position[node] = self.next
+        self.next += 1
+
+    def remove(self, node: str):
+        self.position.pop(node, None)
+
+    def createsCycle(self, source: str, target: str) -> bool:
+        """
+        Whether an edge from source to target would close a cycle
+        """
+        if source == target:
+            return True
+
+        upper = self.position.get(source)
+        lower = self.position.get(target)
+        if upper is None or lower is None or upper < lower:
+            return False
+
+        return self._forward(target, upper, source) is None
+
+    def insert(self, source: str, target: str) -> bool:
+        """
+        Updates the order for a new edge from source to target. Returns False
+        (and leaves the order untouched) if the edge closes a cycle.
+        """
+        if source == target:
+            return False
+
+        upper = self.position.get(source)
+        lower = self.position.get(target)
+        if upper is None or lower is None or upper < lower:
+            return True
+
+        forward = self._forward(target, upper, source)
+        if forward is None:
+            return False
+
+        backward = self._backward(source, lower)
+        self._reorder(backward, forward)
+        return True
+
+    def _forward(self, start, upper, stop):
+        """
+        Nodes reachable from start whose position is at most upper, or None if
+        stop is one of them
+        """
+        position = self.position
+        successors = self.successors
+        found = [start]
+        seen = {start}
+
+        for node in found:
+            for successor in successors[node]:
+                if successor in seen:
+                    continue
+                if successor == stop:
+                    return None
+                if position[successor] <= upper:
+                    seen.add(successor)
+                    found.append(successor)
+
+        return found
+
+    def _backward(self, start, lower):
+        """
+        Nodes that reach start whose position is at least lower
+        """
+        position = self.position
+        predecessors = self.predecessors
+        found = [start]
+        seen = {start}
+
+        for node in found:
+            for predecessor in predecessors[node]:
+                if predecessor not in seen and position[predecessor] >= lower:
+                    seen.add(predecessor)
+                    found.append(predecessor)
+
+        return found
+
+    def _reorder(self, backward, forward):
+        # The affected nodes keep the same set of positions, but everything
+        # that reaches the source now comes before everything the target reaches
+        position = self.position
+        backward.sort(key=position.__getitem__)
+        forward.sort(key=position.__getitem__)
+        nodes = backward + forward
+        slots = sorted(position[node] for node in nodes)
+
+        for node, slot in zip(nodes, slots):
+            position[node] = slot
+
+
+class GraphIndex:
+    """
+    Indexed copy of the graph a request is working on, used to reject invalid
+    edits locally instead of sending them to Electron and spending another
+    model turn on the error.
+
+    The index is built from the nodes and edges in the request body and kept
+    up to date from the responses to the tools' function calls.
+
+    Attributes
+    ----------
+    nodes : Dict[str, dict]
+        node id -> {"signature", "inputs": [anchor ids], "outputs": [anchor ids]}
+    anchors : Dict[str, Anchor]
+        anchor id -> node, type and direction of the anchor
+    edges : Dict[str, tuple]
+        edge id -> (output anchor id, input anchor id)
+    inputEdges : Dict[str, str]
+        input anchor id -> id of the edge connected to it
+    outputEdges : Dict[str, set]
+        output anchor id -> ids of the edges connected to it
+    successors : Dict[str, Dict[str, int]]
+        node id -> number of edges to every node it feeds into
+    predecessors : Dict[str, Dict[str, int]]
+        node id -> number of edges from every node feeding into it
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, dict] = {}
+        self.anchors: Dict[str, Anchor] = {}
+        self.edges: Dict[str, tuple] = {}
+        self.inputEdges: Dict[str, str] = {}
+        self.outputEdges: Dict[str, set] = {}
+        self.successors: Dict[str, Dict[str, int]] = {}
+        self.predecessors: Dict[str, Dict[str, int]] = {}
+        # signature -> ([input types], [output types]), to type new nodes
+        self.signatures: Dict[str, tuple] = {}
+        self.order = TopologicalOrder(self.successors, self.predecessors)
+
+    @classmethod
+    def fromBody(cls, body) -> "GraphIndex":
+        """
+        Builds the index from the "nodes" and "edges" of a request body,
+        given either as JSON strings or as dicts
+        """
+        graph = cls()
+
+        for node in body.get("nodes", []):
+            node = _load(node)
+            graph.addNode(node["id"], node.get("signature"), node.get("inputs", []), node.get("outputs", []))
+
+        for edge in body.get("edges", []):
+            edge = _load(edge)
+            graph.addEdge(edge["id"], edge["output"], edge["input"], ordered=False)
+
+        graph.order.rebuild()
+        return graph
+
+    def copy(self) -> "GraphIndex":
+        """
+        Independent copy of the index, to check edits against before they
+        are made
+        """
+        graph = GraphIndex()
+        # Node dicts, anchors, edges and signatures are replaced, never changed
+        graph.nodes = dict(self.nodes)
+        graph.anchors = dict(self.anchors)
+        graph.edges = dict(self.edges)
+        graph.inputEdges = dict(self.inputEdges)
+        graph.outputEdges = {anchor: set(edges) for anchor, edges in self.outputEdges.items()}
+        graph.successors = {node: dict(links) for node, links in self.successors.items()}
+        graph.predecessors = {node: dict(links) for node, links in self.predecessors.items()}
+        graph.signatures = dict(self.signatures)
+
+        graph.order = TopologicalOrder(graph.successors, graph.predecessors)
+        graph.order.position = dict(self.order.position)
+        graph.order.next = self.order.next
+        return graph
+
+    # ========== Mutations ==========
+
+    def addNode(self, id: str, signature: Optional[str], inputs: List, outputs: List):
+        """
+        Adds a node. Anchors are either {"id", "type"} dicts or bare ids, in
+        which case their types are taken from other nodes with the same
+        signature when possible.
+        """
+        inputTypes, outputTypes = self.signatures.get(signature, ([], []))
+        inputs = self._addAnchors(id, inputs, inputTypes, True)
+        outputs = self._addAnchors(id, outputs, outputTypes, False)
+
+        self.nodes[id] = {"signature": signature, "inputs": inputs, "outputs": outputs}
+        self.successors.setdefault(id, {})
+        self.predecessors.setdefault(id, {})
+        self.order.add(id)
+
+        if signature and signature not in self.signatures:
+            self.signatures[signature] = (
+                [self.anchors[a].type for a in inputs],
+                [self.anchors[a].type for a in outputs],
+            )
+
+    def _addAnchors(self, nodeId, anchors, types, isInput) -> List[str]:
+        ids = []
+        for i, anchor in enumerate(anchors):
+            if isinstance(anchor, dict):
+                anchorId, anchorType = anchor["id"], anchor.get("type")
+            else:
+                anchorId, anchorType = anchor, types[i] if i < len(types) else None
+
+            self.anchors[anchorId] = Anchor(nodeId, anchorType, isInput)
+            ids.append(anchorId)
+
+        return ids
+
+    def removeNode(self, id: str):
+        node = self.nodes.pop(id, None)
+        if node is None:
+            return
+
+        connected = [self.inputEdges[a] for a in node["inputs"] if a in self.inputEdges]
+        for anchorId in node["outputs"]:
+            connected.extend(self.outputEdges.get(anchorId, ()))
+
+        for edgeId in connected:
+            self.removeEdge(edgeId)
+
+        for anchorId in node["inputs"] + node["outputs"]:
+            self.anchors.pop(anchorId, None)
+
+        self.successors.pop(id, None)
+        self.predecessors.pop(id, None)
+        self.order.remove(id)
+
+    def addEdge(self, id: str, output: str, input: str, ordered: bool = True):
+        """
+        Adds an edge. With ordered=False the topological order is not updated
+        and has to be rebuilt once all edges are in.
+        """
+        self.edges[id] = (output, input)
+        self.inputEdges[input] = id
+        self.outputEdges.setdefault(output, set()).add(id)
+
+        source, target = self._nodesOf(output, input)
+        if source is not None and target is not None:
+            if ordered and not self.order.insert(source, target):
+                # Electron accepted an edge that closes a cycle, so there
+                # is no valid order anymore, settle for any order
+                self._link(source, target, 1)
+                self.order.rebuild()
+                return
+
+            self._link(source, target, 1)
+
+    def removeEdge(self, id: str):
+        edge = self.edges.pop(id, None)
+        if edge is None:
+            return
+
+        output, input = edge
+        if self.inputEdges.get(input) == id:
+            del self.inputEdges[input]
+        self.outputEdges.get(output, set()).discard(id)
+
+        source, target = self._nodesOf(output, input)
+        if source is not None and target is not None:
+            self._link(source, target, -1)
+
+    def _nodesOf(self, output, input):
+        source = self.anchors.get(output)
+        target = self.anchors.get(input)
+        return (source and source.nodeId, target and target.nodeId)
+
+    def _link(self, source, target, count):
+        for adjacency, a, b in ((self.successors, source, target), (self.predecessors, target, source)):
+            links = adjacency.setdefault(a, {})
+            links[b] = links.get(b, 0) + count
+            if links[b] <= 0:
+                del links[b]
+
+    # ========== Validation ==========
+
+    def checkEdge(self, output: str, input: str) -> Optional[str]:
+        """
+        Returns why an edge from output to input can't be added, or None if it
+        looks valid. Anchors the index doesn't know are left to Electron.
+        """
+        source = self.anchors.get(output)
+        target = self.anchors.get(input)
+
+        if source is not None and source.isInput:
+            return f"'{output}' is an input anchor, edges must start at an output anchor"
+        if target is not None and not target.isInput:
+            return f"'{input}' is an output anchor, edges must end at an input anchor"
+
+        if input in self.inputEdges:
+            return (
+                f"Input anchor '{input}' is already connected by edge '{self.inputEdges[input]}'. "
+                "Remove that edge first or use another input anchor"
+            )
+
+        if source is None or target is None:
+            return None
+
+        if source.type and target.type and source.type != target.type:
+            return (
+                f"Anchor '{output}' is of type {source.type} but anchor '{input}' "
+                f"is of type {target.type}, only anchors of the same type can be connected"
+            )
+
+        if self.createsCycle(source.nodeId, target.nodeId):
+            return f"Connecting '{output}' to '{input}' would create a cycle"
+
+        return None
+
+    def createsCycle(self, source: str, target: str) -> bool:
+        """
+        Whether an edge from node source to node target would close a cycle
+        """
+        return self.order.createsCycle(source, target)
+
+    def check(self, name: str, args: dict) -> Optional[str]:
+        """
+        Returns an error for the model if a function call can be rejected
+        without asking Electron, otherwise None
+        """
+        if name == "addEdge":
+            error = self.checkEdge(args["output"], args["input"])
+            return error and f"Error: {error}"
+
+        if name == "addEdges":
+            errors = []
+            inputs = set()
+            # Every valid edge is added for the edges after it to be checked
+            # against, as two edges can close a cycle neither closes alone.
+            # Removing them again leaves a valid order.
+            added = []
+            try:
+                for i, edge in enumerate(args["edges"]):
+                    if edge["input"] in inputs:
+                        error = f"Input anchor '{edge['input']}' is used by more than one edge"
+                    else:
+                        error = self.checkEdge(edge["output"], edge["input"])
+                    inputs.add(edge["input"])
+
+                    if error:
+                        errors.append(f"{i}. {edge['output']} -> {edge['input']}: {error}")
+                    else:
+                        added.append(f"addEdges {i}")
+                        self.addEdge(added[-1], edge["output"], edge["input"])
+            finally:
+                for id in added:
+                    self.removeEdge(id)
+
+            if errors:
+                return "Error: none of the edges were added\n" + "\n".join(errors) + "\n"
+
+        if name in ("removeNode", "removeEdge"):
+            error = self.checkExists(name, args["id"])
+            return error and f"Error: {error}"
+
+        if name in ("removeNodes", "removeEdges"):
+            single = name[:-1]
+            errors = []
+            for i, id in enumerate(args["ids"]):
+                error = self.checkExists(single, id)
+                if error:
+                    errors.append(f"{i}. {id}: {error}")
+
+            if errors:
+                what = "nodes" if name == "removeNodes" else "edges"
+                return f"Error: none of the {what} were removed\n" + "\n".join(errors) + "\n"
+
+        return None
+
+    def checkExists(self, name: str, id) -> Optional[str]:
+        """
+        Returns why the node or edge removed by name can't be found, or None
+        if the index knows it
+        """
+        kind, known = ("Node", self.nodes) if name == "removeNode" else ("Edge", self.edges)
+        if not isinstance(id, str) or id not in known:
+            return f"{kind} '{id}' does not exist"
+        return None
+
+    # ========== Updates from responses ==========
+
+    def apply(self, name: str, args: dict, response: str):
+        """
+        Updates the index from Electron's response to a function call
+        """
+        try:
+            response = json.loads(response)
+        except (TypeError, ValueError):
+            return
+
+        if name in ("addNode", "removeNode", "addEdge", "removeEdge"):
+            self._applyResult(name, args, response)
+            return
+
+        if not isinstance(response, (list, dict)):
+            return
+
+        results = response.get("results", []) if isinstance(response, dict) else response
+
+        if name == "addNodes":
+            calls = [("addNode", {"signature": s}) for s in args["signatures"]]
+        elif name == "removeNodes":
+            calls = [("removeNode", {"id": id}) for id in args["ids"]]
+        elif name == "addEdges":
+            calls = [("addEdge", edge) for edge in args["edges"]]
+        elif name == "removeEdges":
+            calls = [("removeEdge", {"id": id}) for id in args["ids"]]
+        else:
+            return
+
+        for (single, singleArgs), result in zip(calls, results):
+            self._applyResult(single, singleArgs, result)
+
+    def _applyResult(self, name, args, result):
+        if not isinstance(result, dict) or result.get("status") == "error":
+            return
+
+        data = result.get("data") or {}
+
+        if name == "addNode":
+            nodeId = data.get("nodeId") or data.get("id")
+            if nodeId:
+                self.addNode(nodeId, args["signature"], data.get("inputs", []), data.get("outputs", []))
+        elif name == "removeNode":
+            self.removeNode(args["id"])
+        elif name == "addEdge":
+            edgeId = data.get("edgeId") or data.get("id")
+            if edgeId:
+                self.addEdge(edgeId, args["output"], args["input"])
+        elif name == "removeEdge":
+            self.removeEdge(args["id"])
+
+
+# ========== Graph Config ==========
+
+# Index of the graph the current request works on
+current_graph = contextvars.ContextVar("current_graph", default=None)
+
+
+def set_graph(graph: Optional[GraphIndex]):
+    current_graph.set(graph)
+
+
+def get_graph() -> Optional[GraphIndex]:
+    return current_graph.get()
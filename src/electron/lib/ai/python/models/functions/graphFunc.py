@@ -1,5 +1,4 @@
 from typing import Optional, Type
-from langchain.tools import  format_tool_to_openai_function
 from pydantic import BaseModel, Field
 from typing import Type, List
 from langchain.tools.base import BaseTool,ToolException
@@ -13,6 +12,18 @@ def _handle_error(error: ToolException) -> str:
     )
 
 
+class threadedTool(BaseTool):
+    """
+    Base of the tools below, whose _run blocks on the BASE commands reading
+    stdin, so their _arun runs _run in a worker thread
+    """
+
+    async def _arun(self, *args, **kwargs) -> str:
+        import asyncio
+
+        return await asyncio.to_thread(self._run, *args, **kwargs)
+
+
 class addNodeInput(BaseModel):
     signature : str =    Field(description="Signature/type of the node e.g 'math-plugin.binary', 'math-plugin.unary'")
 
@@ -57,7 +68,7 @@ class Functions:
 
     api = None
 
-    class addNodeTool(BaseTool):
+    class addNodeTool(threadedTool):
         """
         Class to represent addNode function to language model
         ...
@@ -73,9 +84,6 @@ class Functions:
         -------
         run(self,signature)
             Pushes the command to add a node to the graph to the commands list
-
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
 
@@ -94,14 +102,9 @@ class Functions:
                 else:
                     return response["message"] + "\n Parameters: input anchor ids: " + ','.join(response["data"]["inputs"]) +"\n output anchor ids: "+','.join(response["data"]["outputs"])+"\n"
 
-        async def _arun(
-            self,
-        ) -> str:
-            raise NotImplementedError("This tool does not support async execution yet")
-        
         args_schema: Optional[Type[BaseModel]] = addNodeInput
 
-    class removeNodeTool( BaseTool):
+    class removeNodeTool(threadedTool):
         """
         Class to represent removeNode function to language model
         ...
@@ -117,9 +120,6 @@ class Functions:
         -------
         run(self,signature)
             Pushes the command to remove a node from the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
         name: str = "removeNode"
@@ -133,14 +133,9 @@ class Functions:
                 return Functions.api.commands.removeNode(id)
 
 
-        async def _arun(
-            self,
-        ) -> str:
-            raise NotImplementedError("This tool does not support async execution yet")
-        
         args_schema: Optional[Type[BaseModel]] = removeNodeInput
 
-    class addEdgeTool( BaseTool):
+    class addEdgeTool(threadedTool):
         """
         Class to represent addEdge function to language model
         ...
@@ -156,9 +151,6 @@ class Functions:
         -------
         run(self,From,To)
             Pushes the command to add an edge (from output to input) to the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
             
 
@@ -181,15 +173,10 @@ class Functions:
 
 
 
-        async def _arun(
-            self,
-        ) -> str:
-            raise NotImplementedError("This tool does not support async execution yet")
-        
         args_schema: Optional[Type[BaseModel]] = addEdgeInput
 
 
-    class removeEdgeTool( BaseTool):
+    class removeEdgeTool(threadedTool):
         """
         Class to represent removeEdge function to language model
         ...
@@ -205,9 +192,6 @@ class Functions:
         -------
         run(self,signature)
             Pushes the command to remove an Edge from the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
         name: str = "removeEdge"
@@ -220,17 +204,12 @@ class Functions:
                 Functions.api.logs.append("removeEdge command added\n")
                 return Functions.api.commands.removeEdge(id)
 
-        async def _arun(
-            self,
-        ) -> str:
-            raise NotImplementedError("This tool does not support async execution yet")
-        
         args_schema: Optional[Type[BaseModel]] = removeEdgeInput
 
 
 
 
-    class addNodes(BaseTool):
+    class addNodes(threadedTool):
         """
         Class to represent addNodes function to language model
         ...
@@ -246,9 +225,6 @@ class Functions:
         -------
         run(self,signature)
             Pushes the command to add Nodes to the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
         name: str = "addNodes"
@@ -260,10 +236,8 @@ class Functions:
             # commands.append({ "command": "addNodes", "signatures": signatures})
             return "addNodes command added\n"
 
-        async def _arun(self) -> str:
-            raise NotImplementedError("This tool does not support async execution")
 
-    class removeNodes(BaseTool):
+    class removeNodes(threadedTool):
         """
         Class to represent removeNodes function to language model
         ...
@@ -281,9 +255,6 @@ class Functions:
         -------
         run(self,ids)
             Pushes the command to remove Nodes from the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
         name: str = "removeNodes"
@@ -295,10 +266,7 @@ class Functions:
             # commands.append({ "command": "removeNodes", "ids": ids})
             return "removeNodes command added\n"
 
-        async def _arun(self) -> str:
-            raise NotImplementedError("This tool does not support async execution")
-        
-    class addEdges(BaseTool):
+    class addEdges(threadedTool):
         """
         Class to represent addEdges function to language model
         ...
@@ -320,9 +288,6 @@ class addEdgesInput(BaseModel):
         -------
         run(self,ids)
             Pushes the command to addEdges to the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
         name: str = "addEdges"
@@ -337,11 +302,9 @@ class addEdgesInput(BaseModel):
             # commands.append({ "command": "addEdges", "edges": edges})
             return "addEdges command added\n"
 
-        async def _arun(self) -> str:
-            raise NotImplementedError("This tool does not support async execution")
 
 
-    class removeEdges(BaseTool):
+    class removeEdges(threadedTool):
         """
         Class to represent removeEdges function to language model
         ...
@@ -359,9 +322,6 @@ class addEdgesInput(BaseModel):
         -------
         run(self,ids)
             Pushes the command to removeEdges from the graph to the commands list
-        
-        _arun(self)
-            Raises an error as this function does not support async execution
         """
 
         name: str = "removeEdges"
@@ -372,8 +332,6 @@ class addEdgesInput(BaseModel):
         def _run(self, ids: List[str]):
             # commands.append({ "command": "removeEdges", "ids": ids})
             return "removeEdges command added\n"
-        async def _arun(self) -> str:
-            raise NotImplementedError("This tool does not support async execution")
 
     tools = [addNodeTool(),removeNodeTool(),addEdgeTool(),removeEdgeTool()]
 
@@ -0,0 +1,51 @@
+from typing import Any, List, Tuple, Union
+
+from langchain.agents.openai_functions_multi_agent.base import OpenAIMultiFunctionsAgent
+from langchain.callbacks.manager import Callbacks
+from langchain.schema import AgentAction, AgentFinish
+
+from functions.calls import adispatch_turn, clear_turn, dispatch_turn
+
+
+def _calls(decision) -> List[Tuple[str, dict]]:
+    if not isinstance(decision, list) or len(decision) < 2:
+        return []
+    if not all(isinstance(action.tool_input, dict) for action in decision):
+        return []
+    return [(action.tool, action.tool_input) for action in decision]
+
+
+class ParallelFunctionsAgent(OpenAIMultiFunctionsAgent):
+    """
+    Agent letting the model make several function calls in one turn. The
+    calls of a turn are sent to Electron together, batched where a batch
+    function exists, before the executor runs their tools one by one.
+    """
+
+    def plan(
+        self,
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        callbacks: Callbacks = None,
+        **kwargs: Any,
+    ) -> Union[List[AgentAction], AgentFinish]:
+        decision = super().plan(intermediate_steps, callbacks=callbacks, **kwargs)
+        calls = _calls(decision)
+        if calls:
+            dispatch_turn(calls)
+        else:
+            clear_turn()
+        return decision
+
+    async def aplan(
+        self,
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        callbacks: Callbacks = None,
+        **kwargs: Any,
+    ) -> Union[List[AgentAction], AgentFinish]:
+        decision = await super().aplan(intermediate_steps, callbacks=callbacks, **kwargs)
+        calls = _calls(decision)
+        if calls:
+            await adispatch_turn(calls)
+        else:
+            clear_turn()
+        return decision
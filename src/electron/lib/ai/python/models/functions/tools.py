@@ -1,9 +1,8 @@
 from typing import Optional, Type, Dict, Union
-from langchain.tools import format_tool_to_openai_function
 from pydantic import BaseModel, Field
 from typing import Type, List
 from langchain.tools.base import BaseTool, ToolException
-from api import get_api
+from functions.calls import call_function, acall_function
 import json
 
 
@@ -95,16 +94,13 @@ class addNodeTool(BaseTool):
         self,
         signature: str,
     ) -> str:
-        data = {"type": "function", "name": "addNode", "args": {"signature": signature}}
-        api = get_api()
-        api.send(data)
-        res = api.receive()
-        return res
+        return call_function("addNode", {"signature": signature})
 
     async def _arun(
         self,
+        signature: str,
     ) -> str:
-        raise NotImplementedError("This tool does not support async execution yet")
+        return await acall_function("addNode", {"signature": signature})
 
 
 class removeNodeTool(BaseTool):
@@ -116,16 +112,13 @@ class removeNodeTool(BaseTool):
         self,
         id: str,
     ) -> str:
-        data = {"type": "function", "name": "removeNode", "args": {"id": id}}
-        api = get_api()
-        api.send(data)
-        res = api.receive()
-        return res
+        return call_function("removeNode", {"id": id})
 
     async def _arun(
         self,
+        id: str,
     ) -> str:
-        raise NotImplementedError("This tool does not support async execution yet")
+        return await acall_function("removeNode", {"id": id})
 
 
 class addEdgeTool(BaseTool):
@@ -138,20 +131,20 @@ class addEdgeTool(BaseTool):
         output: str,
         input: str,
     ) -> str:
-        data = {
-            "type": "function",
-            "name": "addEdge",
-            "args": {"output": output, "input": input},
-        }
-        api = get_api()
-        api.send(data)
-        res = api.receive()
-        return res
+        return call_function(
+            "addEdge",
+            {"output": output, "input": input},
+        )
 
     async def _arun(
         self,
+        output: str,
+        input: str,
     ) -> str:
-        raise NotImplementedError("This tool does not support async execution yet")
+        return await acall_function(
+            "addEdge",
+            {"output": output, "input": input},
+        )
 
 
 class removeEdgeTool(BaseTool):
@@ -163,16 +156,13 @@ class removeEdgeTool(BaseTool):
         self,
         id: str,
     ) -> str:
-        data = {"type": "function", "name": "removeEdge", "args": {"id": id}}
-        api = get_api()
-        api.send(data)
-        res = api.receive()
-        return res
+        return call_function("removeEdge", {"id": id})
 
     async def _arun(
         self,
+        id: str,
     ) -> str:
-        raise NotImplementedError("This tool does not support async execution yet")
+        return await acall_function("removeEdge", {"id": id})
 
 
 class updateInputValuesTool(BaseTool):
@@ -185,20 +175,20 @@ class updateInputValuesTool(BaseTool):
         nodeId: str,
         changedInputValues: Dict[str, float],
     ) -> str:
-        data = {
-            "type": "function",
-            "name": "updateInputValues",
-            "args": {"nodeId": nodeId, "changedInputValues": changedInputValues},
-        }
-        api = get_api()
-        api.send(data)
-        res = api.receive()
-        return res
+        return call_function(
+            "updateInputValues",
+            {"nodeId": nodeId, "changedInputValues": changedInputValues},
+        )
 
     async def _arun(
         self,
+        nodeId: str,
+        changedInputValues: Dict[str, float],
     ) -> str:
-        raise NotImplementedError("This tool does not support async execution yet")
+        return await acall_function(
+            "updateInputValues",
+            {"nodeId": nodeId, "changedInputValues": changedInputValues},
+        )
 
 class updateInputValueTool(BaseTool):
     name: str = "updateInputValue"
@@ -211,28 +201,76 @@ class updateInputValueTool(BaseTool):
         inputValueId: str,
         newInputValue: float
     ) -> str:
-        data = {
-            "type": "function",
-            "name": "updateInputValue",
-            "args": {"nodeId": nodeId, "inputValueId": inputValueId, "newInputValue": newInputValue},
-        }
-        api = get_api()
-        api.send(data)
-        res = api.receive()
-        return res
+        return call_function(
+            "updateInputValue",
+            {"nodeId": nodeId, "inputValueId": inputValueId, "newInputValue": newInputValue},
+        )
 
     async def _arun(
         self,
+        nodeId: str,
+        inputValueId: str,
+        newInputValue: float
     ) -> str:
-        raise NotImplementedError("This tool does not support async execution yet")
+        return await acall_function(
+            "updateInputValue",
+            {"nodeId": nodeId, "inputValueId": inputValueId, "newInputValue": newInputValue},
+        )
 
 
 # ===================================================================
-# TODO: Change these tools to work with new API format
+# Batch tools
+#
+# Each of these sends a single message for the whole batch. Electron answers
+# with one result per item, in the same order as the items that were sent, e.g.
+#   [{"status": "success", "message": "...", "data": {"inputs": [...], "outputs": [...]}}, ...]
 # ===================================================================
 
 
-class addNodes(BaseTool):
+def _format_results(name: str, items: List[str], res: str) -> str:
+    """
+    Formats the per-item results of a batch command for the language model.
+    Falls back to the raw response if it is not a list of results.
+    """
+    try:
+        results = json.loads(res)
+    except (TypeError, ValueError):
+        return res
+
+    if isinstance(results, dict):
+        results = results.get("results", results)
+
+    if not isinstance(results, list):
+        return res
+
+    lines = [f"{name} results:"]
+    for i, (item, result) in enumerate(zip(items, results)):
+        if not isinstance(result, dict):
+            lines.append(f"{i}. {item}: {result}")
+            continue
+
+        line = f"{i}. {item}: {result.get('message', result.get('status', ''))}"
+        data = result.get("data") or {}
+
+        if result.get("status") != "error":
+            if "nodeId" in data:
+                line += f"\n   node id: {data['nodeId']}"
+            if "inputs" in data:
+                line += "\n   input anchor ids: " + ",".join(map(str, data["inputs"]))
+            if "outputs" in data:
+                line += "\n   output anchor ids: " + ",".join(map(str, data["outputs"]))
+            if "edgeId" in data:
+                line += f"\n   edge id: {data['edgeId']}"
+
+        lines.append(line)
+
+    for i, item in enumerate(items[len(results) :], start=len(results)):
+        lines.append(f"{i}. {item}: no result received")
+
+    return "\n".join(lines) + "\n"
+
+
+class addNodesTool(BaseTool):
     """
     Class to represent addNodes function to language model
     ...
@@ -243,30 +281,34 @@ class addNodes(BaseTool):
             a formatted string to display the name of the function
     description : str
             a string that provides a descriptive summary of the function
+    args_schema : Type[BaseModel]
+    handle_tool_error : Callable[[ToolException], str]
 
     Methods
     -------
-    run(self,signature)
-            Pushes the command to add Nodes to the graph to the commands list
+    _run(self,signatures)
+            Sends a single addNodes command and returns the result of every
+            node, including the ids of its anchors
 
     _arun(self)
-            Raises an error as this function does not support async execution
+            Same as _run, but through the asyncio API
     """
 
     name: str = "addNodes"
-    description: str = "Add new nodes to the graph"
+    description: str = "Add several new nodes to the graph at once. Returns the anchor ids of every new node"
     args_schema: Type[BaseModel] = addNodesInput
     handle_tool_error = _handle_error
 
-    def _run(self, signatures: List[str]):
-        # commands.append({ "command": "addNodes", "signatures": signatures})
-        return "addNodes command added\n"
+    def _run(self, signatures: List[str]) -> str:
+        res = call_function("addNodes", {"signatures": signatures})
+        return _format_results("addNodes", signatures, res)
 
-    async def _arun(self) -> str:
-        raise NotImplementedError("This tool does not support async execution")
+    async def _arun(self, signatures: List[str]) -> str:
+        res = await acall_function("addNodes", {"signatures": signatures})
+        return _format_results("addNodes", signatures, res)
 
 
-class removeNodes(BaseTool):
+class removeNodesTool(BaseTool):
     """
     Class to represent removeNodes function to language model
     ...
@@ -282,68 +324,72 @@ class removeNodes(BaseTool):
 
     Methods
     -------
-    run(self,ids)
-            Pushes the command to remove Nodes from the graph to the commands list
+    _run(self,ids)
+            Sends a single removeNodes command and returns the result of every node
 
     _arun(self)
-            Raises an error as this function does not support async execution
+            Same as _run, but through the asyncio API
     """
 
     name: str = "removeNodes"
-    description: str = "Remove nodes from the graph"
+    description: str = "Remove several nodes from the graph at once"
     args_schema: Type[BaseModel] = removeNodesInput
     handle_tool_error = _handle_error
 
-    def _run(self, ids: List[str]):
-        # commands.append({ "command": "removeNodes", "ids": ids})
-        return "removeNodes command added\n"
+    def _run(self, ids: List[str]) -> str:
+        res = call_function("removeNodes", {"ids": ids})
+        return _format_results("removeNodes", ids, res)
 
-    async def _arun(self) -> str:
-        raise NotImplementedError("This tool does not support async execution")
+    async def _arun(self, ids: List[str]) -> str:
+        res = await acall_function("removeNodes", {"ids": ids})
+        return _format_results("removeNodes", ids, res)
 
 
-class addEdges(BaseTool):
+class addEdgesTool(BaseTool):
     """
-                    Class to represent addEdges function to language model
-                    ...
-    class addEdgesInput(BaseModel):
-            edges: List[addEdgeInput] = Field(
-                    ...,
-                    description="List of of objects representing edges to be added",
-            )
-                    Attributes
-                    ----------
-                    name : str
-                            a formatted string to display the name of the function
-                    description : str
-                            a string that provides a descriptive summary of the function
-                    args_schema : Type[BaseModel]
-                    handle_tool_error : Callable[[ToolException], str]
-
-                    Methods
-                    -------
-                    run(self,ids)
-                            Pushes the command to addEdges to the graph to the commands list
-
-                    _arun(self)
-                            Raises an error as this function does not support async execution
+    Class to represent addEdges function to language model
+    ...
+
+    Attributes
+    ----------
+    name : str
+            a formatted string to display the name of the function
+    description : str
+            a string that provides a descriptive summary of the function
+    args_schema : Type[BaseModel]
+    handle_tool_error : Callable[[ToolException], str]
+
+    Methods
+    -------
+    _run(self,edges)
+            Sends a single addEdges command and returns the result of every
+            edge, including the id of the new edge
+
+    _arun(self)
+            Same as _run, but through the asyncio API
     """
 
     name: str = "addEdges"
-    description: str = "Used to connect the output anchor from one node to the input anchor of another node."
+    description: str = "Add several edges at once. Each edge connects the output anchor of one node to the input anchor of another node"
     args_schema: Type[BaseModel] = addEdgesInput
     handle_tool_error = _handle_error
 
-    def _run(self, edges: List[addEdgeInput]):
+    def _run(self, edges: List[addEdgeInput]) -> str:
+        edges = [edge.dict() if isinstance(edge, BaseModel) else edge for edge in edges]
+        res = call_function("addEdges", {"edges": edges})
+        return _format_results(
+            "addEdges", [f"{edge['output']} -> {edge['input']}" for edge in edges], res
+        )
 
-        # commands.append({ "command": "addEdges", "edges": edges})
-        return "addEdges command added\n"
+    async def _arun(self, edges: List[addEdgeInput]) -> str:
+        edges = [edge.dict() if isinstance(edge, BaseModel) else edge for edge in edges]
+        res = await acall_function("addEdges", {"edges": edges})
+        return _format_results(
+            "addEdges", [f"{edge['output']} -> {edge['input']}" for edge in edges], res
+        )
 
-    async def _arun(self) -> str:
-        raise NotImplementedError("This tool does not support async execution")
 
-
-class removeEdges(BaseTool):
+class removeEdgesTool(BaseTool):
     """
     Class to represent removeEdges function to language model
     ...
@@ -359,24 +405,54 @@ class removeEdges(BaseTool):
 
     Methods
     -------
-    run(self,ids)
-        Pushes the command to removeEdges from the graph to the commands list
+    _run(self,ids)
+        Sends a single removeEdges command and returns the result of every edge
 
     _arun(self)
-        Raises an error as this function does not support async execution
+        Same as _run, but through the asyncio API
     """
 
     name: str = "removeEdges"
-    description: str = "Remove edges from the graph"
+    description: str = "Remove several edges from the graph at once"
     args_schema: Type[BaseModel] = removeEdgesInput
     handle_tool_error = _handle_error
 
-    def _run(self, ids: List[str]):
-        # commands.append({ "command": "removeEdges", "ids": ids})
-        return "removeEdges command added\n"
+    def _run(self, ids: List[str]) -> str:
+        res = call_function("removeEdges", {"ids": ids})
+        return _format_results("removeEdges", ids, res)
+
+    async def _arun(self, ids: List[str]) -> str:
+        res = await acall_function("removeEdges", {"ids": ids})
+        return _format_results("removeEdges", ids, res)
+
+
+_tools = None
+
+
+def get_tools():
+    """
+    Returns the tools handed to the agent, creating them on first use
+    """
+    global _tools
+    if _tools is None:
+        _tools = [
+            addNodeTool(),
+            removeNodeTool(),
+            addEdgeTool(),
+            removeEdgeTool(),
+            updateInputValueTool(),
+            addNodesTool(),
+            removeNodesTool(),
+            addEdgesTool(),
+            removeEdgesTool(),
+        ]
+
+    return _tools
+
 
-    async def _arun(self) -> str:
-        raise NotImplementedError("This tool does not support async execution")
+def __getattr__(name):
+    if name == "tools":
+        return get_tools()
 
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-tools = [addNodeTool(), removeNodeTool(), addEdgeTool(), removeEdgeTool(), updateInputValueTool()]
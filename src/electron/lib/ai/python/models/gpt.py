@@ -1,5 +1,6 @@
 import sys
 import os
+from typing import Optional
 
 # Get the parent directory
 parent_dir = os.path.dirname(os.path.realpath(__file__))
@@ -7,58 +8,482 @@ parent_dir = os.path.dirname(os.path.realpath(__file__))
 # Add the parent directory to sys.path
 sys.path.append(parent_dir)
 
-from langchain.chat_models import ChatOpenAI
+# langchain (and the tools and prompt template built on it) takes seconds to
+# import, so it is only loaded once a request actually needs the model.
+# Nothing imported at module level may pull it in.
 
 # from functions.graphFunc import Functions
-from functions.tools import tools
 # from dotenv import load_dotenv
-from langchain.agents import initialize_agent, AgentType
-from prompts import generic
-from api import get_api
+from agents import agent_key, get_pool
+from api import get_api, get_async_api
+from tracing import annotate, current_span, current_trace, span
+from transactions import set_atomic
+from cache import cache_key, get_cache
+from functions.calls import record_calls
+from memory import ConversationMemory, describe_call, get_memory
+from functions.graph import GraphIndex, get_graph, set_graph
+from planner import PlanError, aapply_diff, apply_diff, parse_diff, validate_diff
+from plans import areplay, make_plan, replay
+from progress import DEFAULT_INTERVAL, Progress
+from resilience import ModelClient, get_model_calls, set_deadline, set_hedging
+from prompts import budget, catalog, encoders
+import connections
 
 # load_dotenv()
 
+# Settings every agent is created with. Agents are pooled per Open AI key
+# and settings, so anything here that comes to depend on the request must
+# be taken from the request body in agentSettings.
+AGENT_SETTINGS = {
+    "temperature": 0.0,
+    "model": "gpt-3-turbo-0613",
+    "max_iterations": 20,
+}
+
+
+def preload(prewarm=False):
+    """
+    Imports every heavy module used by sendPrompt so that the first request
+    does not pay for it, and with prewarm opens a connection to Open AI
+    ahead of it. Safe to call from a background thread.
+    """
+    import langchain.chat_models
+    import langchain.agents
+    import functions.tools
+    import functions.parallel
+    import handlers
+    from prompts import generic
+
+    generic.prompt_template
+
+    connections.install()
+    if prewarm:
+        connections.prewarm()
+
 
 class GPT:
-    def sendPrompt(self, body) -> str:
-        try:
-            llm = ChatOpenAI(temperature=0.0, openai_api_key=body["config"]["key"])
+    # Conversation memory of the request's session, see openMemory
+    memory: Optional[ConversationMemory] = None
+
+    def progressEnabled(self, body) -> bool:
+        return body["config"].get("progress", True)
+
+    def agentSettings(self, body) -> dict:
+        # Tokens are only streamed to report progress. "parallelCalls" lets
+        # the model make several function calls per turn.
+        return dict(
+            AGENT_SETTINGS,
+            streaming=self.progressEnabled(body),
+            parallel=bool(body["config"].get("parallelCalls", False)),
+        )
+
+    def createCallbacks(self, body, send, asynchronous=False):
+        """
+        The callbacks of a run: reporting its progress through send unless
+        the request config has "progress": false, and timing model calls when
+        the request is traced. "progressInterval" sets the least number of
+        milliseconds between two streamed text messages.
+        """
+        callbacks = []
+
+        if self.progressEnabled(body):
+            from handlers import AsyncProgressHandler, ProgressHandler
+
+            progress = Progress(body["config"].get("progressInterval", DEFAULT_INTERVAL * 1000) / 1000)
+            handler = AsyncProgressHandler if asynchronous else ProgressHandler
+            callbacks.append(handler(send, progress))
+
+        trace = current_trace.get()
+        if trace is not None:
+            from handlers import TracingHandler
+
+            callbacks.append(TracingHandler(trace, current_span.get()))
+
+        return callbacks or None
+
+    def startDeadline(self, body):
+        """
+        Starts the deadline of the request's model calls, "deadline" seconds
+        in the request config, and hedges them with "hedge": true
+        """
+        calls = get_model_calls()
+        set_deadline(body["config"].get("deadline", calls.deadline if calls else None))
+        set_hedging(body["config"].get("hedge", False))
+
+    def getAgent(self, body):
+        """
+        The agent for a request, reused from the agent pool when an earlier
+        request had the same key and settings
+        """
+        pool = get_pool()
+        if pool is None:
+            return self.createAgent(body)
+
+        settings = self.agentSettings(body)
+        return pool.get(
+            agent_key(body["config"]["key"], settings),
+            lambda: self.createAgent(body, settings),
+        )
+
+    def createAgent(self, body, settings=None):
+        """
+        Creates the langchain agent for a request, importing langchain on the
+        first call
+        """
+        with span("import"):
+            from langchain.chat_models import ChatOpenAI
+            from langchain.agents import initialize_agent, AgentType
+            from functions.tools import get_tools
 
-            open_ai_agent = initialize_agent(
+        settings = settings or self.agentSettings(body)
+        connections.install()
+        calls = get_model_calls()
+        llm = ChatOpenAI(
+            temperature=settings["temperature"],
+            streaming=settings["streaming"],
+            openai_api_key=body["config"]["key"],
+            # Model calls retry themselves, see resilience.py
+            **({"max_retries": 1} if calls else {}),
+        )
+        if calls:
+            llm.client = ModelClient(llm.client)
+
+        if settings["parallel"]:
+            from langchain.agents import AgentExecutor
+            from functions.parallel import ParallelFunctionsAgent
+
+            tools = get_tools()
+            return AgentExecutor.from_agent_and_tools(
+                ParallelFunctionsAgent.from_llm_and_tools(llm, tools),
                 tools,
-                llm,
-                agent=AgentType.OPENAI_FUNCTIONS,
-                model="gpt-3-turbo-0613",
-                # verbose=True,
-                debug=True,
-                max_iterations=20,
+                max_iterations=settings["max_iterations"],
             )
 
-            prompt = generic.prompt_template.format(
-                prompt=body["prompt"],
-                nodes=body["nodes"],
-                edges=body["edges"],
-                plugins=body["plugin"],
-            )
+        return initialize_agent(
+            get_tools(),
+            llm,
+            agent=AgentType.OPENAI_FUNCTIONS,
+            model=settings["model"],
+            # verbose=True,
+            debug=True,
+            max_iterations=settings["max_iterations"],
+        )
+
+    def promptBudget(self, body) -> int:
+        """
+        Tokens the prompt may take up: "promptTokens" in the request config,
+        by default what the model's context window leaves after the rest of
+        the run, 0 for no limit
+        """
+        return body["config"].get("promptTokens", budget.prompt_budget(budget.DEFAULT_MODEL))
+
+    def promptValues(self, body, template: str) -> dict:
+        """
+        The values of the fields of template, cut to fit the prompt budget.
+        What each section takes up is added to the current span of the trace.
+        """
+        nodes, edges = encoders.encode_graph(
+            body["nodes"], body["edges"], body["config"].get("graphFormat")
+        )
+
+        values = {
+            "prompt": body["prompt"],
+            "nodes": nodes,
+            "edges": edges,
+            "plugins": self.selectPlugins(body),
+            "history": self.memory.render() if self.memory else "",
+        }
+
+        tokens = self.promptBudget(body)
+        if tokens:
+            values, report = budget.fit(values, template, tokens)
+            annotate(tokens=report)
+        return values
+
+    def createPrompt(self, body) -> str:
+        from prompts import generic
+
+        return generic.prompt_template.format(**self.promptValues(body, generic.template))
 
-            finalResponse = open_ai_agent.run(prompt)
+    # ========== Single shot planning ==========
+
+    def plannerEnabled(self, body) -> bool:
+        return body["config"].get("planner", False)
+
+    def plannerMessages(self, body) -> list:
+        from langchain.schema import HumanMessage
+        from prompts.planner import template
+
+        return [HumanMessage(content=template.format(**self.promptValues(body, template)))]
+
+    def readDiff(self, body, message) -> dict:
+        """
+        The validated diff in the model's answer to the planner prompt
+        """
+        call = message.additional_kwargs.get("function_call")
+        if not call:
+            raise PlanError("The model did not return a diff")
+
+        diff = parse_diff(call.get("arguments"))
+        signatures = {catalog.signature_of(entry) for entry in body["plugin"]}
+        validate_diff(diff, get_graph(), signatures)
+        return diff
+
+    def planFailed(self, body, calls, start, error) -> Optional[dict]:
+        """
+        Forgets the calls of a failed plan, which the agent starts over from,
+        and returns the progress message reporting the failure
+        """
+        del calls[start:]
+        if self.progressEnabled(body):
+            return {"type": "progress", "event": "plan-failed", "message": str(error)}
+
+    def plan(self, body, agent, callbacks, calls) -> Optional[str]:
+        """
+        Asks the model once for a diff making every change of the request
+        and applies it, when the request config has "planner": true. Returns
+        the reply to the user, or None if the agent has to take over.
+        """
+        from prompts.planner import diff_function
+
+        api = get_api()
+        start = len(calls)
+        try:
+            with span("plan"):
+                message = agent.agent.llm.predict_messages(
+                    self.plannerMessages(body),
+                    functions=[diff_function],
+                    function_call={"name": diff_function["name"]},
+                    callbacks=callbacks,
+                )
+                diff = self.readDiff(body, message)
+                apply_diff(diff, get_graph())
+        except PlanError as e:
+            message = self.planFailed(body, calls, start, e)
+            if message:
+                api.send(message)
+            return None
+        return diff["message"] or "Done"
+
+    async def aplan(self, body, agent, callbacks, calls) -> Optional[str]:
+        """
+        Asyncio version of plan
+        """
+        from prompts.planner import diff_function
+
+        api = get_async_api()
+        start = len(calls)
+        try:
+            with span("plan"):
+                message = await agent.agent.llm.apredict_messages(
+                    self.plannerMessages(body),
+                    functions=[diff_function],
+                    function_call={"name": diff_function["name"]},
+                    callbacks=callbacks,
+                )
+                diff = self.readDiff(body, message)
+                await aapply_diff(diff, get_graph())
+        except PlanError as e:
+            message = self.planFailed(body, calls, start, e)
+            if message:
+                await api.send(message)
+            return None
+        return diff["message"] or "Done"
+
+    def selectPlugins(self, body) -> list:
+        """
+        The plugins listed in the prompt: the ones most relevant to the user
+        prompt and the ones already in the graph. "pluginTopK" in the request
+        config sets how many are retrieved, 0 lists every plugin.
+        """
+        graph = get_graph()
+        signatures = [node["signature"] for node in graph.nodes.values()] if graph else []
+
+        return catalog.select_plugins(
+            body["plugin"],
+            body["prompt"],
+            signatures,
+            body["config"].get("pluginTopK", catalog.DEFAULT_TOP_K),
+        )
+
+    def measureTokens(self, body):
+        """
+        Token counts of the graph before and after encoding, sent to Electron
+        when the request config has "measureTokens" set
+        """
+        if body["config"].get("measureTokens"):
+            return encoders.measure(body["nodes"], body["edges"], body["config"].get("graphFormat"))
+
+    # ========== Conversation memory ==========
+
+    def openMemory(self, body):
+        """
+        Picks up the conversation memory of the request's session when the
+        request config has "memory": true. "newConversation": true starts
+        the session over.
+        """
+        store = get_memory()
+        if store is None or not body["config"].get("memory", False):
+            self.memory = None
+            return
+
+        self.memory = store.get(body.get("session"))
+        if body["config"].get("newConversation"):
+            self.memory.clear()
+
+    def remember(self, body, finalResponse, calls=()):
+        if self.memory is not None and finalResponse:
+            self.memory.add(body["prompt"], [describe_call(call) for call in calls], finalResponse)
+
+    def cacheKey(self, body) -> Optional[str]:
+        """
+        Key of the request in the response cache, or None when caching is
+        disabled, either for the process or with "cache": false in the
+        request config. Follow ups depend on the conversation before them,
+        so they are not cached either.
+        """
+        if get_cache() is None or not body["config"].get("cache", True):
+            return None
+        if self.memory:
+            return None
+        return cache_key(body)
+
+    def countLookup(self, key, entry, hit) -> dict:
+        """
+        Counts a cache lookup and returns the message reporting it. An entry
+        that could not be replayed is dropped and counts as a miss; the agent
+        then carries on from wherever the replay stopped, the nodes and edges
+        of body having been updated to match.
+        """
+        cache = get_cache()
+        if entry is not None and not hit:
+            cache.discard(key)
+        return cache.count(hit)
+
+    def storeResponse(self, key, body, finalResponse, calls):
+        # Runs cut short by the iteration limit are not worth repeating
+        if key and finalResponse and not finalResponse.startswith("Agent stopped"):
+            get_cache().put(key, {"response": finalResponse, "plan": make_plan(body, calls)})
+
+    def sendPrompt(self, body) -> str:
+        api = get_api()
+
+        if not body.get("config", {}).get("key"):
+            # Fail before importing anything heavy, the request can't succeed
+            api.send(self.createError("AuthenticationError", "No Open AI key provided"))
+            return ""
+
+        try:
+            self.startDeadline(body)
+            with span("graph"):
+                set_graph(GraphIndex.fromBody(body))
+            set_atomic(body["config"].get("transactions", False))
+            self.openMemory(body)
+
+            tokens = self.measureTokens(body)
+            if tokens:
+                api.send(tokens)
+
+            key = self.cacheKey(body)
+            if key:
+                with span("cache"):
+                    entry = get_cache().get(key)
+                    hit = entry is not None and replay(body, entry["plan"])
+                api.send(self.countLookup(key, entry, hit))
+                if hit:
+                    self.remember(body, entry["response"])
+                    return entry["response"]
+                if entry is not None:
+                    # The graph is now wherever the replay stopped
+                    key = self.cacheKey(body)
+
+            calls = record_calls()
+            with span("agent"):
+                open_ai_agent = self.getAgent(body)
+            callbacks = self.createCallbacks(body, api.send)
+            finalResponse = None
+            if self.plannerEnabled(body):
+                finalResponse = self.plan(body, open_ai_agent, callbacks, calls)
+            if finalResponse is None:
+                with span("prompt"):
+                    prompt = self.createPrompt(body)
+                with span("run"):
+                    finalResponse = open_ai_agent.run(prompt, callbacks=callbacks)
+            self.storeResponse(key, body, finalResponse, calls)
+            self.remember(body, finalResponse, calls)
             return finalResponse
         except Exception as e:
-            api = get_api()
-            error_type = type(e).__name__
-            message = "Something went wrong while processing your request🫠"
-            error = str(e)
-
-            if error_type == "AuthenticationError":
-                message = "Invalid Open AI key. Make sure to add a valid key in your user settings."
-                error = "Open AI AuthenticationError"
-
-            api.send(
-                {
-                    "type": "error",
-                    "error": error,
-                    "message": message,
-                }
-            )
+            api.send(self.createError(type(e).__name__, str(e)))
+            return ""
+
+    async def asendPrompt(self, body) -> str:
+        """
+        Same as sendPrompt, but runs the agent on the asyncio event loop so
+        model calls and graph function calls of other sessions can overlap
+        """
+        api = get_async_api()
+
+        if not body.get("config", {}).get("key"):
+            await api.send(self.createError("AuthenticationError", "No Open AI key provided"))
+            return ""
 
+        try:
+            self.startDeadline(body)
+            with span("graph"):
+                set_graph(GraphIndex.fromBody(body))
+            set_atomic(body["config"].get("transactions", False))
+            self.openMemory(body)
+
+            tokens = self.measureTokens(body)
+            if tokens:
+                await api.send(tokens)
+
+            key = self.cacheKey(body)
+            if key:
+                with span("cache"):
+                    entry = get_cache().get(key)
+                    hit = entry is not None and await areplay(body, entry["plan"])
+                await api.send(self.countLookup(key, entry, hit))
+                if hit:
+                    self.remember(body, entry["response"])
+                    return entry["response"]
+                if entry is not None:
+                    # The graph is now wherever the replay stopped
+                    key = self.cacheKey(body)
+
+            calls = record_calls()
+            with span("agent"):
+                open_ai_agent = self.getAgent(body)
+                connections.use_async_session()
+            callbacks = self.createCallbacks(body, api.send, asynchronous=True)
+            finalResponse = None
+            if self.plannerEnabled(body):
+                finalResponse = await self.aplan(body, open_ai_agent, callbacks, calls)
+            if finalResponse is None:
+                with span("prompt"):
+                    prompt = self.createPrompt(body)
+                with span("run"):
+                    finalResponse = await open_ai_agent.arun(prompt, callbacks=callbacks)
+            self.storeResponse(key, body, finalResponse, calls)
+            self.remember(body, finalResponse, calls)
+            return finalResponse
+        except Exception as e:
+            await api.send(self.createError(type(e).__name__, str(e)))
             return ""
+
+    def createError(self, error_type, error) -> dict:
+        """
+        Builds the message reporting a failed request to Electron. Never
+        touches langchain, so it stays cheap even when it was never loaded.
+        """
+        message = "Something went wrong while processing your request🫠"
+
+        if error_type == "AuthenticationError":
+            message = "Invalid Open AI key. Make sure to add a valid key in your user settings."
+            error = "Open AI AuthenticationError"
+
+        return {
+            "type": "error",
+            "error": error,
+            "message": message,
+        }
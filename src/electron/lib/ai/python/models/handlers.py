@@ -0,0 +1,108 @@
+from typing import Any, Callable, Dict, List
+
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+
+from progress import Progress
+from tracing import Trace
+
+# Callback handlers turning the events of an agent run into progress
+# messages (see progress.py). They are passed to run/arun for a single
+# request, so pooled agents never hold on to a session's handler.
+
+
+class ProgressHandler(BaseCallbackHandler):
+    def __init__(self, send: Callable[[dict], Any], progress: Progress):
+        self.send = send
+        self.progress = progress
+
+    def _send(self, message):
+        if message:
+            self.send(message)
+
+    def _sendEvent(self, message):
+        # Text streamed before an event is sent before it
+        self._send(self.progress.flush())
+        self.send(message)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[list], **kwargs):
+        self._sendEvent(self.progress.thinking())
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self._send(self.progress.token(token))
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs):
+        self._sendEvent(self.progress.toolStart(serialized.get("name"), input_str))
+
+    def on_tool_end(self, output: str, **kwargs):
+        self._sendEvent(self.progress.toolEnd(output))
+
+    def on_tool_error(self, error, **kwargs):
+        self._sendEvent(self.progress.toolError(error))
+
+    def on_agent_finish(self, finish, **kwargs):
+        self._send(self.progress.flush())
+
+
+class AsyncProgressHandler(AsyncCallbackHandler):
+    """
+    ProgressHandler for agents run with arun, sending with the asyncio API
+    """
+
+    def __init__(self, send: Callable[[dict], Any], progress: Progress):
+        self.send = send
+        self.progress = progress
+
+    async def _send(self, message):
+        if message:
+            await self.send(message)
+
+    async def _sendEvent(self, message):
+        await self._send(self.progress.flush())
+        await self.send(message)
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[list], **kwargs):
+        await self._sendEvent(self.progress.thinking())
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        await self._send(self.progress.token(token))
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs):
+        await self._sendEvent(self.progress.toolStart(serialized.get("name"), input_str))
+
+    async def on_tool_end(self, output: str, **kwargs):
+        await self._sendEvent(self.progress.toolEnd(output))
+
+    async def on_tool_error(self, error, **kwargs):
+        await self._sendEvent(self.progress.toolError(error))
+
+    async def on_agent_finish(self, finish, **kwargs):
+        await self._send(self.progress.flush())
+
+
+class TracingHandler(BaseCallbackHandler):
+    """
+    Records every model call of a run as a "model" span of trace, inside the
+    span the run was started in. Runs inline for agents run with arun too,
+    since it only takes timestamps.
+    """
+
+    run_inline = True
+
+    def __init__(self, trace: Trace, parent):
+        self.trace = trace
+        self.parent = parent
+        self.spans = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[list], *, run_id, **kwargs):
+        self.spans[run_id] = self.trace.begin("model", self.parent)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        id = self.spans.pop(run_id, None)
+        if id is not None:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            self.trace.end(id, **{key: usage[key] for key in ("prompt_tokens", "completion_tokens") if key in usage})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        id = self.spans.pop(run_id, None)
+        if id is not None:
+            self.trace.end(id, error=type(error).__name__)
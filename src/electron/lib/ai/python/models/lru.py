@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class IdleLRU:
+    """
+    Mapping of at most maxItems entries, the least recently used dropped
+    beyond that and any unused for longer than idleTimeout seconds. Values
+    are never None.
+    """
+
+    def __init__(self, maxItems: int, idleTimeout: float, clock: Callable[[], float] = time.monotonic):
+        self.maxItems = maxItems
+        self.idleTimeout = idleTimeout
+        self.clock = clock
+        # key -> (value, time last used), from least to most recently used
+        self.entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[object]:
+        """
+        The value of key, which is now the most recently used, or None
+        """
+        now = self.clock()
+        self.evict(now)
+
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.entries[key] = (entry[0], now)
+        return entry[0]
+
+    def put(self, key: Hashable, value):
+        self.entries.pop(key, None)
+        self.entries[key] = (value, self.clock())
+        while len(self.entries) > self.maxItems:
+            self.entries.popitem(last=False)
+
+    def evict(self, now: Optional[float] = None):
+        """
+        Drops the entries that have been idle for longer than idleTimeout
+        """
+        now = self.clock() if now is None else now
+        while self.entries:
+            key, (_, used) = next(iter(self.entries.items()))
+            if now - used <= self.idleTimeout:
+                break
+            del self.entries[key]
+
+    def pop(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        return entry and entry[0]
+
+    def clear(self):
+        self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
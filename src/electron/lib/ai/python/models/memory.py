@@ -0,0 +1,192 @@
+"""
+Conversation memory: the earlier turns of a session, so that a follow up
+like "now make it blur more" is understood without Electron resending the
+conversation.
+
+A turn is the user's prompt, a line per graph function call the agent made
+and its final response. The turns of a session are kept within a token
+budget: once they go over it the oldest turns are folded into a summary of
+one short line each, and the oldest summary lines are dropped once the
+summary goes over its own share of the budget. Summarizing is done locally,
+without asking the model, so it costs nothing per turn. What a session
+keeps is therefore bounded by the budget however long the chat runs, and
+the number of sessions kept is bounded as well.
+"""
+import time
+from typing import Callable, Hashable, List, Optional
+
+from functions.calls import succeeded
+from lru import IdleLRU
+from prompts.tokens import count_tokens
+
+# Characters of a prompt, response or call kept in a turn, and in a summary line
+MAX_TEXT = 400
+MAX_SUMMARY_TEXT = 80
+
+# Share of the budget the summary of older turns may take up
+SUMMARY_SHARE = 0.25
+
+
+def _shorten(text, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def describe_call(call: dict) -> str:
+    """
+    One line for a recorded graph function call: its name, arguments and
+    the status of Electron's response
+    """
+    status = "success" if succeeded(call.get("response")) else "error"
+    return _shorten(f"{call['name']}({call['args']}) -> {status}", MAX_TEXT)
+
+
+class Turn:
+    __slots__ = ("prompt", "calls", "response", "text", "tokens")
+
+    def __init__(self, prompt: str, calls: List[str], response: str):
+        self.prompt = _shorten(prompt, MAX_TEXT)
+        self.calls = calls
+        self.response = _shorten(response, MAX_TEXT)
+
+        lines = [f"User: {self.prompt}"]
+        if calls:
+            lines.append("Function calls: " + "; ".join(calls))
+        lines.append(f"Assistant: {self.response}")
+        self.text = "\n".join(lines)
+        self.tokens = count_tokens(self.text)
+
+    def summary(self) -> str:
+        return f'- The user asked "{_shorten(self.prompt, MAX_SUMMARY_TEXT)}", you replied "{_shorten(self.response, MAX_SUMMARY_TEXT)}"'
+
+
+class ConversationMemory:
+    """
+    The turns of one session
+
+    Parameters
+    ----------
+    maxTokens : int
+        Tokens the rendered history may take up
+    """
+
+    def __init__(self, maxTokens: int = 1000):
+        self.maxTokens = maxTokens
+        self.turns: List[Turn] = []
+        # Lines of the summary of older turns, with their token counts
+        self.summary: List[tuple] = []
+        self.tokens = 0
+        self.summaryTokens = 0
+
+    def add(self, prompt: str, calls: List[str], response: str):
+        turn = Turn(prompt, calls, response)
+        # A single turn too long for the budget is kept without its calls
+        if turn.tokens > self.maxTokens and calls:
+            turn = Turn(prompt, [], response)
+
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        self.evict()
+
+    def evict(self):
+        """
+        Folds the oldest turns into the summary until the history fits,
+        always keeping the latest turn whole
+        """
+        while len(self.turns) > 1 and self.tokens + self.summaryTokens > self.maxTokens:
+            turn = self.turns.pop(0)
+            self.tokens -= turn.tokens
+            line = turn.summary()
+            self.summary.append((line, count_tokens(line)))
+            self.summaryTokens += self.summary[-1][1]
+            self.trimSummary(self.maxTokens * SUMMARY_SHARE)
+
+        self.trimSummary(self.maxTokens - self.tokens)
+
+    def trimSummary(self, budget: float):
+        while self.summary and self.summaryTokens > budget:
+            _, tokens = self.summary.pop(0)
+            self.summaryTokens -= tokens
+
+    def render(self) -> str:
+        """
+        The history as a section of the prompt, empty if there is none
+        """
+        if not self.turns and not self.summary:
+            return ""
+
+        lines = ["Earlier in this conversation:"]
+        if self.summary:
+            lines.append("Summary of older messages:")
+            lines.extend(line for line, _ in self.summary)
+        lines.extend(turn.text for turn in self.turns)
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        self.turns.clear()
+        self.summary.clear()
+        self.tokens = 0
+        self.summaryTokens = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+
+class MemoryStore:
+    """
+    The conversation memory of every session, the least recently used
+    dropped beyond maxSessions and any idle for longer than idleTimeout
+    seconds
+
+    Parameters
+    ----------
+    maxTokens : int
+        Token budget of the history of each session
+    maxSessions : int
+        Sessions remembered at once
+    idleTimeout : float
+        Seconds after which an unused session is forgotten
+    """
+
+    def __init__(
+        self,
+        maxTokens: int = 1000,
+        maxSessions: int = 32,
+        idleTimeout: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxTokens = maxTokens
+        self.sessions = IdleLRU(maxSessions, idleTimeout, clock)
+
+    def get(self, session: Hashable) -> ConversationMemory:
+        """
+        The memory of a session, created empty if there is none
+        """
+        memory = self.sessions.get(session)
+        if memory is None:
+            memory = ConversationMemory(self.maxTokens)
+            self.sessions.put(session, memory)
+        return memory
+
+    def evict(self, now: Optional[float] = None):
+        self.sessions.evict(now)
+
+    def forget(self, session: Hashable):
+        self.sessions.pop(session)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+# ========== Memory Config ==========
+
+_memory = MemoryStore()
+
+
+def set_memory(memory: Optional[MemoryStore]):
+    global _memory
+    _memory = memory
+
+
+def get_memory() -> Optional[MemoryStore]:
+    return _memory
@@ -0,0 +1,263 @@
+"""
+Single shot planning: the model is asked once for every change a request
+needs, as a diff of the graph, instead of one function call per round trip:
+
+    {"nodes": [{"alias": "a", "signature": "input-plugin.inputNumber"},
+               {"alias": "b", "signature": "blix.output"}],
+     "edges": [{"output": "a.0", "input": "b.0"}],
+     "values": [{"node": "a", "input": "number", "value": 5}],
+     "removeEdges": [], "removeNodes": [],
+     "message": "Added a number and connected it to an output"}
+
+New nodes are named by aliases and their anchors by "<alias>.<index>",
+since their ids only exist once Electron has added them. The diff is
+validated against the graph index before anything is sent, then applied
+as one transaction (transactions.py) with a batch call per kind of change,
+whose calls the index checks as they are queued: anchor types, inputs
+already connected and cycles, new nodes and edges included.
+A diff that fails validation or whose calls fail raises PlanError, after
+removing the nodes it added, and the request falls back to the agent.
+"""
+import json
+from typing import Dict, List, Optional, Tuple
+
+from functions.calls import acall_function, call_function, succeeded
+from functions.graph import GraphIndex
+from transactions import Transaction, TransactionError, current_atomic
+
+LISTS = ("nodes", "edges", "values", "removeEdges", "removeNodes")
+
+# Nodes Electron provides itself, which are not listed with the plugins
+BUILT_IN = "blix."
+
+
+class PlanError(Exception):
+    pass
+
+
+def parse_diff(arguments) -> dict:
+    """
+    The diff in the arguments of the model's function call, with every
+    list present
+    """
+    try:
+        diff = json.loads(arguments) if isinstance(arguments, str) else arguments
+    except ValueError as e:
+        raise PlanError(f"The diff is not valid JSON: {e}")
+
+    if not isinstance(diff, dict):
+        raise PlanError("The diff is not an object")
+
+    for field in LISTS:
+        value = diff.get(field) or []
+        if not isinstance(value, list):
+            raise PlanError(f"'{field}' is not a list")
+        diff[field] = value
+
+    diff["message"] = str(diff.get("message") or "")
+    return diff
+
+
+def _checkAnchor(graph: GraphIndex, aliases: Dict[str, str], ref, isInput: bool):
+    kind = "input" if isInput else "output"
+    anchor = graph.anchors.get(ref) if isinstance(ref, str) else None
+    if anchor is not None:
+        if anchor.isInput != isInput:
+            raise PlanError(f"'{ref}' is not an {kind} anchor")
+        return
+
+    alias, _, index = ref.rpartition(".") if isinstance(ref, str) else ("", "", "")
+    if alias not in aliases or not index.isdigit():
+        raise PlanError(f"Unknown {kind} anchor '{ref}'")
+
+    # Anchor counts of a signature are only known if the graph has one
+    types = graph.signatures.get(aliases[alias])
+    if types is not None and int(index) >= len(types[0 if isInput else 1]):
+        raise PlanError(f"Node '{alias}' has no {kind} anchor {index}")
+
+
+def validate_diff(diff: dict, graph: GraphIndex, signatures=()) -> Dict[str, str]:
+    """
+    Checks that everything a diff refers to exists, in the graph or in the
+    diff itself. signatures are the node types that can be added besides
+    the built in ones and those already in the graph, if known.
+    Returns the aliases of the new nodes with their signatures.
+    """
+    aliases: Dict[str, str] = {}
+    for node in diff["nodes"]:
+        alias = node.get("alias") if isinstance(node, dict) else None
+        signature = node.get("signature") if isinstance(node, dict) else None
+        if not isinstance(alias, str) or not alias or "." in alias:
+            raise PlanError(f"Invalid alias in {node}")
+        if alias in aliases or alias in graph.nodes:
+            raise PlanError(f"Alias '{alias}' is used twice")
+        known = not signatures or signature in signatures or signature in graph.signatures
+        if not isinstance(signature, str) or not (known or signature.startswith(BUILT_IN)):
+            raise PlanError(f"Node type '{signature}' does not exist")
+        aliases[alias] = signature
+
+    for edge in diff["edges"]:
+        if not isinstance(edge, dict):
+            raise PlanError(f"Invalid edge {edge}")
+        _checkAnchor(graph, aliases, edge.get("output"), False)
+        _checkAnchor(graph, aliases, edge.get("input"), True)
+
+    for value in diff["values"]:
+        if not isinstance(value, dict):
+            raise PlanError(f"Invalid value {value}")
+        node = value.get("node")
+        if not isinstance(node, str) or node not in aliases and node not in graph.nodes:
+            raise PlanError(f"Unknown node in {value}")
+        if not isinstance(value.get("input"), str) or not value["input"]:
+            raise PlanError(f"Invalid input in {value}")
+        if not isinstance(value.get("value"), (int, float)) or isinstance(value["value"], bool):
+            raise PlanError(f"Invalid value in {value}")
+
+    for id in diff["removeEdges"]:
+        if not isinstance(id, str) or id not in graph.edges:
+            raise PlanError(f"Edge '{id}' does not exist")
+    for id in diff["removeNodes"]:
+        if not isinstance(id, str) or id not in graph.nodes:
+            raise PlanError(f"Node '{id}' does not exist")
+
+    return aliases
+
+
+def _results(name: str, response, count: int) -> List[dict]:
+    """
+    The per item results of a batch call, raising PlanError unless every
+    item succeeded
+    """
+    try:
+        results = json.loads(response) if isinstance(response, str) else response
+    except ValueError:
+        results = None
+
+    if isinstance(results, dict):
+        results = results.get("results")
+    if not isinstance(results, list) or len(results) != count:
+        raise PlanError(f"{name} failed: {response}")
+
+    for result in results:
+        if not isinstance(result, dict) or result.get("status") == "error":
+            raise PlanError(f"{name} failed: {response}")
+    return results
+
+
+# Batch call -> argument holding its items
+BATCHES = {"removeEdges": "ids", "removeNodes": "ids", "addNodes": "signatures", "addEdges": "edges"}
+
+
+def diff_transaction(diff: dict, graph: GraphIndex) -> Tuple[Transaction, Optional[int]]:
+    """
+    The transaction applying a validated diff, and the step of it adding
+    the new nodes, whose results the rest of the diff refers to. Raises
+    PlanError if the graph index rejects any of its calls, checked with
+    the calls before them applied.
+    """
+    transaction = Transaction(current_atomic.get(), graph)
+
+    def queue(name, args):
+        error = transaction.add(name, args)
+        if error:
+            raise PlanError(f"{name} would fail: {error}")
+
+    if diff["removeEdges"]:
+        queue("removeEdges", {"ids": diff["removeEdges"]})
+    if diff["removeNodes"]:
+        queue("removeNodes", {"ids": diff["removeNodes"]})
+
+    added = None
+    if diff["nodes"]:
+        added = len(transaction.calls)
+        queue("addNodes", {"signatures": [node["signature"] for node in diff["nodes"]]})
+    index = {node["alias"]: i for i, node in enumerate(diff["nodes"])}
+
+    def anchor(ref, isInput):
+        if ref in graph.anchors:
+            return ref
+        alias, _, position = ref.rpartition(".")
+        return Transaction.ref(added, "results", index[alias], "data", "inputs" if isInput else "outputs", int(position))
+
+    if diff["edges"]:
+        edges = [{"output": anchor(edge["output"], False), "input": anchor(edge["input"], True)} for edge in diff["edges"]]
+        queue("addEdges", {"edges": edges})
+
+    values: Dict[str, Dict[str, float]] = {}
+    for value in diff["values"]:
+        values.setdefault(value["node"], {})[value["input"]] = float(value["value"])
+
+    for node, changed in values.items():
+        nodeId = Transaction.ref(added, "results", index[node], "data", "nodeId") if node in index else node
+        queue("updateInputValues", {"nodeId": nodeId, "changedInputValues": changed})
+
+    return transaction, added
+
+
+def _check(calls: List[dict], responses: List[str]):
+    # Every item of every call has to have worked, not just some
+    for call, response in zip(calls, responses):
+        if call["name"] in BATCHES:
+            _results(call["name"], response, len(call["args"][BATCHES[call["name"]]]))
+        elif not succeeded(response):
+            raise PlanError(f"{call['name']} failed: {response}")
+
+
+def _transaction(diff: dict, graph: GraphIndex) -> Tuple[Transaction, Optional[int]]:
+    # A diff validate_diff missed something in is just as bad as an invalid one
+    try:
+        return diff_transaction(diff, graph)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise PlanError(f"Invalid diff: {e!r}")
+
+
+def _undo(added: Optional[int], responses: List[str]) -> Optional[Tuple[str, dict]]:
+    """
+    The call removing the nodes the diff added, if it got as far as adding
+    any
+    """
+    if added is None or added >= len(responses):
+        return None
+
+    try:
+        results = json.loads(responses[added])
+    except ValueError:
+        return None
+    results = results.get("results", []) if isinstance(results, dict) else results
+    ids = [(r.get("data") or {}).get("nodeId") for r in results if isinstance(r, dict)]
+    ids = [id for id in ids if id]
+    return ("removeNodes", {"ids": ids}) if ids else None
+
+
+def apply_diff(diff: dict, graph: GraphIndex):
+    """
+    Applies a validated diff as one transaction. Raises PlanError if any
+    part of it fails, after removing the nodes it added when Electron does
+    not apply transactions itself. Removed edges and nodes are not restored.
+    """
+    transaction, added = _transaction(diff, graph)
+    responses: List[str] = []
+    try:
+        responses = transaction.commit()
+        _check(transaction.calls, responses)
+    except (TransactionError, PlanError) as e:
+        undo = _undo(added, e.results if isinstance(e, TransactionError) else responses)
+        if undo:
+            call_function(*undo)
+        raise PlanError(str(e))
+
+
+async def aapply_diff(diff: dict, graph: GraphIndex):
+    """
+    Asyncio version of apply_diff
+    """
+    transaction, added = _transaction(diff, graph)
+    responses: List[str] = []
+    try:
+        responses = await transaction.acommit()
+        _check(transaction.calls, responses)
+    except (TransactionError, PlanError) as e:
+        undo = _undo(added, e.results if isinstance(e, TransactionError) else responses)
+        if undo:
+            await acall_function(*undo)
+        raise PlanError(str(e))
@@ -0,0 +1,236 @@
+"""
+Plans: the graph function calls of a successful request, written so that
+they can be made again on another graph of the same shape.
+
+Ids in the arguments of a call are replaced with references to where the
+id came from, either a node or edge of the request's graph or the response
+to an earlier step:
+
+    {"$ref": ["step", 2, "data", "outputs", 0, "id"]}   output 0 of step 2
+    {"$ref": ["nodes", 3, "inputs", 1, "id"]}           input 1 of node 3
+    {"$ref": ["step", 0, "results", 1, "data", "nodeId"]}  node 1 added by step 0
+
+References into the response to a batch call go through "results", the
+way transaction references do (see load_response).
+
+Replaying a plan resolves the references against the graph of the new
+request and the responses of the replayed steps, so none of the old ids
+are needed. The steps are replayed as a transaction (transactions.py),
+whose references have the same form.
+"""
+import json
+from typing import List, Optional
+
+from functions.calls import stop_recording
+from functions.graph import GraphIndex, get_graph
+from transactions import Transaction, TransactionError, UnresolvedReference, current_atomic, load_response, resolve_refs
+
+# Response fields that can hold ids of created nodes, anchors and edges
+ID_FIELDS = ("data", "results", "nodeId", "edgeId", "id", "inputs", "outputs")
+
+
+def _load(item):
+    return json.loads(item) if isinstance(item, str) else item
+
+
+def _anchor(anchor):
+    return anchor if isinstance(anchor, dict) else {"id": anchor}
+
+
+def graph_context(body) -> dict:
+    """
+    The nodes and edges of a request, with every anchor as an {"id", "type"}
+    dict, for references to resolve against
+    """
+    nodes = []
+    for node in map(_load, body.get("nodes", [])):
+        nodes.append(
+            {
+                "id": node["id"],
+                "signature": node.get("signature"),
+                "inputs": [_anchor(a) for a in node.get("inputs", [])],
+                "outputs": [_anchor(a) for a in node.get("outputs", [])],
+            }
+        )
+
+    edges = [_load(edge) for edge in body.get("edges", [])]
+    return {"nodes": nodes, "edges": edges, "step": []}
+
+
+def graph_shape(body) -> dict:
+    """
+    The graph of a request without its ids: node signatures and anchor
+    types in request order, and edges as (node, anchor) positions. Two
+    graphs with the same shape can run the same plans.
+    """
+    context = graph_context(body)
+
+    positions = {}
+    shape = []
+    for i, node in enumerate(context["nodes"]):
+        for side in ("inputs", "outputs"):
+            for j, anchor in enumerate(node[side]):
+                positions[anchor["id"]] = [i, j]
+        shape.append(
+            {
+                "signature": node["signature"],
+                "inputs": [a.get("type") for a in node["inputs"]],
+                "outputs": [a.get("type") for a in node["outputs"]],
+            }
+        )
+
+    edges = sorted(
+        [positions.get(edge["output"], [-1, -1]), positions.get(edge["input"], [-1, -1])] for edge in context["edges"]
+    )
+    return {"nodes": shape, "edges": edges}
+
+
+# ========== Recording ==========
+
+
+def _collect(value, path, where):
+    """
+    Records the path to every id in value not seen before
+    """
+    if isinstance(value, dict):
+        for field in ID_FIELDS:
+            if field in value:
+                _collect(value[field], path + [field], where)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            _collect(item, path + [i], where)
+    elif isinstance(value, str):
+        where.setdefault(value, path)
+
+
+def _symbolize(args, where):
+    if isinstance(args, str):
+        return {"$ref": where[args]} if args in where else args
+    if isinstance(args, list):
+        return [_symbolize(a, where) for a in args]
+    if isinstance(args, dict):
+        return {key: _symbolize(value, where) for key, value in args.items()}
+    return args
+
+
+def make_plan(body, calls: List[dict]) -> List[dict]:
+    """
+    Turns the calls recorded for a request into a plan, given the request
+    body they were made on
+    """
+    context = graph_context(body)
+
+    where = {}
+    for i, node in enumerate(context["nodes"]):
+        _collect(node, ["nodes", i], where)
+    for i, edge in enumerate(context["edges"]):
+        where.setdefault(edge["id"], ["edges", i, "id"])
+
+    plan = []
+    for step, call in enumerate(calls):
+        plan.append({"name": call["name"], "args": _symbolize(call["args"], where)})
+        _collect(load_response(call["response"]), ["step", step], where)
+
+    return plan
+
+
+# ========== Replay ==========
+
+
+def _anchors(graph: GraphIndex, ids: List[str]) -> List[dict]:
+    anchors = []
+    for id in ids:
+        type = graph.anchors[id].type if id in graph.anchors else None
+        anchors.append({"id": id, "type": type} if type else {"id": id})
+    return anchors
+
+
+def update_graph(body, graph: GraphIndex):
+    """
+    Replaces the nodes and edges of body with those of graph. The entries of
+    nodes and edges that are still there are kept as they were.
+    """
+    nodes = [node for node in body.get("nodes", []) if _load(node)["id"] in graph.nodes]
+    known = {_load(node)["id"] for node in nodes}
+    for id, node in graph.nodes.items():
+        if id not in known:
+            nodes.append(
+                {
+                    "id": id,
+                    "signature": node["signature"],
+                    "inputs": _anchors(graph, node["inputs"]),
+                    "outputs": _anchors(graph, node["outputs"]),
+                }
+            )
+
+    edges = [edge for edge in body.get("edges", []) if _load(edge)["id"] in graph.edges]
+    known = {_load(edge)["id"] for edge in edges}
+    for id, (output, input) in graph.edges.items():
+        if id not in known:
+            edges.append({"id": id, "output": output, "input": input})
+
+    body["nodes"], body["edges"] = nodes, edges
+
+
+def _stopped(body, error: TransactionError) -> bool:
+    """
+    After a replay that failed partway, brings the graph of body up to date
+    with the calls that were applied, for the agent to carry on from.
+    Returns False.
+    """
+    graph = get_graph()
+    if error.results and graph is not None:
+        update_graph(body, graph)
+    return False
+
+
+def _start(body, plan: List[dict]) -> Optional[Transaction]:
+    """
+    The transaction making the calls of a plan, with the references to the
+    graph of body resolved, or None if one can't be
+    """
+    # Replayed calls are not recorded again
+    stop_recording()
+    context = graph_context(body)
+    del context["step"]
+
+    transaction = Transaction(current_atomic.get())
+    try:
+        for step in plan:
+            transaction.calls.append({"name": step["name"], "args": resolve_refs(step["args"], context, partial=True)})
+    except UnresolvedReference:
+        return None
+    return transaction
+
+
+def replay(body, plan: List[dict]) -> bool:
+    """
+    Makes the calls of a plan on the graph of body, as one transaction.
+    Returns False if a reference can't be resolved or a call fails. Unless
+    Electron applies transactions the graph is left as far as the replay
+    got, and the nodes and edges of body are updated to match.
+    """
+    transaction = _start(body, plan)
+    if transaction is None:
+        return False
+
+    try:
+        transaction.commit()
+    except TransactionError as e:
+        return _stopped(body, e)
+    return True
+
+
+async def areplay(body, plan: List[dict]) -> bool:
+    """
+    Asyncio version of replay
+    """
+    transaction = _start(body, plan)
+    if transaction is None:
+        return False
+
+    try:
+        await transaction.acommit()
+    except TransactionError as e:
+        return _stopped(body, e)
+    return True
@@ -0,0 +1,117 @@
+"""
+Progress messages sent to Electron while the agent runs, so the UI can show
+what the agent is doing before the final exit message arrives.
+
+Every message has "type": "progress" and one of these events:
+
+    {"event": "thinking", "iteration": 1}
+        the model was asked for its next step
+    {"event": "tokens", "text": "The graph now"}
+        text the model generated since the last tokens message
+    {"event": "tool-start", "name": "addNode", "input": "{'signature': ...}"}
+        a tool was called
+    {"event": "tool-end", "name": "addNode", "status": "success", "message": "..."}
+        the tool returned, with the status and message of Electron's response
+        when it had one
+
+Tokens arrive a few at a time, so they are coalesced: a tokens message is
+sent at most every interval seconds, before any other event and when the
+run ends.
+"""
+import json
+import time
+from typing import Callable, Optional
+
+DEFAULT_INTERVAL = 0.1
+
+# Longest tool input or message repeated in a progress message
+MAX_TEXT = 200
+
+
+def _shorten(text) -> str:
+    text = str(text)
+    return text if len(text) <= MAX_TEXT else text[: MAX_TEXT - 3] + "..."
+
+
+def _message(event: str, **fields) -> dict:
+    return {"type": "progress", "event": event, **fields}
+
+
+class Progress:
+    """
+    Builds the progress messages of a run and decides when streamed tokens
+    are sent
+
+    Parameters
+    ----------
+    interval : float
+        Least number of seconds between two tokens messages
+    maxChars : int
+        Tokens sent early once this many characters are waiting
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, maxChars: int = 2048, clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.maxChars = maxChars
+        self.clock = clock
+        self.pending = []
+        self.pendingChars = 0
+        self.lastSent = float("-inf")
+        self.iterations = 0
+        self.tools = []
+
+    def token(self, text: str) -> Optional[dict]:
+        """
+        Adds streamed text, returning a tokens message when one is due
+        """
+        if not text:
+            return None
+
+        self.pending.append(text)
+        self.pendingChars += len(text)
+
+        if self.pendingChars >= self.maxChars or self.clock() - self.lastSent >= self.interval:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[dict]:
+        """
+        The tokens message for all text not sent yet, if there is any
+        """
+        if not self.pending:
+            return None
+
+        text = "".join(self.pending)
+        self.pending = []
+        self.pendingChars = 0
+        self.lastSent = self.clock()
+        return _message("tokens", text=text)
+
+    def thinking(self) -> dict:
+        self.iterations += 1
+        return _message("thinking", iteration=self.iterations)
+
+    def toolStart(self, name: str, input) -> dict:
+        self.tools.append(name)
+        return _message("tool-start", name=name, input=_shorten(input))
+
+    def toolEnd(self, output) -> dict:
+        name = self.tools.pop() if self.tools else None
+
+        status, message = "success", output
+        if isinstance(output, str) and output.startswith("Error"):
+            # Rejected by the graph index without asking Electron
+            status = "error"
+        try:
+            response = json.loads(output)
+            if isinstance(response, dict):
+                status = response.get("status", status)
+                message = response.get("message", message)
+        except (TypeError, ValueError):
+            pass
+
+        return _message("tool-end", name=name, status=status, message=_shorten(message))
+
+    def toolError(self, error) -> dict:
+        name = self.tools.pop() if self.tools else None
+        return _message("tool-end", name=name, status="error", message=_shorten(error))
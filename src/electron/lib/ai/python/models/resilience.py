@@ -0,0 +1,531 @@
+"""
+Deadlines, retries, hedged requests and circuit breaking for the calls the
+model makes to Open AI.
+
+Every request has a deadline, "deadline" seconds in the request config or
+ModelCalls.deadline by default, that every model call of the run is held
+to: no call starts after it and none waits past it.
+
+A call that fails with an error worth retrying (a timeout, a dropped
+connection, rate limiting or an error on Open AI's side) is retried up to
+RetryPolicy.retries times, after a random backoff of up to base * 2 ** n
+seconds, capped, and never past the deadline. Errors in the request itself,
+like a wrong key, are not retried.
+
+With "hedge": true in the request config a call still unanswered after the
+hedge percentile of the latencies of recent calls is sent again, and
+whichever answer comes first is used. Until enough calls have been seen to
+know the percentile there is no hedging.
+
+The circuit breaker is shared by every request: after threshold failures
+in a row it opens and calls fail at once with CircuitOpen instead of
+waiting out their timeouts and retries. After resetTimeout seconds one
+call is let through, which closes it again if it succeeds.
+
+A streamed answer is held to the deadline chunk by chunk: on asyncio every
+chunk is waited for at most until the deadline, synchronously every read
+is bounded by the attempt's timeout and the deadline is checked after each
+chunk.
+
+These replace the retries of langchain, which retries up to 6 times with
+backoffs of up to a minute and no timeout.
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# asyncio and concurrent.futures are imported where they are used, as they
+# would double the time the sync worker takes to be ready for a request
+
+
+class DeadlineExceeded(Exception):
+    # Not a TimeoutError, which langchain's asynchronous agent takes for its
+    # own time limit and answers with "Agent stopped"
+    pass
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+def _exceeded(error: Optional[BaseException] = None) -> DeadlineExceeded:
+    exceeded = DeadlineExceeded("The request ran past its deadline")
+    exceeded.__cause__ = error
+    return exceeded
+
+
+class Deadline:
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - self.clock())
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise _exceeded()
+
+
+# Deadline of the request being handled, None for no deadline
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+# Whether the model calls of the request being handled are hedged
+current_hedging = contextvars.ContextVar("current_hedging", default=False)
+
+
+def set_deadline(seconds: Optional[float]):
+    current_deadline.set(Deadline(seconds) if seconds else None)
+
+
+def set_hedging(enabled: bool):
+    current_hedging.set(bool(enabled))
+
+
+def retryable(error: BaseException) -> bool:
+    """
+    Whether an error from openai is worth retrying
+    """
+    import openai
+
+    return isinstance(
+        error,
+        (
+            openai.error.Timeout,
+            openai.error.APIError,
+            openai.error.APIConnectionError,
+            openai.error.RateLimitError,
+            openai.error.ServiceUnavailableError,
+            openai.error.TryAgain,
+        ),
+    )
+
+
+class RetryPolicy:
+    """
+    Parameters
+    ----------
+    retries : int
+        Retries after the first attempt
+    base : float
+        Seconds of the first backoff
+    cap : float
+        Most seconds of any backoff
+    """
+
+    def __init__(self, retries: int = 2, base: float = 0.5, cap: float = 8.0, rng: Callable[[], float] = random.random):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.rng = rng
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter, so that clients failing together do not retry together
+        return self.rng() * min(self.cap, self.base * 2**attempt)
+
+
+class CircuitBreaker:
+    """
+    Parameters
+    ----------
+    threshold : int
+        Failures in a row that open the circuit
+    resetTimeout : float
+        Seconds the circuit stays open before a trial call is let through
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold: int = 5, resetTimeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.resetTimeout = resetTimeout
+        self.clock = clock
+        self.failures = 0
+        self.openedAt = None
+        self.trial = False
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.openedAt is None:
+            return self.CLOSED
+        if self.clock() - self.openedAt < self.resetTimeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """
+        Raises CircuitOpen unless a call may be made now
+        """
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self.trial:
+                self.trial = True
+                return
+
+            self.rejected += 1
+            wait = self.resetTimeout - (self.clock() - self.openedAt)
+            raise CircuitOpen(f"Open AI is failing, calls are stopped for another {max(wait, 0):.0f} seconds")
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.openedAt = None
+            self.trial = False
+
+    def release(self):
+        """
+        Ends a call that says nothing about Open AI's health
+        """
+        with self.lock:
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.openedAt = self.clock()
+            self.trial = False
+
+
+class LatencyTracker:
+    """
+    Latencies of the last size successful calls
+
+    Parameters
+    ----------
+    size : int
+        Latencies kept
+    minSamples : int
+        Latencies needed before a percentile is given
+    """
+
+    def __init__(self, size: int = 100, minSamples: int = 20):
+        self.latencies = deque(maxlen=size)
+        self.minSamples = minSamples
+
+    def record(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.latencies) < self.minSamples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class ModelCalls:
+    """
+    Makes the model's calls to Open AI within the request's deadline, with
+    retries, hedging and circuit breaking
+
+    Parameters
+    ----------
+    deadline : float
+        Seconds a request may take, unless its config sets "deadline"
+    timeout : float
+        Most seconds a single attempt may take
+    hedgePercentile : float
+        Latency percentile of recent calls after which a call is hedged
+    """
+
+    def __init__(
+        self,
+        deadline: Optional[float] = 180.0,
+        timeout: float = 60.0,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedgePercentile: float = 0.95,
+        latencies: Optional[LatencyTracker] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.deadline = deadline
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedgePercentile = hedgePercentile
+        self.latencies = latencies or LatencyTracker()
+        self.clock = clock
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedgeWins = 0
+        self._executor = None
+
+    def _start(self, kwargs: dict) -> dict:
+        """
+        The arguments of the next attempt, with its timeout, once the
+        deadline and the circuit breaker allow it
+        """
+        deadline = current_deadline.get()
+        timeout = self.timeout
+        if deadline is not None:
+            deadline.check()
+            timeout = min(timeout, deadline.remaining())
+
+        self.breaker.allow()
+        self.attempts += 1
+        return dict(kwargs, request_timeout=timeout)
+
+    def _hedgeDelay(self) -> Optional[float]:
+        if not current_hedging.get():
+            return None
+        return self.latencies.percentile(self.hedgePercentile)
+
+    def _failed(self, error: BaseException, attempt: int) -> float:
+        """
+        The backoff before retrying after error, raising it, or
+        DeadlineExceeded, if it is not retried
+        """
+        if not retryable(error):
+            # Open AI answered, it is the request that is wrong
+            self.breaker.success()
+            raise error
+
+        deadline = current_deadline.get()
+        if deadline is not None and deadline.remaining() <= 0:
+            # Cut short by the deadline rather than failed
+            self.breaker.release()
+            raise _exceeded(error)
+
+        self.breaker.failure()
+        if attempt >= self.retry.retries:
+            raise error
+
+        backoff = self.retry.backoff(attempt)
+        if deadline is not None and backoff >= deadline.remaining():
+            raise error
+        self.retries += 1
+        return backoff
+
+    def _succeeded(self, start: float):
+        self.latencies.record(self.clock() - start)
+        self.breaker.success()
+
+    def call(self, function: Callable, **kwargs):
+        """
+        Calls function, openai's create, with kwargs
+        """
+        attempt = 0
+        while True:
+            attemptKwargs = self._start(kwargs)
+            start = self.clock()
+            try:
+                result = self._hedged(function, attemptKwargs)
+            except Exception as e:
+                time.sleep(self._failed(e, attempt))
+                attempt += 1
+                continue
+            self._succeeded(start)
+            return self._stream(result) if kwargs.get("stream") else result
+
+    async def acall(self, function: Callable, **kwargs):
+        """
+        Asyncio version of call, for openai's acreate
+        """
+        import asyncio
+
+        import connections
+
+        attempt = 0
+        while True:
+            attemptKwargs = self._start(kwargs)
+            start = self.clock()
+            # Responses of the attempt left unread, by a hedged call that
+            # lost or a stream cut short, are closed when it is done with
+            responses = connections.track_responses()
+            try:
+                result = await self._ahedged(function, attemptKwargs)
+            except Exception as e:
+                connections.close_responses(responses)
+                await asyncio.sleep(self._failed(e, attempt))
+                attempt += 1
+                continue
+            self._succeeded(start)
+            if kwargs.get("stream"):
+                return self._astream(result, responses)
+            connections.close_responses(responses)
+            return result
+
+    def _stream(self, chunks):
+        deadline = current_deadline.get()
+        try:
+            for chunk in chunks:
+                if deadline is not None:
+                    deadline.check()
+                yield chunk
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # A read timing out at the deadline
+            if deadline is not None and deadline.remaining() <= 0:
+                raise _exceeded(e)
+            raise
+        finally:
+            _close(chunks)
+
+    async def _astream(self, chunks, responses: list):
+        import asyncio
+
+        import connections
+
+        deadline = current_deadline.get()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), deadline and deadline.remaining())
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise _exceeded()
+                yield chunk
+        finally:
+            await _aclose(chunks)
+            connections.close_responses(responses)
+
+    def _hedged(self, function: Callable, kwargs: dict):
+        delay = self._hedgeDelay()
+        if delay is None:
+            return function(**kwargs)
+
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(8, thread_name_prefix="hedge")
+        first = self._executor.submit(contextvars.copy_context().run, function, **kwargs)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+
+        self.hedges += 1
+        second = self._executor.submit(contextvars.copy_context().run, function, **kwargs)
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.hedgeWins += future is second
+                    # The call that loses can't be interrupted, its answer
+                    # is closed once it comes
+                    for loser in {first, second} - {future}:
+                        loser.add_done_callback(_discard)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def _ahedged(self, function: Callable, kwargs: dict):
+        import asyncio
+
+        delay = self._hedgeDelay()
+        if delay is None:
+            return await function(**kwargs)
+
+        # openai only closes the aiohttp session it opens for a call when the
+        # call fails with an Exception, so cancelling the call that loses
+        # would leak it. The shared session is never closed by a call.
+        import connections
+
+        connections.use_async_session()
+
+        first = asyncio.ensure_future(function(**kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(first), delay)
+        except asyncio.TimeoutError:
+            pass
+
+        self.hedges += 1
+        second = asyncio.ensure_future(function(**kwargs))
+        pending, error = {first, second}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        self.hedgeWins += future is second
+                        for loser in done - {future}:
+                            _adiscard(loser)
+                        return future.result()
+                    error = error or future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+                future.add_done_callback(_adiscard)
+
+
+def _close(result):
+    close = getattr(result, "close", None)
+    if callable(close):
+        close()
+
+
+async def _aclose(result):
+    close = getattr(result, "aclose", None)
+    if callable(close):
+        await close()
+
+
+def _discard(future):
+    """
+    Closes the answer of a hedged call that lost, a stream holding its
+    connection open
+    """
+    if not future.cancelled() and future.exception() is None:
+        _close(future.result())
+
+
+# Tasks closing the answers of hedged calls that lost, kept until they finish
+_closing = set()
+
+
+def _adiscard(future):
+    import asyncio
+
+    if not future.cancelled() and future.exception() is None:
+        task = asyncio.ensure_future(_aclose(future.result()))
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+
+class ModelClient:
+    """
+    Stands in for openai.ChatCompletion as the client of langchain's
+    ChatOpenAI, making its calls through the model call policy
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, **kwargs):
+        calls = get_model_calls()
+        if calls is None:
+            return self.client.create(**kwargs)
+        return calls.call(self.client.create, **kwargs)
+
+    async def acreate(self, **kwargs):
+        calls = get_model_calls()
+        if calls is None:
+            return await self.client.acreate(**kwargs)
+        return await calls.acall(self.client.acreate, **kwargs)
+
+
+# ========== Model Calls Config ==========
+
+_calls = ModelCalls()
+
+
+def set_model_calls(calls: Optional[ModelCalls]):
+    global _calls
+    _calls = calls
+
+
+def get_model_calls() -> Optional[ModelCalls]:
+    return _calls
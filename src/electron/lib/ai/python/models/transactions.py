@@ -0,0 +1,338 @@
+"""
+Transactions: graph function calls buffered in Python and committed
+together. Electron applies a committed transaction in one go as a single
+"transaction" function call, either completely or not at all:
+
+    {"type": "function", "name": "transaction", "args": {"calls": [
+        {"name": "addNodes", "args": {"signatures": ["input-plugin.inputNumber", "blix.output"]}},
+        {"name": "addEdge", "args": {
+            "output": {"$ref": ["step", 0, "results", 0, "data", "outputs", 0]},
+            "input": {"$ref": ["step", 0, "results", 1, "data", "inputs", 0]}}}]}}
+
+The arguments of a call can refer to the response of an earlier call of
+the transaction with {"$ref": ["step", <call>, ...path]}, as in plans, and
+a reference to an anchor given as {"id", "type"} stands for its id.
+Electron answers {"status": "success", "results": [<response>, ...]} with
+the response to every call, or {"status": "error", "message", "step"} with
+the graph left as it was.
+
+Electron says it applies transactions with "transactions": true in the
+request config. Otherwise commit makes the calls one at a time, resolving
+references itself, and stops at the first call Electron carried out none
+of, leaving the calls before it applied.
+
+Queued calls are checked against a scratch copy of the graph index with
+the calls queued before them applied, their references resolved against
+the responses those calls are expected to get, with placeholder ids for
+what they create. A call referring to what the index can't foresee, the
+anchors of a node type the graph has none of, is only checked by Electron
+in an atomic commit; otherwise commit checks it once it is resolved.
+
+While a transaction is open call_function queues calls instead of sending
+them, so the tools can be run inside one:
+
+    transaction = begin()
+    addNodeTool().run({"signature": "blix.output"})
+    commit()
+"""
+import contextvars
+import json
+from typing import List, Optional
+
+from api import get_api, get_async_api
+from functions.calls import acall_function, call_function, current_transaction, record_call, succeeded
+from functions.graph import GraphIndex, get_graph
+from tracing import span
+
+# Whether Electron applies the transactions of the current request
+current_atomic = contextvars.ContextVar("current_atomic", default=False)
+
+
+def set_atomic(enabled: bool):
+    current_atomic.set(bool(enabled))
+
+
+class UnresolvedReference(LookupError):
+    pass
+
+
+class TransactionError(Exception):
+    """
+    A transaction that could not be committed. step is the call that
+    failed, results the responses to the calls applied before it.
+    """
+
+    def __init__(self, message, step: Optional[int] = None, results: Optional[list] = None):
+        super().__init__(message)
+        self.step = step
+        self.results = results or []
+
+
+def _load(item):
+    return json.loads(item) if isinstance(item, str) else item
+
+
+def load_response(item):
+    """
+    A response as references into it see it: references into a batch
+    response go through "results", also when Electron answers with the bare
+    list
+    """
+    item = _load(item)
+    return {"results": item} if isinstance(item, list) else item
+
+
+def resolve_refs(args, context, partial=False):
+    """
+    Replaces the references in args with the values they point to in
+    context. With partial, references to parts missing from context are
+    left in place.
+    """
+    if isinstance(args, dict):
+        if "$ref" in args:
+            path = args["$ref"]
+            if partial and path and path[0] not in context:
+                return args
+
+            value = context
+            try:
+                for key in path:
+                    value = value[key]
+            except (KeyError, IndexError, TypeError):
+                raise UnresolvedReference(path)
+            return value["id"] if isinstance(value, dict) and "id" in value else value
+        return {key: resolve_refs(value, context, partial) for key, value in args.items()}
+    if isinstance(args, list):
+        return [resolve_refs(a, context, partial) for a in args]
+    return args
+
+
+def _expected(graph: GraphIndex, name: str, args: dict, step: int):
+    """
+    The response a queued call gets if it succeeds, with placeholder ids for
+    the nodes and edges it adds
+    """
+
+    def node(signature, i):
+        id = f"$step{step}.{i}"
+        types = graph.signatures.get(signature)
+        if types is None:
+            return {"status": "success", "data": {"nodeId": id}}
+        inputs = [{"id": f"{id}.inputs.{j}", "type": type} for j, type in enumerate(types[0])]
+        outputs = [{"id": f"{id}.outputs.{j}", "type": type} for j, type in enumerate(types[1])]
+        return {"status": "success", "data": {"nodeId": id, "inputs": inputs, "outputs": outputs}}
+
+    def edge(i):
+        return {"status": "success", "data": {"edgeId": f"$step{step}.{i}"}}
+
+    if name == "addNode":
+        return node(args["signature"], 0)
+    if name == "addNodes":
+        return [node(signature, i) for i, signature in enumerate(args["signatures"])]
+    if name == "addEdge":
+        return edge(0)
+    if name == "addEdges":
+        return [edge(i) for i in range(len(args["edges"]))]
+    if name in ("removeNodes", "removeEdges"):
+        return [{"status": "success"} for _ in args["ids"]]
+    return {"status": "success"}
+
+
+class Transaction:
+    def __init__(self, atomic: bool, graph: Optional[GraphIndex] = None):
+        self.atomic = atomic
+        self.calls: List[dict] = []
+
+        # Scratch copy of the graph index with the queued calls applied, made
+        # when the first call is queued, and the responses they are expected
+        # to get
+        self.source = graph if graph is not None else get_graph()
+        self.graph: Optional[GraphIndex] = None
+        self.expected: list = []
+
+    @staticmethod
+    def ref(step: int, *path) -> dict:
+        return {"$ref": ["step", step, *path]}
+
+    def add(self, name: str, args: dict) -> Optional[str]:
+        """
+        Adds a call to the transaction, unless the graph index rejects it
+        given the calls queued before it. Returns the error it is rejected
+        with.
+        """
+        if self.graph is None and self.source is not None:
+            self.graph = self.source.copy()
+
+        graph = self.graph
+        if graph is not None:
+            try:
+                resolved = resolve_refs(args, {"step": self.expected})
+            except UnresolvedReference:
+                resolved = None
+
+            error = resolved is not None and graph.check(name, resolved)
+            if error:
+                return error
+
+            # The calls after one that can't be checked can't refer to it
+            expected = None
+            if resolved is not None:
+                expected = _expected(graph, name, resolved, len(self.calls))
+                graph.apply(name, resolved, json.dumps(expected))
+                expected = load_response(expected)
+            self.expected.append(expected)
+
+        self.calls.append({"name": name, "args": args})
+        return None
+
+    def queue(self, name: str, args: dict) -> str:
+        """
+        Adds a call to the transaction, returning the response the caller
+        gets until it is committed. Calls the graph index rejects are
+        answered with their error and not queued.
+        """
+        error = self.add(name, args)
+        if error:
+            return error
+
+        return json.dumps(
+            {"status": "pending", "message": "Queued until the transaction is committed", "data": {"step": len(self.calls) - 1}}
+        )
+
+    def _message(self) -> dict:
+        return {"type": "function", "name": "transaction", "args": {"calls": self.calls}}
+
+    def _finish(self, response) -> List[str]:
+        """
+        The responses to the calls of a committed transaction, from
+        Electron's response to it, with the graph index updated
+        """
+        try:
+            response = _load(response)
+        except ValueError:
+            raise TransactionError(f"Invalid response to the transaction: {response}")
+
+        if not isinstance(response, dict) or response.get("status") == "error":
+            message = response.get("message") if isinstance(response, dict) else response
+            raise TransactionError(message, response.get("step") if isinstance(response, dict) else None)
+
+        results = response.get("results")
+        if not isinstance(results, list) or len(results) != len(self.calls):
+            raise TransactionError(f"Invalid response to the transaction: {response}")
+
+        graph = get_graph()
+        context = {"step": [load_response(result) for result in results]}
+        responses = []
+        for call, result in zip(self.calls, results):
+            args = resolve_refs(call["args"], context)
+            result = json.dumps(result)
+            if graph:
+                graph.apply(call["name"], args, result)
+            record_call(call["name"], args, result)
+            responses.append(result)
+        return responses
+
+    def _next(self, step: int, responses: list, raw: list) -> tuple:
+        try:
+            return self.calls[step]["name"], resolve_refs(self.calls[step]["args"], {"step": responses})
+        except UnresolvedReference as e:
+            raise TransactionError(f"Unresolved reference {e.args[0]}", step, raw)
+
+    def commit(self) -> List[str]:
+        """
+        Applies the calls of the transaction and returns their responses.
+        Raises TransactionError if any of them fails.
+        """
+        end(self)
+        if not self.calls:
+            return []
+
+        with span("transaction", calls=len(self.calls), atomic=self.atomic):
+            if self.atomic:
+                api = get_api()
+                with span("ipc"):
+                    api.send(self._message())
+                    res = api.receive()
+                return self._finish(res)
+
+            responses, raw = [], []
+            for step in range(len(self.calls)):
+                res = call_function(*self._next(step, responses, raw))
+                if not succeeded(res):
+                    raise TransactionError(res, step, raw)
+                responses.append(load_response(res))
+                raw.append(res)
+            return raw
+
+    async def acommit(self) -> List[str]:
+        """
+        Asyncio version of commit
+        """
+        end(self)
+        if not self.calls:
+            return []
+
+        with span("transaction", calls=len(self.calls), atomic=self.atomic):
+            if self.atomic:
+                api = get_async_api()
+                with span("ipc"):
+                    await api.send(self._message())
+                    res = await api.receive()
+                return self._finish(res)
+
+            responses, raw = [], []
+            for step in range(len(self.calls)):
+                res = await acall_function(*self._next(step, responses, raw))
+                if not succeeded(res):
+                    raise TransactionError(res, step, raw)
+                responses.append(load_response(res))
+                raw.append(res)
+            return raw
+
+    def rollback(self):
+        """
+        Drops the calls of the transaction without sending them
+        """
+        end(self)
+        self.calls = []
+
+
+# ========== Current Transaction ==========
+
+
+def begin() -> Transaction:
+    """
+    Opens a transaction: call_function queues calls in it until it is
+    committed or rolled back
+    """
+    if current_transaction.get() is not None:
+        raise TransactionError("A transaction is already open")
+
+    transaction = Transaction(current_atomic.get())
+    current_transaction.set(transaction)
+    return transaction
+
+
+def end(transaction: Transaction):
+    if current_transaction.get() is transaction:
+        current_transaction.set(None)
+
+
+def commit() -> List[str]:
+    transaction = current_transaction.get()
+    if transaction is None:
+        raise TransactionError("No transaction is open")
+    return transaction.commit()
+
+
+async def acommit() -> List[str]:
+    transaction = current_transaction.get()
+    if transaction is None:
+        raise TransactionError("No transaction is open")
+    return await transaction.acommit()
+
+
+def rollback():
+    transaction = current_transaction.get()
+    if transaction is not None:
+        transaction.rollback()
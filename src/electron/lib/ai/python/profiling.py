@@ -0,0 +1,177 @@
+"""
+CPU and memory profiling of a single request, turned on from the request
+config without restarting the agent:
+
+    "profile": {"cpu": true, "memory": true, "top": 20, "file": "/tmp/slow"}
+
+"profile": true profiles both. cpu runs cProfile over the request and
+memory runs tracemalloc. The top functions by cumulative time and the
+sites holding the most memory allocated during the request when it ends
+(with the peak over the request) are sent to Electron as a message before
+the exit message:
+
+    {"type": "profile",
+     "cpu": {"seconds": 1.52, "calls": 184210, "top": [
+        {"function": "langchain/agents/agent.py:951(_call)", "calls": 1, "own": 0.001, "cumulative": 1.49}, ...]},
+     "memory": {"current": 10512, "peak": 9482113, "top": [
+        {"site": "prompts/encoders.py:43", "size": 812340, "count": 5003}, ...]}}
+
+With "file" set the full results are also written next to it:
+<file>.prof holds the cProfile stats (readable with pstats or snakeviz),
+<file>.tracemalloc the tracemalloc snapshot (tracemalloc.Snapshot.load).
+
+Both profilers cover the whole process, so with --async they also count
+the work of requests running at the same time.
+"""
+import time
+from typing import Optional
+
+# The profilers are imported when a request is profiled, as pstats alone
+# takes a noticeable part of the worker's start up
+
+DEFAULT_TOP = 20
+
+# Frames tracemalloc keeps per allocation
+FRAMES = 1
+
+
+def _ignored(tracemalloc) -> tuple:
+    return (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+
+def _short(path: str) -> str:
+    """
+    The last two components of a path, enough to tell modules apart
+    """
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:])
+
+
+def parse_options(config) -> Optional[dict]:
+    """
+    The profiling options of a request config, or None when it asks for none.
+    Options of the wrong type are ignored rather than failing the request.
+    """
+    option = config.get("profile") if isinstance(config, dict) else None
+    if option is True:
+        option = {"cpu": True, "memory": True}
+    if isinstance(option, str):
+        option = {option: True}
+    if not isinstance(option, dict):
+        return None
+
+    top = option.get("top", DEFAULT_TOP)
+    file = option.get("file")
+    options = {
+        "cpu": bool(option.get("cpu")),
+        "memory": bool(option.get("memory")),
+        "top": top if isinstance(top, int) and not isinstance(top, bool) and top > 0 else DEFAULT_TOP,
+        "file": file if isinstance(file, str) and file else None,
+    }
+    return options if options["cpu"] or options["memory"] else None
+
+
+class Profiler:
+    """
+    Context manager profiling the block it wraps, see the module docstring
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        self.profile = None
+        self.startedTracing = False
+        self.result = {"type": "profile"}
+
+    def __enter__(self):
+        import tracemalloc
+
+        if self.options["memory"]:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(FRAMES)
+                self.startedTracing = True
+            tracemalloc.reset_peak()
+
+        if self.options["cpu"]:
+            import cProfile
+
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:
+                # Another request is already being profiled
+                self.profile = None
+                self.result["cpu"] = {"error": "Another profiler is already running"}
+
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+
+        if self.profile is not None:
+            self.profile.disable()
+            self.result["cpu"] = self.cpuReport(elapsed)
+
+        if self.options["memory"]:
+            self.result["memory"] = self.memoryReport()
+
+        return False
+
+    def cpuReport(self, elapsed) -> dict:
+        import pstats
+
+        stats = pstats.Stats(self.profile)
+        if self.options["file"]:
+            stats.dump_stats(self.options["file"] + ".prof")
+
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        top = []
+        for (path, line, name), (_, calls, own, cumulative, _) in rows[: self.options["top"]]:
+            top.append(
+                {
+                    "function": f"{_short(path)}:{line}({name})",
+                    "calls": calls,
+                    "own": round(own, 6),
+                    "cumulative": round(cumulative, 6),
+                }
+            )
+
+        return {"seconds": round(elapsed, 6), "calls": stats.total_calls, "top": top}
+
+    def memoryReport(self) -> dict:
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_ignored(tracemalloc))
+
+        if self.startedTracing:
+            tracemalloc.stop()
+
+        if self.options["file"]:
+            snapshot.dump(self.options["file"] + ".tracemalloc")
+
+        top = []
+        for statistic in snapshot.statistics("lineno")[: self.options["top"]]:
+            frame = statistic.traceback[0]
+            top.append(
+                {
+                    "site": f"{_short(frame.filename)}:{frame.lineno}",
+                    "size": statistic.size,
+                    "count": statistic.count,
+                }
+            )
+
+        return {"current": current, "peak": peak, "top": top}
+
+
+def profile(config) -> Optional[Profiler]:
+    """
+    The profiler a request config asks for, or None
+    """
+    options = parse_options(config)
+    return Profiler(options) if options else None
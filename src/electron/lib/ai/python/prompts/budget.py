@@ -0,0 +1,195 @@
+"""
+Token budget of the prompt, so that it fits the model's context window
+before it is sent rather than failing after a round trip.
+
+The budget is the model's context window minus what the rest of a run
+needs: the function schemas, the agent's function calls and their results,
+and the reply. The fixed text of the template and the user's prompt are
+taken out of it first, the prompt cut to at most PROMPT_SHARE of it. What
+is left is split between the other sections by SHARES: a section that
+needs less than its share keeps all of it and the rest goes to the others.
+
+A section over its limit is cut deterministically:
+
+history
+    the oldest lines go first
+plugins
+    the last entries go first, which the catalog ranks lowest, but the
+    essential input and output nodes are always kept
+nodes, edges
+    the last lines go first, with a note of how many were left out
+
+Every section is reported with its tokens, its limit and whether it was
+cut, e.g. for the trace:
+
+    {"budget": 2096, "fixed": 518, "sections": {
+        "prompt": {"tokens": 9, "limit": 394, "truncated": false},
+        "nodes": {"tokens": 6828, "limit": 929, "truncated": true}, ...}}
+"""
+import re
+from typing import Dict, List, Tuple
+
+from prompts.catalog import ESSENTIAL, signature_of
+from prompts.tokens import count_tokens
+
+# Context window of each model family, by longest matching prefix
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+}
+DEFAULT_WINDOW = 4096
+
+# Model of the agent's ChatOpenAI, which is created without a model name
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+# Tokens kept free for the function schemas, the function calls of the run
+# and the reply. The function schemas alone take up about 1000.
+RESERVED = 2000
+
+# Most of the budget the user's prompt may take up
+PROMPT_SHARE = 0.25
+
+# Shares of the rest of the budget
+SHARES = {"history": 0.15, "plugins": 0.2, "nodes": 0.45, "edges": 0.2}
+
+_FIELD = re.compile(r"\{(\w+)\}")
+
+_fixed: Dict[str, int] = {}
+
+
+def context_window(model: str) -> int:
+    matches = [prefix for prefix in CONTEXT_WINDOWS if model.startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_WINDOW
+
+
+def prompt_budget(model: str) -> int:
+    return context_window(model) - RESERVED
+
+
+def fixed_tokens(template: str) -> int:
+    """
+    Tokens of a template without its fields
+    """
+    if template not in _fixed:
+        _fixed[template] = count_tokens(_FIELD.sub("", template))
+    return _fixed[template]
+
+
+def _cutWords(text: str, limit: int) -> str:
+    words = text.split(" ")
+    low, high = 0, len(words)
+    # Longest prefix of words within the limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle]) + " ...") <= limit:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " ..."
+
+
+def _cutLines(text: str, limit: int, oldestFirst: bool, what: str) -> str:
+    """
+    text without the lines past limit: the first lines when oldestFirst,
+    otherwise the last. A first line in parentheses is a legend and kept.
+    """
+    lines = text.split("\n")
+    if len(lines) == 1:
+        return _cutWords(text, limit)
+
+    head = [lines.pop(0)] if lines[0].startswith("(") or oldestFirst else []
+    used = sum(count_tokens(line) + 1 for line in head)
+    note = f"({len(lines)} {what} not shown)"
+    used += count_tokens(note) + 1
+
+    kept: List[str] = []
+    for line in reversed(lines) if oldestFirst else lines:
+        cost = count_tokens(line) + 1
+        if used + cost > limit:
+            break
+        kept.append(line)
+        used += cost
+
+    if oldestFirst:
+        kept.reverse()
+    note = f"({len(lines) - len(kept)} {what} not shown)"
+    return "\n".join(head + ([note] if oldestFirst else []) + kept + ([] if oldestFirst else [note]))
+
+
+def _cutPlugins(plugins: list, limit: int) -> list:
+    costs = [count_tokens(repr(entry)) + 1 for entry in plugins]
+    essential = {i for i, entry in enumerate(plugins) if signature_of(entry).startswith(ESSENTIAL)}
+
+    kept, used = set(essential), 2 + sum(costs[i] for i in essential)
+    for i in range(len(plugins)):
+        if i in essential:
+            continue
+        if used + costs[i] > limit:
+            break
+        kept.add(i)
+        used += costs[i]
+    return [entry for i, entry in enumerate(plugins) if i in kept]
+
+
+def _count(name: str, value) -> int:
+    return count_tokens(str(value)) if value else 0
+
+
+def _allocate(demands: Dict[str, int], available: int) -> Dict[str, int]:
+    """
+    Splits available tokens between sections by SHARES, giving sections
+    that need less than their share just what they need
+    """
+    limits = {}
+    remaining = set(demands)
+    while remaining:
+        total = sum(SHARES[name] for name in remaining)
+        fits = [name for name in remaining if demands[name] <= available * SHARES[name] / total]
+        if not fits:
+            for name in remaining:
+                limits[name] = max(0, int(available * SHARES[name] / total))
+            break
+
+        for name in fits:
+            limits[name] = demands[name]
+            available -= demands[name]
+            remaining.discard(name)
+
+    return limits
+
+
+def fit(values: dict, template: str, budget: int) -> Tuple[dict, dict]:
+    """
+    The values of a prompt's fields cut to fit budget tokens with template,
+    and the report of every section
+    """
+    values = dict(values)
+    fixed = fixed_tokens(template)
+    report = {"budget": budget, "fixed": fixed, "sections": {}}
+    available = max(0, budget - fixed)
+
+    prompt = values.get("prompt", "")
+    tokens = count_tokens(prompt)
+    limit = int(available * PROMPT_SHARE)
+    if tokens > limit:
+        values["prompt"] = _cutWords(prompt, limit)
+    report["sections"]["prompt"] = {"tokens": tokens, "limit": limit, "truncated": tokens > limit}
+    available -= min(tokens, limit)
+
+    sections = [name for name in SHARES if name in values]
+    demands = {name: _count(name, values[name]) for name in sections}
+    limits = _allocate(demands, available)
+
+    for name in sections:
+        truncated = demands[name] > limits[name]
+        if truncated:
+            if name == "plugins":
+                values[name] = _cutPlugins(values[name], limits[name])
+            else:
+                what = "lines" if name == "history" else name
+                values[name] = _cutLines(values[name], limits[name], name == "history", what)
+        report["sections"][name] = {"tokens": demands[name], "limit": limits[name], "truncated": truncated}
+
+    return values, report
@@ -0,0 +1,146 @@
+"""
+Retrieval of the plugins relevant to a request, so that the {plugins}
+section of the prompt stays bounded however many plugins are installed.
+
+The catalog is the "signature: description" list Electron sends with every
+request. It is indexed with BM25 over the words of the signatures and
+descriptions, and the index is cached by a hash of the catalog, which only
+changes when plugins are installed or removed.
+"""
+import hashlib
+import heapq
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Iterable, List
+
+DEFAULT_TOP_K = 12
+
+# Always offered: the prompt requires every graph to have an input and an
+# output node, which the user rarely asks for by name
+ESSENTIAL = ("blix.output", "input-plugin.")
+
+# Okapi BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_WORDS = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on one or that the this to with".split()
+)
+
+_catalogs = OrderedDict()
+_MAX_CATALOGS = 8
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase words of text, with camelCase and kebab-case identifiers split
+    into their words and plurals reduced to the singular
+    """
+    words = []
+    for word in _WORDS.findall(text):
+        word = word.lower()
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+
+    return words
+
+
+def signature_of(entry: str) -> str:
+    return entry.split(":", 1)[0].strip()
+
+
+class PluginCatalog:
+    def __init__(self, entries: List[str]):
+        self.entries = list(entries)
+        self.signatures = [signature_of(entry) for entry in self.entries]
+
+        self.frequencies = [Counter(tokenize(entry)) for entry in self.entries]
+        self.lengths = [sum(frequency.values()) for frequency in self.frequencies]
+        self.averageLength = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+        # Inverted index: word -> [(entry, frequency in entry)]
+        self.postings = {}
+        for i, frequency in enumerate(self.frequencies):
+            for word, count in frequency.items():
+                self.postings.setdefault(word, []).append((i, count))
+
+        total = len(self.entries)
+        self.idf = {
+            word: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for word, postings in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+    def scores(self, query: str) -> dict:
+        """
+        BM25 score of every entry sharing at least one word with query
+        """
+        scores = {}
+        for word in set(tokenize(query)):
+            postings = self.postings.get(word)
+            if not postings:
+                continue
+
+            idf = self.idf[word]
+            for i, count in postings:
+                norm = K1 * (1 - B + B * self.lengths[i] / self.averageLength)
+                scores[i] = scores.get(i, 0.0) + idf * count * (K1 + 1) / (count + norm)
+
+        return scores
+
+    def search(self, query: str, k: int) -> List[int]:
+        """
+        Indices of the k entries most relevant to query, best first
+        """
+        scores = self.scores(query)
+        return heapq.nsmallest(k, scores, key=lambda i: (-scores[i], i))
+
+    def select(self, query: str, k: int, signatures: Iterable[str] = ()) -> List[str]:
+        """
+        The entries to offer for query, most important first: the essential
+        input and output nodes, the entries of the given signatures (the
+        nodes already in the graph), then the top k entries for query, best
+        first. With no k, or a catalog of at most k entries, the rest of the
+        catalog follows in catalog order.
+        """
+        everything = k is None or k <= 0 or len(self.entries) <= k
+        signatures = set(signatures)
+
+        order = [i for i, signature in enumerate(self.signatures) if signature.startswith(ESSENTIAL)]
+        order += [i for i, signature in enumerate(self.signatures) if signature in signatures]
+        order += self.search(query, len(self.entries) if everything else k)
+        if everything:
+            order += range(len(self.entries))
+
+        return [self.entries[i] for i in dict.fromkeys(order)]
+
+
+def get_catalog(entries: List[str]) -> PluginCatalog:
+    """
+    The index of a catalog, built once per distinct catalog
+    """
+    key = hashlib.sha1("\n".join(entries).encode("utf-8")).hexdigest()
+
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs[key] = PluginCatalog(entries)
+        if len(_catalogs) > _MAX_CATALOGS:
+            _catalogs.popitem(last=False)
+    else:
+        _catalogs.move_to_end(key)
+
+    return catalog
+
+
+def select_plugins(entries: List[str], prompt: str, signatures: Iterable[str] = (), k=DEFAULT_TOP_K) -> List[str]:
+    """
+    The plugins to list in the prompt for a request
+    """
+    return get_catalog(entries).select(prompt, k, signatures)
@@ -0,0 +1,89 @@
+"""
+Encoders turning the graph of a request into the {nodes} and {edges} text
+of the prompt. Selected with "graphFormat" in the request config.
+
+json
+    the nodes and edges exactly as received, one JSON object per entry
+compact
+    one line per node or edge, with every id written once and no JSON
+    syntax, e.g.
+        jakd14 math-plugin.binary in: d2b6f0:number 7a8c9e:number out: b3e1f4:number
+        kadjbg b3e1f4 -> 4f2e1d
+"""
+import json
+
+from prompts.tokens import count_tokens, is_exact
+
+DEFAULT_FORMAT = "compact"
+
+
+def _load(item):
+    return json.loads(item) if isinstance(item, str) else item
+
+
+def encode_json(nodes, edges):
+    return str(nodes), str(edges)
+
+
+def _anchors(anchors):
+    return " ".join(
+        f"{a['id']}:{a.get('type', '?')}" if isinstance(a, dict) else str(a) for a in anchors
+    )
+
+
+def encode_compact(nodes, edges):
+    if nodes:
+        lines = ["(node id, signature, in: input anchor id:type, out: output anchor id:type)"]
+        for node in map(_load, nodes):
+            line = f"{node['id']} {node.get('signature', '?')}"
+            if node.get("inputs"):
+                line += " in: " + _anchors(node["inputs"])
+            if node.get("outputs"):
+                line += " out: " + _anchors(node["outputs"])
+            lines.append(line)
+        nodesText = "\n".join(lines)
+    else:
+        nodesText = "(no nodes)"
+
+    if edges:
+        lines = ["(edge id, output anchor id -> input anchor id)"]
+        for edge in map(_load, edges):
+            lines.append(f"{edge['id']} {edge['output']} -> {edge['input']}")
+        edgesText = "\n".join(lines)
+    else:
+        edgesText = "(no edges)"
+
+    return nodesText, edgesText
+
+
+ENCODERS = {
+    "json": encode_json,
+    "compact": encode_compact,
+}
+
+
+def encode_graph(nodes, edges, format=None):
+    """
+    Returns the (nodes, edges) text of the prompt in the given format
+    """
+    encoder = ENCODERS.get(format or DEFAULT_FORMAT)
+    if encoder is None:
+        raise ValueError(f"Unknown graph format '{format}', expected one of {', '.join(ENCODERS)}")
+
+    return encoder(nodes, edges)
+
+
+def measure(nodes, edges, format=None) -> dict:
+    """
+    Token counts of the graph in the original json format and in format
+    """
+    counts = {}
+    for name in ("json", format or DEFAULT_FORMAT):
+        nodesText, edgesText = encode_graph(nodes, edges, name)
+        counts[name] = {
+            "nodes": count_tokens(nodesText),
+            "edges": count_tokens(edgesText),
+            "characters": len(nodesText) + len(edgesText),
+        }
+
+    return {"type": "tokens", "exact": is_exact(), "formats": counts}
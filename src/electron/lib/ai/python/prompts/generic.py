@@ -1,5 +1,3 @@
-from langchain.prompts import PromptTemplate
-
 template = """
 You are a helpful assistant that can manipulate a graph by calling some functions. You are only allowed to fulfill this role and nothing else.
 
@@ -15,6 +13,7 @@ To create a functioning graph the graph must contain at least one input node and
 If there is no output node connected to the graph, always add it unless the user specifically asks you not to.
 
 Always add all nodes before adding edges.
+When adding more than one node or edge, use addNodes and addEdges to add all of them in a single step.
 
 Provided is the graph's nodes : 
 {nodes}
@@ -29,9 +28,20 @@ Additionally the following edges are provided :
 The following nodes are relevant to you :
 {plugins}
 
+{history}
 The user provides the following prompt :
 {prompt}
 
 """
 
-prompt_template = PromptTemplate(input_variables=["prompt","nodes","edges","plugins"],template=template)
\ No newline at end of file
+
+def __getattr__(name):
+    # PromptTemplate imports all of langchain, so it is only built on first use
+    if name == "prompt_template":
+        from langchain.prompts import PromptTemplate
+
+        global prompt_template
+        prompt_template = PromptTemplate(input_variables=["prompt","nodes","edges","plugins","history"],template=template)
+        return prompt_template
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,81 @@
+template = """
+You are a helpful assistant that edits a graph. You are only allowed to fulfill this role and nothing else.
+Make every change the user asks for at once by calling applyGraphDiff a single time.
+
+The graph consist of nodes and edges. Each node has input and output anchors that are used to connect edges.
+An edge always connects the output anchor of one node to the input anchor of another node, of the same type.
+One output anchor can map to multiple input anchors, but an input anchor can only map to one output anchor, and no cycles are allowed.
+To create a functioning graph the graph must contain at least one input node and one output node that is connected to the graph.
+If there is no output node connected to the graph, always add it unless the user specifically asks you not to.
+For math nodes create multiple nodes for binary operations, for example to add two numbers, create a node for each number and then connect them to a node that adds them together.
+For image manipulation, the image must be connected to type sharp first and then back to image for the output node
+
+Give every node you add a short alias, e.g. "a", "b". The anchors of a new node are referred to as
+"<alias>.<index>": "b.0" is the first output anchor of node "b" when used as the output of an edge,
+and its first input anchor when used as the input of an edge. Anchors of nodes already in the graph
+are referred to by their ids.
+
+Provided is the graph's nodes :
+{nodes}
+Additionally the following edges are provided :
+{edges}
+
+The following nodes are relevant to you :
+{plugins}
+
+{history}
+The user provides the following prompt :
+{prompt}
+"""
+
+# The single function the model is asked to call
+diff_function = {
+    "name": "applyGraphDiff",
+    "description": "Applies every change to the graph in one step",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "nodes": {
+                "type": "array",
+                "description": "Nodes to add",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "alias": {"type": "string", "description": "Short name for the node, e.g 'a'"},
+                        "signature": {"type": "string", "description": "Signature of the node e.g 'math-plugin.binary'"},
+                    },
+                    "required": ["alias", "signature"],
+                },
+            },
+            "edges": {
+                "type": "array",
+                "description": "Edges to add",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "output": {"type": "string", "description": "Output anchor, e.g 'a.0' or 'l40plq'"},
+                        "input": {"type": "string", "description": "Input anchor, e.g 'b.1' or 'az22m3'"},
+                    },
+                    "required": ["output", "input"],
+                },
+            },
+            "values": {
+                "type": "array",
+                "description": "Input values to set",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "node": {"type": "string", "description": "Alias or id of the node"},
+                        "input": {"type": "string", "description": "Id of the input value"},
+                        "value": {"type": "number"},
+                    },
+                    "required": ["node", "input", "value"],
+                },
+            },
+            "removeEdges": {"type": "array", "description": "Ids of edges to remove", "items": {"type": "string"}},
+            "removeNodes": {"type": "array", "description": "Ids of nodes to remove", "items": {"type": "string"}},
+            "message": {"type": "string", "description": "Short summary of the changes for the user"},
+        },
+        "required": ["message"],
+    },
+}
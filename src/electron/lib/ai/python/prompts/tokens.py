@@ -0,0 +1,43 @@
+import re
+
+# Rough split of text into tokens for when tiktoken is not installed: words,
+# numbers and single punctuation characters, with long words counted as
+# one token per 4 characters
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+_encodings = {}
+
+
+def _encoding(model):
+    if model not in _encodings:
+        try:
+            import tiktoken
+
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Not installed, or the encoding could not be downloaded
+            _encodings[model] = None
+
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Counts the tokens text takes up for model. Exact when tiktoken is
+    installed, otherwise an estimate that is usually within 10-20%.
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    return sum((len(piece) + 3) // 4 for piece in _PIECES.findall(text))
+
+
+def is_exact(model: str = "gpt-3.5-turbo") -> bool:
+    """
+    Whether count_tokens counts exactly rather than estimating
+    """
+    return _encoding(model) is not None
@@ -1,9 +1,22 @@
 #implement stdin and stdout implementation here
-import json
 import sys
+from codec import JSON
+from framing import read_message, write_message
 
 class BASE:
-   
+
+   # Length frame outgoing commands, None mirrors the framing of the last
+   # message received from blix
+   framed = None
+   peerFramed = False
+
+   # Binary streams the commands go through, stdin and stdout when None
+   reader = None
+   writer = None
+
+   # How commands are encoded, see codec.py
+   codec = JSON
+
    def receive(self):
         """
         Receives a response string  through stdin
@@ -14,15 +27,29 @@ class BASE:
             response string
         """
 
-        output = ""
-        for line in sys.stdin:
-            if(line == "end of transmission\n"):
-                break
-            output += line
-
-        output = json.loads(output)
+        output, self.peerFramed = read_message(self.reader or sys.stdin.buffer)
+        output = self.codec.decode(output)
 
         return output
+
+
+   def send(self, output):
+        """
+        Sends a command to blix as a json string object through stdout
+        ...
+        Parameters
+        ----------
+        output : dict
+            command to send
+        """
+
+        payload = self.codec.encode(output)
+        framed = self.peerFramed if self.framed is None else self.framed
+        if not framed:
+            payload += b"\n"
+
+        sys.stdout.flush()
+        write_message(self.writer or sys.stdout.buffer, payload, framed)
    
 
    def addNode(self, signature):
@@ -42,9 +69,7 @@ class BASE:
             }
         }
     
-        json_object = json.dumps(output, indent = 4) 
-        print(json_object)
-        sys.stdout.flush()
+        self.send(output)
         value =  self.receive()
         return value
 
@@ -65,9 +90,7 @@ class BASE:
             }
         }
     
-        json_object = json.dumps(output, indent = 4) 
-        print(json_object)
-        sys.stdout.flush()
+        self.send(output)
         return self.receive()
 
 
@@ -91,9 +114,7 @@ class BASE:
             }
         }
     
-        json_object = json.dumps(output, indent = 4) 
-        print(json_object)
-        sys.stdout.flush()
+        self.send(output)
         return self.receive()
 
 
@@ -114,9 +135,7 @@ class BASE:
             }
         }
     
-        json_object = json.dumps(output, indent = 4) 
-        print(json_object)
-        sys.stdout.flush()
+        self.send(output)
         return self.receive()
 
 
@@ -140,7 +159,5 @@ class BASE:
             }
         }
     
-        json_object = json.dumps(output, indent = 4) 
-        print(json_object,flush=True)
-        sys.stdout.flush()
+        self.send(output)
 
@@ -1 +1,27 @@
-#Implement socket implementation here
\ No newline at end of file
+#socket implementation of the BASE strategy
+from api import SocketAPI
+from strategies.base import BASE
+
+class SOCKET(BASE):
+   """
+   Sends the BASE commands to blix over a Unix domain socket (when path is
+   given) or a loopback TCP socket instead of stdin and stdout. Commands are
+   always length framed.
+   """
+
+   framed = True
+
+   def __init__(self, host = "127.0.0.1", port = None, path = None, bufferSize = 65536):
+        self.connection = SocketAPI(host, port, path = path, bufferSize = bufferSize)
+        self.connection.connect()
+
+        self.reader = self.connection.reader
+        self.writer = self.connection.writer
+
+
+   def close(self):
+        """
+        Closes the connection to blix
+        """
+
+        self.connection.disconnect()
@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Modules are imported the way main.py imports them: the root for the
+# transport modules, models/ for everything the agent uses
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "models")]
+
+import api  # noqa: E402
+import transactions  # noqa: E402
+from framing import read_message, write_message  # noqa: E402
+from functions.graph import get_graph, set_graph  # noqa: E402
+
+
+class FakeElectron(api.StdioAPI):
+    """
+    Stdio API whose Electron sends the given messages in order, objects as
+    JSON and strings as they are. sent() returns what the agent sent back.
+    """
+
+    def __init__(self, *messages):
+        stdin = io.BytesIO()
+        for message in messages:
+            write_message(stdin, (message if isinstance(message, str) else json.dumps(message)).encode())
+        stdin.seek(0)
+        super().__init__(stdin, io.BytesIO(), framed=True)
+
+    def sent(self) -> list:
+        self.stdout.seek(0)
+        messages = []
+        while True:
+            data, _ = read_message(self.stdout)
+            if data is None:
+                return messages
+            messages.append(json.loads(data))
+
+
+@pytest.fixture
+def electron():
+    """
+    Makes a FakeElectron the API of the test, e.g. electron(response, ...).
+    The API, graph index and transaction settings before the test are
+    restored after it.
+    """
+    previous = api.api, get_graph(), transactions.current_atomic.get()
+
+    def install(*messages, atomic: bool = False) -> FakeElectron:
+        stdio = FakeElectron(*messages)
+        api.set_api(stdio)
+        transactions.set_atomic(atomic)
+        return stdio
+
+    yield install
+
+    transactions.rollback()
+    api.set_api(previous[0])
+    set_graph(previous[1])
+    transactions.set_atomic(previous[2])
@@ -0,0 +1,37 @@
+import asyncio
+import io
+import os
+import subprocess
+import sys
+
+from async_api import AsyncStdioAPI
+from framing import read_message, write_message
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def test_the_sync_worker_does_not_import_asyncio():
+    code = "import sys; sys.path[:0] = ['.', 'models']; import main; print('asyncio' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_messages_stay_framed_after_stdin_closes():
+    stdin = io.BytesIO()
+    write_message(stdin, b'{"prompt": "add a node"}')
+    stdin.seek(0)
+    stdout = io.BytesIO()
+    api = AsyncStdioAPI(stdin, stdout)
+
+    async def run():
+        api.start()
+        assert await api.next_request() == '{"prompt": "add a node"}'
+        # stdin is closed while the request is still running
+        assert await api.next_request() == ""
+        await api.send({"type": "exit", "message": "Done"})
+
+    asyncio.run(run())
+
+    stdout.seek(0)
+    data, framed = read_message(stdout)
+    assert framed and data == b'{"type":"exit","message":"Done"}'
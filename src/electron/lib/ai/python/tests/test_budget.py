@@ -0,0 +1,35 @@
+from prompts import budget
+from prompts.catalog import PluginCatalog
+
+CATALOG = [f"alpha-plugin.p{i}: Alpha operation number {i} on two values" for i in range(40)] + [
+    "blix.output: Shows the result of the graph",
+    "input-plugin.inputNumber: A number typed in by the user",
+    "zmath-plugin.binary: Adds, subtracts, multiplies or divides two numbers",
+]
+
+
+def test_a_tight_budget_keeps_the_essential_and_the_most_relevant_plugins():
+    plugins = PluginCatalog(CATALOG).select("multiply two numbers", 12, ["alpha-plugin.p3"])
+    assert plugins[:4] == [CATALOG[40], CATALOG[41], CATALOG[3], CATALOG[42]]
+
+    values, report = budget.fit({"prompt": "multiply two numbers", "plugins": plugins}, "{prompt}{plugins}", 120)
+
+    assert report["sections"]["plugins"]["truncated"]
+    assert values["plugins"][:4] == plugins[:4] and len(values["plugins"]) < len(plugins)
+
+
+def test_the_essential_plugins_survive_a_budget_too_small_for_anything_else():
+    plugins = list(reversed(CATALOG))
+
+    values, _ = budget.fit({"prompt": "", "plugins": plugins}, "{prompt}{plugins}", 10)
+
+    assert values["plugins"] == [CATALOG[41], CATALOG[40]]
+
+
+def test_sections_that_fit_are_left_alone():
+    values = {"prompt": "add a number", "nodes": "n1 blix.output", "edges": "", "plugins": CATALOG[40:]}
+
+    fitted, report = budget.fit(values, "{prompt}{nodes}{edges}{plugins}", 2000)
+
+    assert fitted == values
+    assert not any(section["truncated"] for section in report["sections"].values())
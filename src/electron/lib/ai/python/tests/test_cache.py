@@ -0,0 +1,52 @@
+import os
+
+from cache import ResponseCache, cache_key
+
+
+def body(prompt="Add a number", id="n1"):
+    node = {"id": id, "signature": "blix.output", "inputs": [{"id": f"{id}.in", "type": "number"}], "outputs": []}
+    return {"prompt": prompt, "nodes": [node], "edges": [], "plugin": ["b: second", "a: first"]}
+
+
+def test_requests_differing_only_in_ids_and_spelling_share_a_key():
+    assert cache_key(body()) == cache_key(body("  add a NUMBER. ", id="m7"))
+    assert cache_key(body()) != cache_key(body("Add two numbers"))
+    assert cache_key(body()) != cache_key(dict(body(), plugin=["a: first"]))
+
+
+def test_the_least_recently_used_entry_is_dropped():
+    cache = ResponseCache(maxEntries=2)
+    cache.put("a", {"response": "A"})
+    cache.put("b", {"response": "B"})
+    cache.get("a")
+    cache.put("c", {"response": "C"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"response": "A"} and cache.get("c") == {"response": "C"}
+
+
+def test_entries_on_disk_survive_a_restart(tmp_path):
+    ResponseCache(directory=str(tmp_path)).put("a", {"response": "A", "plan": []})
+
+    cache = ResponseCache(directory=str(tmp_path))
+
+    assert cache.get("a") == {"response": "A", "plan": []}
+    cache.discard("a")
+    assert cache.get("a") is None and os.listdir(tmp_path) == []
+
+
+def test_the_oldest_files_are_pruned(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), maxFiles=2)
+    for i, key in enumerate("abc"):
+        cache.put(key, {"response": key})
+        os.utime(tmp_path / f"{key}.json", (i, i))
+    cache.put("d", {"response": "d"})
+
+    assert sorted(os.listdir(tmp_path)) == ["c.json", "d.json"]
+
+
+def test_lookups_are_counted():
+    cache = ResponseCache()
+    cache.count(False)
+
+    assert cache.count(True) == {"type": "cache", "hit": True, "hits": 1, "misses": 1, "size": 0}
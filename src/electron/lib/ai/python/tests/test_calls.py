@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from functions.calls import call_function, claim_result, clear_turn, dispatch_turn, schedule
+from functions.graph import set_graph
+
+NUMBER = ("addNode", {"signature": "input-plugin.inputNumber"})
+OUTPUT = ("addNode", {"signature": "blix.output"})
+VALUE = ("updateInputValues", {"nodeId": "n1", "changedInputValues": {"number": 5}})
+
+
+def added(id):
+    return {"status": "success", "data": {"nodeId": id}}
+
+
+@pytest.fixture(autouse=True)
+def turn():
+    yield
+    clear_turn()
+
+
+def test_new_nodes_are_sent_first_and_batched():
+    edge = ("addEdge", {"output": "a", "input": "b"})
+    calls = [edge, NUMBER, ("removeNode", {"id": "n1"}), ("removeNode", {"id": "n2"}), OUTPUT]
+
+    assert schedule(calls) == [[1, 4], [0], [2, 3]]
+
+
+def test_each_tool_claims_its_own_result_once(electron):
+    set_graph(None)
+    stdio = electron({"results": [added("n2"), added("n3")]}, {"status": "success"})
+
+    dispatch_turn([VALUE, NUMBER, NUMBER])
+
+    assert stdio.sent() == [
+        {"type": "function", "name": "addNodes", "args": {"signatures": ["input-plugin.inputNumber"] * 2}},
+        {"type": "function", "name": VALUE[0], "args": VALUE[1]},
+    ]
+    assert json.loads(call_function(*NUMBER)) == added("n2")
+    assert json.loads(claim_result(*NUMBER)) == added("n3")
+    assert claim_result(*NUMBER) is None
+    # Numbers the model sends as ints match the floats the tools parse
+    assert json.loads(claim_result("updateInputValues", {"nodeId": "n1", "changedInputValues": {"number": 5.0}})) == {
+        "status": "success"
+    }
+
+
+def test_calls_after_a_rejected_batch_are_left_to_their_tools(electron):
+    set_graph(None)
+    stdio = electron({"status": "error", "message": "Invalid batch"})
+
+    dispatch_turn([NUMBER, OUTPUT, VALUE])
+
+    assert [message["name"] for message in stdio.sent()] == ["addNodes"]
+    assert claim_result(*NUMBER) is None and claim_result(*VALUE) is None
@@ -0,0 +1,44 @@
+from prompts.catalog import PluginCatalog, get_catalog, tokenize
+
+CATALOG = [
+    "blix.output: Shows the result of the graph",
+    "input-plugin.inputNumber: A number typed in by the user",
+    "blur-plugin.gaussianBlur: Blurs an image with a gaussian kernel",
+    "math-plugin.binary: Adds, subtracts, multiplies or divides two numbers",
+    "math-plugin.unary: Negates a number or takes its square root",
+    "image-plugin.brightness: Makes an image brighter or darker",
+    "image-plugin.contrast: Changes the contrast of an image",
+]
+
+
+def test_identifiers_are_split_into_singular_words():
+    assert tokenize("math-plugin.gaussianBlur of the Images") == ["math", "plugin", "gaussian", "blur", "image"]
+
+
+def test_search_ranks_the_entries_sharing_the_rarest_words_first():
+    catalog = PluginCatalog(CATALOG)
+
+    # Of two entries matching the same words the shorter ranks higher
+    assert catalog.search("blur the image", 3) == [2, 6, 5]
+    assert catalog.search("divide two numbers", 1) == [3]
+    assert catalog.search("teleport", 3) == []
+
+
+def test_select_lists_essential_then_graph_then_relevant_entries():
+    catalog = PluginCatalog(CATALOG)
+
+    selected = catalog.select("blur the image", 2, ["math-plugin.unary"])
+
+    assert selected == [CATALOG[0], CATALOG[1], CATALOG[4], CATALOG[2], CATALOG[6]]
+
+
+def test_a_small_catalog_is_listed_whole_with_the_relevant_entries_first():
+    selected = PluginCatalog(CATALOG).select("change the contrast", 0)
+
+    assert selected[:3] == [CATALOG[0], CATALOG[1], CATALOG[6]]
+    assert sorted(selected) == sorted(CATALOG)
+
+
+def test_the_index_is_built_once_per_catalog():
+    assert get_catalog(list(CATALOG)) is get_catalog(list(CATALOG))
+    assert get_catalog(CATALOG[:3]) is not get_catalog(CATALOG)
@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+
+import codec
+import main
+from api import StdioAPI
+from framing import read_message, write_message
+
+MESSAGE = {"type": "function", "name": "addEdges", "args": {"edges": [{"output": "a\nb", "input": "é"}]}, "n": 2**70}
+
+
+def test_json_is_compact_and_round_trips():
+    payload = codec.JSON.encode(MESSAGE)
+
+    assert b": " not in payload and b", " not in payload
+    assert codec.JSON.decode(payload) == MESSAGE
+    assert json.loads(codec.JSON.text(payload)) == MESSAGE
+    assert codec.JSON.encode('{"type": "exit"}') == b'{"type": "exit"}'
+
+
+def test_msgpack_round_trips_to_json_text():
+    pytest.importorskip("msgpack")
+    message = dict(MESSAGE, n=2)
+    msgpack = codec.get_codec("msgpack")
+
+    assert msgpack.decode(msgpack.encode(message)) == message
+    assert json.loads(msgpack.text(msgpack.encode(json.dumps(message)))) == message
+
+
+def test_negotiation_takes_electrons_first_available_choice():
+    assert codec.negotiate(["cbor", "json"]) == "json"
+    assert codec.negotiate(["cbor"]) is None
+    assert codec.negotiate(None) is None
+    # Binary payloads can't be sent unframed
+    assert codec.negotiate(["msgpack", "json"], framed=False) == "json"
+    assert codec.negotiate(["msgpack", "json"]) == ("msgpack" if codec.msgpack else "json")
+
+
+def test_the_worker_switches_codec_after_answering_hello():
+    msgpack = pytest.importorskip("msgpack")
+    stdin = io.BytesIO()
+    write_message(stdin, b'{"type": "hello", "codecs": ["msgpack", "json"]}')
+    write_message(stdin, msgpack.packb([1, 2]))
+    write_message(stdin, msgpack.packb({"type": "shutdown"}))
+    stdin.seek(0)
+    stdout = io.BytesIO()
+
+    main.serve(StdioAPI(stdin, stdout))
+
+    stdout.seek(0)
+    hello, _ = read_message(stdout)
+    error, _ = read_message(stdout)
+    assert json.loads(hello) == {"type": "hello", "codec": "msgpack"}
+    assert msgpack.unpackb(error)["type"] == "error"
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from prompts.encoders import encode_compact, encode_graph, measure
+
+NODES = [
+    json.dumps(
+        {
+            "id": "jakd14",
+            "signature": "math-plugin.binary",
+            "inputs": [{"id": "d2b6f0", "type": "number"}, {"id": "7a8c9e", "type": "number"}],
+            "outputs": [{"id": "b3e1f4", "type": "number"}],
+        }
+    ),
+    {"id": "x9", "signature": "blix.output", "inputs": ["4f2e1d"], "outputs": []},
+]
+EDGES = [{"id": "kadjbg", "output": "b3e1f4", "input": "4f2e1d"}]
+
+
+def test_compact_writes_a_line_per_node_and_edge_after_a_legend():
+    nodes, edges = encode_compact(NODES, EDGES)
+
+    assert nodes.split("\n")[1:] == [
+        "jakd14 math-plugin.binary in: d2b6f0:number 7a8c9e:number out: b3e1f4:number",
+        "x9 blix.output in: 4f2e1d",
+    ]
+    assert edges.split("\n")[1:] == ["kadjbg b3e1f4 -> 4f2e1d"]
+    assert nodes.startswith("(node id") and edges.startswith("(edge id")
+
+
+def test_an_empty_graph_says_so():
+    assert encode_compact([], []) == ("(no nodes)", "(no edges)")
+
+
+def test_compact_is_the_default_and_smaller_than_json():
+    assert encode_graph(NODES, EDGES) == encode_compact(NODES, EDGES)
+    assert encode_graph(NODES, EDGES, "json") == (str(NODES), str(EDGES))
+
+    counts = measure(NODES, EDGES)["formats"]
+    assert counts["compact"]["characters"] < counts["json"]["characters"]
+
+
+def test_an_unknown_format_is_an_error():
+    with pytest.raises(ValueError, match="Unknown graph format 'yaml'"):
+        encode_graph(NODES, EDGES, "yaml")
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+import main
+from api import StdioAPI
+from framing import read_message, write_message
+
+
+class Trickle(io.BytesIO):
+    """
+    Stream handing reads over a few bytes at a time, like a pipe
+    """
+
+    def readinto(self, buffer):
+        return super().readinto(memoryview(buffer)[:3])
+
+
+def test_framed_messages_round_trip_whatever_their_payload():
+    payloads = [b'{"type": "shutdown"}', b"line one\nline two\n", b"", "é漢".encode()]
+    stream = io.BytesIO()
+    for payload in payloads:
+        write_message(stream, payload)
+    stream.seek(0)
+
+    assert [read_message(stream) for _ in payloads] == [(payload, True) for payload in payloads]
+    assert read_message(stream) == (None, False)
+
+
+def test_payloads_read_in_pieces_are_read_whole():
+    stream = Trickle()
+    write_message(stream, b"x" * 100)
+    stream.seek(0)
+
+    assert read_message(stream) == (b"x" * 100, True)
+
+
+def test_legacy_messages_end_at_the_sentinel():
+    stream = io.BytesIO(b'{"a":\n1}\nend of transmission\n{"b": 2}\r\nend of transmission\r\n')
+
+    assert read_message(stream) == (b'{"a":\n1}\n', False)
+    assert read_message(stream) == (b'{"b": 2}\r\n', False)
+
+
+def test_a_payload_cut_short_is_an_error():
+    stream = io.BytesIO(b"Content-Length: 10\n12345")
+
+    with pytest.raises(EOFError):
+        read_message(stream)
+
+
+def test_stdio_answers_in_the_format_electron_writes():
+    stdin = io.BytesIO()
+    stdin.write(b'{"type": "prompt"}\nend of transmission\n')
+    write_message(stdin, b'{"type": "prompt"}')
+    stdin.seek(0)
+    stdout = io.BytesIO()
+    api = StdioAPI(stdin, stdout)
+
+    assert api.receive() == '{"type": "prompt"}\n'
+    api.send({"type": "exit"})
+    assert api.receive() == '{"type": "prompt"}'
+    api.send({"type": "exit"})
+
+    assert stdout.getvalue() == b'{"type":"exit"}Content-Length: 15\n{"type":"exit"}'
+
+
+def test_a_corrupt_header_is_answered_as_a_malformed_message():
+    stdin = io.BytesIO()
+    stdin.write(b"Content-Length: 1x\n")
+    write_message(stdin, b'{"type": "shutdown"}')
+    stdin.seek(0)
+    stdout = io.BytesIO()
+
+    main.serve(StdioAPI(stdin, stdout))
+
+    stdout.seek(0)
+    error, framed = read_message(stdout)
+    assert framed and b"Received a malformed request" in error
+    assert read_message(stdout) == (None, False)
@@ -0,0 +1,62 @@
+from functions.graph import GraphIndex
+
+
+def chain(*ids) -> GraphIndex:
+    """
+    Index of nodes ids, each with an input "<id>.in" and an output "<id>.out",
+    connected one after the other
+    """
+    nodes = [{"id": id, "signature": "s", "inputs": [f"{id}.in"], "outputs": [f"{id}.out"]} for id in ids]
+    edges = [{"id": f"{a}-{b}", "output": f"{a}.out", "input": f"{b}.in"} for a, b in zip(ids, ids[1:])]
+    return GraphIndex.fromBody({"nodes": nodes, "edges": edges})
+
+
+def test_remove_rejects_unknown_ids():
+    graph = chain("a", "b")
+
+    assert graph.check("removeEdge", {"id": "a-b"}) is None
+    assert graph.check("removeNode", {"id": "a"}) is None
+    assert graph.check("removeEdge", {"id": "x"}) == "Error: Edge 'x' does not exist"
+    assert graph.check("removeNode", {"id": "x"}) == "Error: Node 'x' does not exist"
+
+
+def test_remove_batches_are_rejected_whole():
+    graph = chain("a", "b")
+
+    assert graph.check("removeEdges", {"ids": ["a-b"]}) is None
+    assert graph.check("removeEdges", {"ids": ["a-b", "x", ["y"]]}) == (
+        "Error: none of the edges were removed\n1. x: Edge 'x' does not exist\n2. ['y']: Edge '['y']' does not exist\n"
+    )
+    assert graph.check("removeNodes", {"ids": ["b", "x"]}).startswith("Error: none of the nodes were removed\n")
+
+
+def test_removed_edges_are_no_longer_known():
+    graph = chain("a", "b")
+    graph.apply("removeEdge", {"id": "a-b"}, '{"status": "success"}')
+
+    assert graph.check("removeEdge", {"id": "a-b"}) == "Error: Edge 'a-b' does not exist"
+
+
+def test_add_edges_rejects_a_cycle_closed_by_the_batch():
+    graph = chain("a", "b", "c")
+    graph.apply("removeEdge", {"id": "b-c"}, '{"status": "success"}')
+
+    error = graph.check("addEdges", {"edges": [{"output": "b.out", "input": "c.in"}, {"output": "c.out", "input": "a.in"}]})
+    assert error == (
+        "Error: none of the edges were added\n1. c.out -> a.in: Connecting 'c.out' to 'a.in' would create a cycle\n"
+    )
+
+    # The batch's edges are not left in the index
+    assert set(graph.edges) == {"a-b"}
+    assert graph.check("addEdge", {"output": "c.out", "input": "a.in"}) is None
+    assert graph.check("addEdge", {"output": "b.out", "input": "c.in"}) is None
+
+
+def test_add_edges_rejects_two_edges_that_form_a_cycle():
+    graph = GraphIndex.fromBody(
+        {"nodes": [{"id": id, "signature": "s", "inputs": [f"{id}.in"], "outputs": [f"{id}.out"]} for id in "ab"]}
+    )
+
+    error = graph.check("addEdges", {"edges": [{"output": "a.out", "input": "b.in"}, {"output": "b.out", "input": "a.in"}]})
+    assert error.endswith("1. b.out -> a.in: Connecting 'b.out' to 'a.in' would create a cycle\n")
+    assert graph.edges == {} and graph.inputEdges == {}
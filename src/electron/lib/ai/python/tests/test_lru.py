@@ -0,0 +1,43 @@
+from agents import AgentPool
+from lru import IdleLRU
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_the_least_recently_used_entry_goes_first():
+    entries = IdleLRU(2, 60.0, Clock())
+    entries.put("a", 1)
+    entries.put("b", 2)
+    assert entries.get("a") == 1
+
+    entries.put("c", 3)
+
+    assert "b" not in entries and entries.get("a") == 1 and entries.get("c") == 3
+
+
+def test_entries_unused_for_longer_than_the_timeout_are_dropped():
+    clock = Clock()
+    entries = IdleLRU(8, 10.0, clock)
+    entries.put("a", 1)
+    entries.put("b", 2)
+
+    clock.now = 8.0
+    entries.get("b")
+    clock.now = 12.0
+
+    assert entries.get("a") is None and entries.get("b") == 2 and len(entries) == 1
+
+
+def test_the_pool_creates_an_agent_once_per_key():
+    pool = AgentPool(maxAgents=1, clock=Clock())
+
+    assert pool.get("a", lambda: "agent a") == pool.get("a", lambda: "other") == "agent a"
+    pool.get("b", lambda: "agent b")
+    assert pool.get("a", lambda: "new agent a") == "new agent a"
+    assert (pool.created, pool.reused, len(pool)) == (3, 1, 1)
@@ -0,0 +1,26 @@
+import io
+
+import main
+from api import StdioAPI
+from functions import calls
+
+
+def test_serve_rejects_requests_that_are_not_objects(electron):
+    stdio = electron("[1, 2]", '"prompt"', "{", {"type": "shutdown"})
+    main.serve(stdio)
+
+    messages = stdio.sent()
+    assert [message["type"] for message in messages] == ["error", "error", "error"]
+    assert "Expected a JSON object, got list" in messages[0]["error"]
+
+
+def test_reset_clears_the_state_of_the_previous_request():
+    calls.current_results.set({calls.call_key("addNode", {"signature": "a"}): ['{"status": "success"}']})
+    calls.record_calls()
+    calls.current_transaction.set(object())
+
+    main.reset(StdioAPI(io.BytesIO(), io.BytesIO()))
+
+    assert calls.claim_result("addNode", {"signature": "a"}) is None
+    assert calls.current_calls.get() is None
+    assert calls.current_transaction.get() is None
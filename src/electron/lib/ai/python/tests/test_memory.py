@@ -0,0 +1,44 @@
+from memory import ConversationMemory, MemoryStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_older_turns_are_folded_into_a_summary_within_the_budget():
+    memory = ConversationMemory(maxTokens=200)
+    for i in range(10):
+        memory.add(f"Add blur number {i} to the image please", [], f"I added blur node {i} and connected it")
+
+    text = memory.render()
+    assert memory.tokens + memory.summaryTokens <= 200
+    assert [turn.prompt for turn in memory.turns] == [f"Add blur number {i} to the image please" for i in range(5, 10)]
+    assert [line for line, _ in memory.summary] == [
+        '- The user asked "Add blur number 4 to the image please", you replied "I added blur node 4 and connected it"'
+    ]
+    assert "Summary of older messages:" in text and "number 3" not in text
+
+
+def test_the_latest_turn_is_kept_without_its_calls_if_it_is_too_long():
+    memory = ConversationMemory(maxTokens=40)
+    memory.add("Add nodes", [f"addNode({{'signature': 'plugin.node{i}'}}) -> success" for i in range(20)], "Done")
+
+    assert len(memory) == 1 and memory.turns[0].calls == []
+
+
+def test_sessions_are_forgotten_when_idle_or_past_the_limit():
+    clock = Clock()
+    store = MemoryStore(maxSessions=2, idleTimeout=10, clock=clock)
+    store.get("a").add("Hi", [], "Hello")
+    store.get("b")
+    store.get("c")
+
+    assert len(store) == 2 and len(store.get("a")) == 0
+
+    clock.now = 20
+    store.evict()
+    assert len(store) == 0
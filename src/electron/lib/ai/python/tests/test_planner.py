@@ -0,0 +1,97 @@
+import re
+
+import pytest
+
+from functions.graph import GraphIndex
+from planner import PlanError, apply_diff, diff_transaction, parse_diff, validate_diff
+
+GRAPH = {
+    "nodes": [
+        {"id": "n1", "signature": "blix.output", "inputs": [{"id": "n1.in", "type": "number"}], "outputs": []},
+        {"id": "n2", "signature": "input-plugin.inputNumber", "inputs": [], "outputs": [{"id": "n2.out", "type": "number"}]},
+    ],
+    "edges": [{"id": "e1", "output": "n2.out", "input": "n1.in"}],
+}
+
+
+def diff(**fields) -> dict:
+    return parse_diff(fields)
+
+
+def test_a_valid_diff_becomes_one_call_per_kind_of_change():
+    graph = GraphIndex.fromBody(GRAPH)
+    valid = diff(
+        nodes=[{"alias": "a", "signature": "input-plugin.inputNumber"}],
+        edges=[{"output": "a.0", "input": "n1.in"}],
+        values=[{"node": "a", "input": "number", "value": 5}],
+        removeEdges=["e1"],
+    )
+
+    assert validate_diff(valid, graph) == {"a": "input-plugin.inputNumber"}
+    transaction, added = diff_transaction(valid, graph)
+    assert [call["name"] for call in transaction.calls] == ["removeEdges", "addNodes", "addEdges", "updateInputValues"]
+    assert added == 1
+
+
+@pytest.mark.parametrize(
+    "fields, error",
+    [
+        ({"values": [{"node": "n2", "value": 5}]}, "Invalid input"),
+        ({"values": [{"node": "n2", "input": ["number"], "value": 5}]}, "Invalid input"),
+        ({"values": [{"node": "n2", "input": "number", "value": True}]}, "Invalid value in"),
+        ({"values": [{"node": ["n2"], "input": "number", "value": 5}]}, "Unknown node"),
+        ({"values": [5]}, "Invalid value 5"),
+        ({"removeNodes": [["n1"]]}, "Node '['n1']' does not exist"),
+        ({"removeEdges": [{"id": "e1"}]}, "does not exist"),
+        ({"removeEdges": ["e2"]}, "Edge 'e2' does not exist"),
+    ],
+)
+def test_validation_rejects_malformed_diffs(fields, error):
+    with pytest.raises(PlanError, match=re.escape(error)):
+        validate_diff(diff(**fields), GraphIndex.fromBody(GRAPH))
+
+
+def test_a_diff_that_cant_be_turned_into_calls_is_a_plan_error():
+    # Skipped validation, as a diff with a gap validate_diff missed
+    with pytest.raises(PlanError, match="Invalid diff"):
+        apply_diff(diff(values=[{"node": "n2", "value": 5}]), GraphIndex.fromBody(GRAPH))
+
+
+UNARY = {
+    "id": "n3",
+    "signature": "math-plugin.unary",
+    "inputs": [{"id": "n3.in", "type": "number"}],
+    "outputs": [{"id": "n3.out", "type": "number"}],
+}
+TEXT = {"id": "n4", "signature": "input-plugin.inputText", "inputs": [], "outputs": [{"id": "n4.out", "type": "string"}]}
+
+
+@pytest.mark.parametrize(
+    "fields, error",
+    [
+        ({"edges": [{"output": "n3.out", "input": "n1.in"}]}, "Input anchor 'n1.in' is already connected"),
+        ({"edges": [{"output": "n4.out", "input": "n3.in"}]}, "is of type string but anchor 'n3.in' is of type number"),
+        (
+            {
+                "nodes": [{"alias": "a", "signature": "math-plugin.unary"}],
+                "edges": [{"output": "n2.out", "input": "n3.in"}, {"output": "a.0", "input": "n3.in"}],
+            },
+            "Input anchor 'n3.in' is used by more than one edge",
+        ),
+        (
+            {
+                "nodes": [{"alias": "a", "signature": "math-plugin.unary"}, {"alias": "b", "signature": "math-plugin.unary"}],
+                "edges": [{"output": "a.0", "input": "b.0"}, {"output": "b.0", "input": "a.0"}],
+            },
+            "would create a cycle",
+        ),
+    ],
+)
+def test_diffs_the_index_rejects_fail_before_anything_is_sent(fields, error):
+    graph = GraphIndex.fromBody(dict(GRAPH, nodes=GRAPH["nodes"] + [UNARY, TEXT]))
+    invalid = diff(**fields)
+    validate_diff(invalid, graph)
+
+    with pytest.raises(PlanError, match=re.escape(error)):
+        apply_diff(invalid, graph)
+    assert "n1.in" in graph.inputEdges and len(graph.nodes) == 4
@@ -0,0 +1,67 @@
+import json
+
+import plans
+from functions.graph import GraphIndex, get_graph, set_graph
+from prompts.encoders import encode_compact
+
+BODY = {
+    "nodes": [{"id": "n1", "signature": "blix.output", "inputs": [{"id": "n1.in", "type": "number"}], "outputs": []}],
+    "edges": [],
+}
+
+# Adds a number input and connects it to the output node
+PLAN = [
+    {"name": "addNode", "args": {"signature": "input-plugin.inputNumber"}},
+    {
+        "name": "addEdge",
+        "args": {"output": {"$ref": ["step", 0, "data", "outputs", 0]}, "input": {"$ref": ["nodes", 0, "inputs", 0, "id"]}},
+    },
+]
+
+
+def test_a_replay_that_stops_partway_leaves_the_body_at_the_replayed_graph(electron):
+    body = json.loads(json.dumps(BODY))
+    set_graph(GraphIndex.fromBody(body))
+    electron(
+        {"status": "success", "data": {"nodeId": "n2", "inputs": [], "outputs": [{"id": "n2.out", "type": "number"}]}},
+        {"status": "error", "message": "Edge could not be added"},
+    )
+
+    assert plans.replay(body, PLAN) is False
+
+    assert body["nodes"][0] == BODY["nodes"][0]
+    assert body["nodes"][1] == {
+        "id": "n2",
+        "signature": "input-plugin.inputNumber",
+        "inputs": [],
+        "outputs": [{"id": "n2.out", "type": "number"}],
+    }
+    assert body["edges"] == []
+    assert "n2 input-plugin.inputNumber out: n2.out:number" in encode_compact(body["nodes"], body["edges"])[0]
+
+
+def test_a_replay_that_fails_at_once_leaves_the_body_alone(electron):
+    body = json.loads(json.dumps(BODY))
+    set_graph(GraphIndex.fromBody(body))
+    electron({"status": "error", "message": "Node type does not exist"})
+
+    assert plans.replay(body, PLAN) is False
+    assert body == BODY
+
+
+def test_a_plan_with_a_batch_step_replays_on_another_graph(electron):
+    added = [{"status": "success", "data": {"nodeId": "n2", "inputs": [], "outputs": [{"id": "n2.out", "type": "number"}]}}]
+    calls = [
+        {"name": "addNodes", "args": {"signatures": ["input-plugin.inputNumber"]}, "response": json.dumps(added)},
+        {"name": "addEdge", "args": {"output": "n2.out", "input": "n1.in"}, "response": '{"status": "success"}'},
+    ]
+    plan = plans.make_plan(BODY, calls)
+    assert plan[1]["args"]["output"] == {"$ref": ["step", 0, "results", 0, "data", "outputs", 0, "id"]}
+
+    body = {"nodes": [dict(BODY["nodes"][0], id="m1", inputs=[{"id": "m1.in", "type": "number"}])], "edges": []}
+    set_graph(GraphIndex.fromBody(body))
+    added[0]["data"] = {"nodeId": "m2", "inputs": [], "outputs": [{"id": "m2.out", "type": "number"}]}
+    electron(added, {"status": "success", "data": {"edgeId": "e1"}})
+
+    assert plans.replay(body, plan) is True
+    assert get_graph().edges == {"e1": ("m2.out", "m1.in")}
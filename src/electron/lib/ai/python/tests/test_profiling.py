@@ -0,0 +1,21 @@
+import pytest
+
+from profiling import DEFAULT_TOP, parse_options, profile
+
+
+def test_true_profiles_cpu_and_memory():
+    assert parse_options({"profile": True}) == {"cpu": True, "memory": True, "top": DEFAULT_TOP, "file": None}
+    assert parse_options({"profile": "cpu"})["memory"] is False
+    assert parse_options({"profile": {"memory": True, "top": 5, "file": "/tmp/p"}})["top"] == 5
+
+
+@pytest.mark.parametrize("option", [None, False, 1, ["cpu"], "gpu", {}, {"top": 5}])
+def test_options_that_ask_for_no_profiler_are_ignored(option):
+    assert parse_options({"profile": option}) is None
+    assert profile({"profile": option}) is None
+
+
+@pytest.mark.parametrize("top", ["x", None, True, -1, 2.5])
+def test_a_bad_top_or_file_falls_back_to_the_default(top):
+    options = parse_options({"profile": {"cpu": True, "top": top, "file": 3}})
+    assert options == {"cpu": True, "memory": False, "top": DEFAULT_TOP, "file": None}
@@ -0,0 +1,71 @@
+import pytest
+
+from progress import Progress
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_tokens_are_coalesced_until_the_interval_passes():
+    clock = Clock()
+    progress = Progress(interval=0.1, clock=clock)
+
+    assert progress.token("The ") == {"type": "progress", "event": "tokens", "text": "The "}
+    assert progress.token("graph ") is None
+    assert progress.token("now") is None
+    clock.now = 0.2
+    assert progress.token(" has") == {"type": "progress", "event": "tokens", "text": "graph now has"}
+    assert progress.flush() is None
+
+
+def test_waiting_tokens_are_sent_early_past_max_chars():
+    progress = Progress(interval=10, maxChars=5, clock=Clock())
+    progress.token("a")
+
+    assert progress.token("bc") is None
+    assert progress.token("def")["text"] == "bcdef"
+
+
+def test_tool_events_carry_the_status_of_the_response():
+    progress = Progress(clock=Clock())
+
+    assert progress.thinking() == {"type": "progress", "event": "thinking", "iteration": 1}
+    assert progress.toolStart("addNode", "x" * 300)["input"].endswith("...")
+    assert progress.toolEnd('{"status": "error", "message": "No such node"}') == {
+        "type": "progress",
+        "event": "tool-end",
+        "name": "addNode",
+        "status": "error",
+        "message": "No such node",
+    }
+    progress.toolStart("addEdge", {})
+    assert progress.toolEnd("Error: already connected")["status"] == "error"
+    assert progress.toolError("timed out")["name"] is None
+
+
+def test_the_handler_sends_streamed_text_before_the_next_event():
+    handlers = pytest.importorskip("handlers")
+    sent = []
+    handler = handlers.ProgressHandler(sent.append, Progress(interval=10, clock=Clock()))
+
+    handler.on_chat_model_start({}, [])
+    for token in ("Adding", " a", " node"):
+        handler.on_llm_new_token(token)
+    handler.on_tool_start({"name": "addNode"}, "{}")
+    handler.on_tool_end('{"status": "success", "message": "Added"}')
+    handler.on_llm_new_token("Done")
+    handler.on_agent_finish(None)
+
+    assert [(m["event"], m.get("text", m.get("name"))) for m in sent] == [
+        ("thinking", None),
+        ("tokens", "Adding"),
+        ("tokens", " a node"),
+        ("tool-start", "addNode"),
+        ("tool-end", "addNode"),
+        ("tokens", "Done"),
+    ]
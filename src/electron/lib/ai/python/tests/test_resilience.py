@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, LatencyTracker, ModelCalls, RetryPolicy
+
+
+@pytest.fixture(autouse=True)
+def request_state():
+    resilience.set_deadline(None)
+    resilience.set_hedging(False)
+    yield
+    resilience.set_deadline(None)
+    resilience.set_hedging(False)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Stream:
+    """
+    Streamed answer of chunks, the seconds before each given by delays
+    """
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.closed = False
+
+    def __iter__(self):
+        for i, delay in enumerate(self.delays):
+            time.sleep(delay)
+            yield i
+
+    def close(self):
+        self.closed = True
+
+
+def hedging(latency: float) -> ModelCalls:
+    """
+    Model calls that hedge calls still unanswered after latency seconds
+    """
+    latencies = LatencyTracker(minSamples=1)
+    latencies.record(latency)
+    resilience.set_hedging(True)
+    return ModelCalls(latencies=latencies, hedgePercentile=0.5)
+
+
+def test_backoff_doubles_up_to_the_cap():
+    policy = RetryPolicy(base=0.5, cap=3.0, rng=lambda: 1.0)
+    assert [policy.backoff(n) for n in range(4)] == [0.5, 1.0, 2.0, 3.0]
+
+
+def test_breaker_opens_after_threshold_failures_and_lets_one_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=2, resetTimeout=10.0, clock=clock)
+
+    breaker.failure()
+    breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    assert breaker.rejected == 1
+
+    clock.now = 10.0
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+
+    # A failed trial opens it again, a successful one closes it
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 20.0
+    breaker.allow()
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retryable_errors_are_retried_and_others_are_not():
+    openai = pytest.importorskip("openai")
+    calls = ModelCalls(retry=RetryPolicy(retries=2, base=0.0))
+    errors = [openai.error.ServiceUnavailableError("down"), openai.error.Timeout("slow")]
+
+    def create(**kwargs):
+        if errors:
+            raise errors.pop(0)
+        return kwargs
+
+    assert calls.call(create, model="m")["model"] == "m"
+    assert calls.attempts == 3 and calls.retries == 2
+
+    def invalid(**kwargs):
+        raise openai.error.InvalidRequestError("bad", "messages")
+
+    with pytest.raises(openai.error.InvalidRequestError):
+        calls.call(invalid)
+    assert calls.attempts == 4 and calls.breaker.failures == 0
+
+
+def test_no_call_starts_after_the_deadline():
+    calls = ModelCalls()
+    resilience.set_deadline(0.01)
+    time.sleep(0.02)
+
+    with pytest.raises(DeadlineExceeded):
+        calls.call(lambda **kwargs: pytest.fail("called after the deadline"))
+
+
+def test_attempts_get_the_time_left_as_their_timeout():
+    calls = ModelCalls(timeout=60.0)
+    resilience.set_deadline(5.0)
+
+    assert 4.0 < calls.call(lambda **kwargs: kwargs)["request_timeout"] <= 5.0
+
+
+def test_a_stream_is_cut_off_at_the_deadline():
+    calls = ModelCalls()
+    stream = Stream([0.0, 0.0, 0.3, 0.0])
+    resilience.set_deadline(0.15)
+
+    chunks = []
+    with pytest.raises(DeadlineExceeded):
+        for chunk in calls.call(lambda **kwargs: stream, stream=True):
+            chunks.append(chunk)
+    assert chunks == [0, 1] and stream.closed
+
+
+def test_a_stalled_async_stream_is_cut_off_at_the_deadline():
+    calls = ModelCalls()
+
+    async def stream():
+        yield 0
+        await asyncio.sleep(10)
+        yield 1
+
+    async def create(**kwargs):
+        return stream()
+
+    async def main():
+        resilience.set_deadline(0.1)
+        chunks = []
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            async for chunk in await calls.acall(create, stream=True):
+                chunks.append(chunk)
+        return chunks, time.monotonic() - start
+
+    chunks, elapsed = asyncio.run(main())
+    assert chunks == [0] and elapsed < 1.0
+
+
+def test_the_hedge_of_a_slow_call_wins_and_the_slow_answer_is_closed():
+    calls = hedging(0.02)
+    streams = []
+
+    def create(**kwargs):
+        stream = Stream([0.0])
+        streams.append(stream)
+        if len(streams) == 1:
+            time.sleep(0.3)
+        return stream
+
+    result = calls.call(create)
+    assert result is streams[1] and calls.hedges == 1 and calls.hedgeWins == 1
+
+    time.sleep(0.4)
+    assert streams[0].closed and not streams[1].closed
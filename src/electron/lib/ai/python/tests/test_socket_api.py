@@ -0,0 +1,74 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from api import SocketAPI
+from framing import read_message, write_message
+
+
+def serve(path, handle):
+    """
+    Listens on a Unix domain socket and hands every connection to handle,
+    with a reader and writer on it, until handle returns False
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+
+    def run():
+        while True:
+            connection, _ = server.accept()
+            with connection, connection.makefile("rb") as reader, connection.makefile("wb") as writer:
+                if not handle(reader, writer):
+                    break
+        server.close()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def test_receive_raises_when_the_connection_drops_during_a_function_call(tmp_path):
+    received = []
+
+    def handle(reader, writer):
+        data, _ = read_message(reader)
+        received.append(json.loads(data))
+        # The first connection drops without answering
+        if len(received) == 1:
+            return True
+        write_message(writer, b'{"status": "success"}')
+        return False
+
+    path = tmp_path / "electron.sock"
+    serve(path, handle)
+    api = SocketAPI(path=str(path), retryDelay=0.01)
+
+    api.send({"type": "function", "name": "addNode", "args": {"signature": "blix.output"}})
+    with pytest.raises(ConnectionError):
+        api.receive()
+
+    # The connection is back for the messages after it
+    api.send({"type": "function", "name": "removeNode", "args": {"id": "a"}})
+    assert json.loads(api.receive()) == {"status": "success"}
+    assert [message["name"] for message in received] == ["addNode", "removeNode"]
+    api.disconnect()
+
+
+def test_receive_times_out_on_an_unanswered_function_call(tmp_path):
+    answered = threading.Event()
+
+    def handle(reader, writer):
+        read_message(reader)
+        answered.wait(5)
+        return False
+
+    path = tmp_path / "electron.sock"
+    serve(path, handle)
+    api = SocketAPI(path=str(path), replyTimeout=0.1)
+
+    api.send({"type": "function", "name": "addNode", "args": {"signature": "blix.output"}})
+    with pytest.raises(TimeoutError):
+        api.receive()
+    answered.set()
+    api.disconnect()
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from functions.graph import GraphIndex, set_graph  # noqa: E402
+from functions.tools import addEdgesTool, addNodesTool, removeNodesTool  # noqa: E402
+
+NUMBER = {"id": "n1", "signature": "input-plugin.inputNumber", "inputs": [], "outputs": [{"id": "n1.out", "type": "number"}]}
+
+
+def test_a_batch_is_sent_as_one_call_and_answered_per_item(electron):
+    stdio = electron(
+        [
+            {"status": "success", "message": "Node added", "data": {"nodeId": "n2", "inputs": ["n2.in"], "outputs": []}},
+            {"status": "error", "message": "Node type does not exist"},
+        ]
+    )
+
+    result = addNodesTool().run({"signatures": ["blix.output", "nope.nope"]})
+
+    assert stdio.sent() == [
+        {"type": "function", "name": "addNodes", "args": {"signatures": ["blix.output", "nope.nope"]}}
+    ]
+    assert result == (
+        "addNodes results:\n"
+        "0. blix.output: Node added\n   node id: n2\n   input anchor ids: n2.in\n   output anchor ids: \n"
+        "1. nope.nope: Node type does not exist\n"
+    )
+
+
+def test_items_electron_did_not_answer_are_reported(electron):
+    electron({"results": [{"status": "success", "message": "Node removed"}]})
+
+    result = removeNodesTool().run({"ids": ["a", "b"]})
+
+    assert result.endswith("0. a: Node removed\n1. b: no result received\n")
+
+
+def test_a_batch_the_index_rejects_is_not_sent(electron):
+    stdio = electron()
+    set_graph(GraphIndex.fromBody({"nodes": [NUMBER]}))
+
+    result = addEdgesTool().run({"edges": [{"output": "n1.out", "input": "x.in"}, {"output": "n1.out", "input": "x.in"}]})
+
+    assert result.startswith("Error: none of the edges were added\n1. n1.out -> x.in:")
+    assert stdio.sent() == []
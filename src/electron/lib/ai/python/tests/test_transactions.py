@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+import transactions
+from functions.calls import call_function
+from functions.graph import GraphIndex, get_graph, set_graph
+from transactions import Transaction, TransactionError
+
+GRAPH = {
+    "nodes": [{"id": "n1", "signature": "blix.output", "inputs": [{"id": "n1.in", "type": "number"}], "outputs": []}],
+    "edges": [],
+}
+
+ADDED = {"status": "success", "data": {"nodeId": "n2", "inputs": [], "outputs": [{"id": "n2.out", "type": "number"}]}}
+
+
+@pytest.fixture
+def graph():
+    previous = get_graph()
+    graph = GraphIndex.fromBody(GRAPH)
+    set_graph(graph)
+    yield graph
+    transactions.rollback()
+    set_graph(previous)
+
+
+def queue_edit():
+    transactions.begin()
+    call_function("addNode", {"signature": "input-plugin.inputNumber"})
+    call_function("addEdge", {"output": Transaction.ref(0, "data", "outputs", 0), "input": "n1.in"})
+
+
+def test_rolled_back_calls_are_never_sent(graph, electron):
+    stdio = electron()
+
+    queue_edit()
+    transactions.rollback()
+
+    assert stdio.sent() == []
+    assert transactions.current_transaction.get() is None
+    assert list(graph.nodes) == ["n1"]
+
+
+def test_calls_the_index_rejects_are_not_queued(graph):
+    transaction = transactions.begin()
+
+    error = call_function("addEdge", {"output": "n1.in", "input": "n1.in"})
+
+    assert error.startswith("Error: ") and transaction.calls == []
+
+
+def test_commit_without_electron_transactions_resolves_references_itself(graph, electron):
+    stdio = electron(ADDED, {"status": "success", "data": {"edgeId": "e1"}})
+
+    queue_edit()
+    responses = transactions.commit()
+
+    assert [json.loads(response)["status"] for response in responses] == ["success", "success"]
+    assert stdio.sent()[1]["args"] == {"output": "n2.out", "input": "n1.in"}
+    assert graph.edges == {"e1": ("n2.out", "n1.in")}
+
+
+def test_a_failed_call_stops_the_commit_with_the_calls_before_it_applied(graph, electron):
+    electron(ADDED, {"status": "error", "message": "Edge could not be added"})
+
+    queue_edit()
+    with pytest.raises(TransactionError) as failure:
+        transactions.commit()
+
+    assert failure.value.step == 1 and len(failure.value.results) == 1
+    assert "n2" in graph.nodes and graph.edges == {}
+
+
+def test_a_transaction_electron_rejects_leaves_the_index_alone(graph, electron):
+    stdio = electron({"status": "error", "message": "Edge could not be added", "step": 1}, atomic=True)
+
+    queue_edit()
+    with pytest.raises(TransactionError) as failure:
+        transactions.commit()
+
+    (message,) = stdio.sent()
+    assert message["name"] == "transaction" and len(message["args"]["calls"]) == 2
+    assert failure.value.step == 1
+    assert list(graph.nodes) == ["n1"] and graph.edges == {}
+
+
+
+def test_queued_calls_are_checked_with_the_calls_before_them_applied(graph):
+    for id in ("n3", "n4"):
+        graph.addNode(id, "math-plugin.unary", [{"id": f"{id}.in", "type": "number"}], [{"id": f"{id}.out", "type": "number"}])
+    transaction = transactions.begin()
+
+    assert json.loads(call_function("addEdge", {"output": "n3.out", "input": "n4.in"}))["status"] == "pending"
+    assert call_function("addEdge", {"output": "n1.in", "input": "n4.in"}).startswith("Error: 'n1.in' is an input")
+    assert call_function("addEdge", {"output": "n3.out", "input": "n4.in"}).startswith("Error: Input anchor 'n4.in'")
+    assert call_function("addEdges", {"edges": [{"output": "n4.out", "input": "n3.in"}]}).endswith("would create a cycle\n")
+    assert json.loads(call_function("removeEdge", {"id": "$step0.0"}))["status"] == "pending"
+    assert json.loads(call_function("addEdge", {"output": "n4.out", "input": "n3.in"}))["status"] == "pending"
+
+    assert [call["name"] for call in transaction.calls] == ["addEdge", "removeEdge", "addEdge"]
+    # The index itself is only updated once the transaction is committed
+    assert graph.edges == {}
+
+
+def test_references_to_queued_calls_are_checked_once_resolved(graph):
+    graph.addNode("n3", "input-plugin.inputNumber", [], [{"id": "n3.out", "type": "number"}])
+
+    queue_edit()
+    error = call_function("addEdge", {"output": Transaction.ref(0, "data", "outputs", 0), "input": "n1.in"})
+
+    assert error.startswith("Error: Input anchor 'n1.in' is already connected by edge '$step1.0'")
+    assert len(transactions.current_transaction.get().calls) == 2
@@ -0,0 +1,146 @@
+"""
+Lightweight tracing of where the time of a request goes.
+
+A trace is a list of nested spans, each with a name, the span it was
+started in and its start and duration in milliseconds since the request
+was received, taken from a monotonic clock:
+
+    {"type": "trace", "spans": [
+        {"id": 0, "parent": null, "name": "request", "start": 0.0, "duration": 812.4},
+        {"id": 1, "parent": 0, "name": "prompt", "start": 3.1, "duration": 0.4},
+        {"id": 2, "parent": 0, "name": "model", "start": 3.6, "duration": 640.2},
+        {"id": 3, "parent": 0, "name": "function", "start": 644.0, "duration": 2.1, "function": "addNode"},
+        ...
+    ]}
+
+Tracing is turned on per request with "trace" in the request config: true
+sends the trace to Electron as a message before the exit message, a path
+appends it to that file as one JSON line. When it is off span() hands back
+a shared object that does nothing, so the spans cost a context variable
+lookup.
+"""
+import contextvars
+import json
+import time
+from typing import List, Optional
+
+# Trace of the request being handled, None when tracing is off
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Id of the innermost open span
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    def __init__(self, destination=True, origin: Optional[int] = None):
+        self.destination = destination
+        # time.perf_counter_ns() when the request was received
+        self.origin = origin or time.perf_counter_ns()
+        self.spans: List[dict] = []
+
+    def now(self) -> float:
+        return (time.perf_counter_ns() - self.origin) / 1e6
+
+    def begin(self, name: str, parent: Optional[int] = None, **attributes) -> int:
+        """
+        Opens a span and returns its id. Spans opened and closed in different
+        callbacks use begin and end instead of span().
+        """
+        id = len(self.spans)
+        self.spans.append({"id": id, "parent": parent, "name": name, "start": self.now(), "duration": None, **attributes})
+        return id
+
+    def end(self, id: int, **attributes):
+        span = self.spans[id]
+        span["duration"] = round(self.now() - span["start"], 3)
+        span["start"] = round(span["start"], 3)
+        span.update(attributes)
+
+    def message(self) -> dict:
+        return {"type": "trace", "spans": self.spans}
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attributes", "id", "token")
+
+    def __init__(self, trace, name, attributes):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.id = self.trace.begin(self.name, current_span.get(), **self.attributes)
+        self.token = current_span.set(self.id)
+        return self
+
+    def __exit__(self, *exc):
+        current_span.reset(self.token)
+        self.trace.end(self.id, **({"error": exc[0].__name__} if exc[0] else {}))
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes):
+    """
+    Context manager timing a block as a span of the current trace
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, attributes)
+
+
+def annotate(**attributes):
+    """
+    Adds attributes to the innermost open span of the current trace
+    """
+    trace = current_trace.get()
+    id = current_span.get()
+    if trace is not None and id is not None:
+        trace.spans[id].update(attributes)
+
+
+def start_trace(config: dict, origin: Optional[int] = None) -> Optional[Trace]:
+    """
+    Starts the trace of a request if its config asks for one, and stops any
+    trace of an earlier request otherwise. origin is the
+    time.perf_counter_ns() the request was received at, if not now.
+    """
+    destination = config.get("trace") if isinstance(config, dict) else None
+    trace = Trace(destination, origin) if destination else None
+    current_trace.set(trace)
+    current_span.set(None)
+    return trace
+
+
+def finish_trace() -> Optional[dict]:
+    """
+    Stops the current trace. Returns the trace message to send to Electron,
+    or None if there was no trace or it was written to a file.
+    """
+    trace = current_trace.get()
+    current_trace.set(None)
+    if trace is None:
+        return None
+
+    if isinstance(trace.destination, str):
+        try:
+            with open(trace.destination, "a") as f:
+                f.write(json.dumps(trace.spans) + "\n")
+        except OSError:
+            pass
+        return None
+
+    return trace.message()